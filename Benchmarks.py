@@ -0,0 +1,310 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+from Mock_plugin import MockPluginServer
+from Profiling import LatencyHistogram
+from Telemetry_bench import bench_parse, bench_socket, make_frames
+
+# Reproduzierbare Benchmarks der ganzen Pipeline ohne das Spiel, gegen Mock_plugin.py:
+#   python Benchmarks.py run --out bench.json                  # alle Benchmarks, Ergebnis als JSON
+#   python Benchmarks.py run --only telemetry,env_step --quick # Auswahl, kürzere Läufe
+#   python Benchmarks.py compare baseline.json bench.json      # Regressionen gegen eine Baseline
+#   python Benchmarks.py run --baseline baseline.json          # beides in einem Schritt
+# Namenskonvention der Kennzahlen: *_per_s = höher ist besser, *_ms = niedriger ist besser,
+# alles andere wird nur mitgeschrieben. compare meldet Verschlechterungen über --threshold und
+# endet dann mit Exit-Code 1.
+
+SEED = 0
+
+
+def _latency_ms(histogram):
+    summary = histogram.summary()
+    return {f"{key}_ms": summary[key] * 1000.0 for key in ("p50", "p95", "p99", "mean")}
+
+
+def _start_mocks(n, protocol, tick_rate):
+    return [MockPluginServer(port=0, protocol=protocol, tick_rate=tick_rate).start() for _ in range(n)]
+
+
+def _stop_mocks(servers):
+    for server in servers:
+        server.stop()
+
+
+def _quiet(fn, *args, **kwargs):
+    # Die [MOCK]-Meldungen der Server nicht in die Ergebnisse mischen
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def bench_telemetry(n_frames, n_obs):
+    frames = make_frames(n_frames, seed=SEED)
+    results = {f"parse_{name}_per_s": fps for name, fps in bench_parse(frames).items()}
+    for protocol in ("csv", "binary"):
+        results[f"socket_{protocol}_per_s"] = bench_socket(frames, protocol, n_obs)
+    return results
+
+
+def _make_env(server, protocol, **env_kwargs):
+    from Gym_env import TrackmaniaEnv
+    # FakeGamepad des Mocks: Aktionen wirken ohne Umweg über einen Socket direkt auf das Modellauto
+    return TrackmaniaEnv("127.0.0.1", server.port, gamepad=server.gamepad, protocol=protocol, **env_kwargs)
+
+
+def bench_env_step(n_steps, protocol, tick_rate):
+    servers = _start_mocks(1, protocol, tick_rate)
+    env = _make_env(servers[0], protocol)
+    rng = np.random.default_rng(SEED)
+    actions = rng.integers(0, env.action_space.n, n_steps)
+    histogram = LatencyHistogram()
+    try:
+        env.reset()
+        episodes = 0
+        start = time.perf_counter()
+        reset_time = 0.0
+        for action in actions:
+            t = time.perf_counter()
+            _, _, terminated, truncated, _ = env.step(action)
+            histogram.add(time.perf_counter() - t)
+            if terminated or truncated:
+                t = time.perf_counter()
+                env.reset()
+                reset_time += time.perf_counter() - t
+                episodes += 1
+        elapsed = time.perf_counter() - start - reset_time
+    finally:
+        env.close()
+        _stop_mocks(servers)
+    return {"steps_per_s": n_steps / elapsed, "episodes": episodes, **_latency_ms(histogram)}
+
+
+def bench_reset(n_resets, protocol, tick_rate):
+    # Ein Reset = Tastenfolge starten (wie in step()) und in reset() bis zur Bestätigung fahren
+    servers = _start_mocks(1, protocol, tick_rate)
+    env = _make_env(servers[0], protocol)
+    histogram = LatencyHistogram()
+    try:
+        env.reset()
+        confirmed = 0
+        for _ in range(n_resets):
+            # Erst ein Stück fahren, damit der Neustart an der Distanz erkennbar ist, dann vom Gas
+            # gehen (Aktion 3 = Bremse), sonst fährt das Auto nach dem Respawn gleich wieder los
+            while env.current_obs[3] < 20.0:
+                env.step(1)
+            env.step(3)
+            start = time.perf_counter()
+            env._perform_reset()
+            sequence = env.reset_sequence
+            env.reset()
+            histogram.add(time.perf_counter() - start)
+            confirmed += int(sequence.confirmed)
+    finally:
+        env.close()
+        _stop_mocks(servers)
+    return {"resets": n_resets, "confirmed": confirmed, **_latency_ms(histogram)}
+
+
+class _SubprocEnvFn:
+    # Picklebar für SubprocVecEnv; das FakeGamepad des Mocks gibt es im Unterprozess nicht,
+    # Eingaben laufen dort über Gamepad_backends.SocketGamepad an den Eingabe-Port des Mocks
+    def __init__(self, port, input_port, protocol):
+        self.port = port
+        self.input_port = input_port
+        self.protocol = protocol
+
+    def __call__(self):
+        from Gym_env import TrackmaniaEnv
+        from Gamepad_backends import make_gamepad
+        gamepad = make_gamepad("socket", "127.0.0.1", self.input_port)
+        return TrackmaniaEnv("127.0.0.1", self.port, gamepad=gamepad, protocol=self.protocol)
+
+
+def _make_vec_env(servers, protocol, subproc):
+    from stable_baselines3.common.env_util import make_vec_env
+    from stable_baselines3.common.vec_env import SubprocVecEnv
+    if subproc:
+        return SubprocVecEnv([_SubprocEnvFn(s.port, s.input_port, protocol) for s in servers])
+    remaining = iter(servers)
+    return make_vec_env(lambda: _make_env(next(remaining), protocol), n_envs=len(servers))
+
+
+def bench_vec_env(n_envs_list, n_steps, protocol, tick_rate, subproc=False):
+    results = {}
+    rng = np.random.default_rng(SEED)
+    for n_envs in n_envs_list:
+        if subproc:
+            servers = [MockPluginServer(port=0, protocol=protocol, tick_rate=tick_rate, input_port=0).start()
+                       for _ in range(n_envs)]
+        else:
+            servers = _start_mocks(n_envs, protocol, tick_rate)
+        env = None
+        try:
+            env = _make_vec_env(servers, protocol, subproc)
+            env.reset()
+            actions = rng.integers(0, 4, (n_steps, n_envs))
+            start = time.perf_counter()
+            for action in actions:
+                env.step(action)
+            elapsed = time.perf_counter() - start
+        finally:
+            if env is not None:
+                env.close()
+            _stop_mocks(servers)
+        results[f"n{n_envs}_steps_per_s"] = n_envs * n_steps / elapsed
+    return results
+
+
+def bench_algo(algo, total_timesteps, protocol, tick_rate):
+    # Rollout (Inferenz + env.step) und Update getrennt, gemessen mit dem ProfilingCallback
+    from stable_baselines3 import DQN, PPO
+    from stable_baselines3.common.vec_env import DummyVecEnv
+    from Training_callbacks import ProfilingCallback
+    servers = _start_mocks(1, protocol, tick_rate)
+    env = DummyVecEnv([lambda: _make_env(servers[0], protocol)])
+    try:
+        if algo == "ppo":
+            model = PPO("MlpPolicy", env, n_steps=256, batch_size=64, n_epochs=4, seed=SEED, device="cpu")
+        else:
+            model = DQN("MlpPolicy", env, learning_starts=100, train_freq=4, seed=SEED, device="cpu")
+        callback = ProfilingCallback(log_every=sys.maxsize)
+        start = time.perf_counter()
+        model.learn(total_timesteps, callback=callback)
+        elapsed = time.perf_counter() - start
+    finally:
+        env.close()
+        _stop_mocks(servers)
+    summary = callback.profiler.summary()
+    results = {"total_steps_per_s": total_timesteps / elapsed}
+    for name in ("agent_step", "update"):
+        if name in summary:
+            results[f"{name}_p50_ms"] = summary[name]["p50"] * 1000.0
+            results[f"{name}_mean_ms"] = summary[name]["mean"] * 1000.0
+            results[f"{name}_count"] = summary[name]["count"]
+    return results
+
+
+BENCHMARKS = ("telemetry", "env_step", "reset", "vec_env", "ppo", "dqn")
+
+
+def run(only=None, quick=False, protocol="csv", tick_rate=1000.0, max_envs=4, subproc=False):
+    scale = 0.1 if quick else 1.0
+    n = lambda count: max(1, int(count * scale))
+    jobs = {
+        "telemetry": lambda: bench_telemetry(n(20000), n(100000)),
+        "env_step": lambda: bench_env_step(n(5000), protocol, tick_rate),
+        "reset": lambda: bench_reset(n(50), protocol, tick_rate),
+        "vec_env": lambda: bench_vec_env(range(1, max_envs + 1), n(2000), protocol, tick_rate, subproc),
+        "ppo": lambda: bench_algo("ppo", n(4096), protocol, tick_rate),
+        "dqn": lambda: bench_algo("dqn", n(4096), protocol, tick_rate),
+    }
+    results = {}
+    for name in only or BENCHMARKS:
+        print(f"[BENCH] {name} ...")
+        start = time.perf_counter()
+        results[name] = _quiet(jobs[name])
+        print(f"[BENCH] {name} fertig nach {time.perf_counter() - start:.1f} s")
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "protocol": protocol,
+            "tick_rate": tick_rate,
+            "quick": quick,
+            "subproc": subproc,
+        },
+        "results": results,
+    }
+
+
+def _direction(metric):
+    if metric.endswith("_per_s"):
+        return 1
+    if metric.endswith("_ms"):
+        return -1
+    return 0
+
+
+def compare(baseline, current, threshold=0.1):
+    # Liefert (Zeilen, Regressionen); change > 0 heißt immer "besser"
+    rows, regressions = [], []
+    for bench, metrics in baseline["results"].items():
+        for metric, old in metrics.items():
+            direction = _direction(metric)
+            new = current["results"].get(bench, {}).get(metric)
+            if direction == 0 or new is None or not old:
+                continue
+            change = direction * (new - old) / old
+            row = (f"{bench}.{metric}", old, new, change)
+            rows.append(row)
+            if change < -threshold:
+                regressions.append(row)
+    return rows, regressions
+
+
+def print_comparison(rows, regressions, threshold):
+    for name, old, new, change in rows:
+        flag = "  REGRESSION" if change < -threshold else ""
+        print(f"[BENCH] {name:40s} {old:14.3f} -> {new:14.3f}  {change * 100:+7.1f} %{flag}")
+    if regressions:
+        print(f"[WARN] {len(regressions)} Kennzahl(en) mehr als {threshold * 100:.0f} % schlechter als die Baseline")
+    else:
+        print("[INFO] Keine Regressionen gegenüber der Baseline.")
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Durchsatz- und Latenz-Benchmarks gegen Mock_plugin.py")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Benchmarks ausführen und als JSON speichern")
+    run_parser.add_argument("--out", default="benchmarks.json")
+    run_parser.add_argument("--only", default=None, help=f"Kommagetrennte Auswahl aus {','.join(BENCHMARKS)}")
+    run_parser.add_argument("--quick", action="store_true", help="Nur 10 %% der Schritte")
+    run_parser.add_argument("--protocol", choices=("csv", "binary"), default="csv")
+    run_parser.add_argument("--tick-rate", type=float, default=1000.0,
+                            help="Frames/s jedes Mocks, 0 = so schnell wie der Client liest")
+    run_parser.add_argument("--max-envs", type=int, default=4)
+    run_parser.add_argument("--subproc", action="store_true", help="SubprocVecEnv statt DummyVecEnv im vec_env-Test")
+    run_parser.add_argument("--baseline", default=None, help="Anschließend mit dieser Baseline vergleichen")
+    run_parser.add_argument("--threshold", type=float, default=0.1)
+
+    compare_parser = commands.add_parser("compare", help="Zwei Ergebnisdateien vergleichen")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Erlaubte Verschlechterung (0.1 = 10 %%)")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        only = args.only.split(",") if args.only else None
+        for name in only or ():
+            if name not in BENCHMARKS:
+                parser.error(f"Unbekannter Benchmark: {name}")
+        current = run(only, args.quick, args.protocol, args.tick_rate, args.max_envs, args.subproc)
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=1)
+        print(f"[INFO] Ergebnisse gespeichert: {args.out}")
+        for bench, metrics in current["results"].items():
+            for metric, value in metrics.items():
+                print(f"[BENCH] {bench}.{metric:32s} {value:14.3f}")
+        if args.baseline is None:
+            sys.exit(0)
+        baseline = _load(args.baseline)
+    else:
+        baseline, current = _load(args.baseline), _load(args.current)
+    rows, regressions = compare(baseline, current, args.threshold)
+    print_comparison(rows, regressions, args.threshold)
+    sys.exit(1 if regressions else 0)
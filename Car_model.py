@@ -0,0 +1,188 @@
+import numpy as np
+
+# Einfaches kinematisches Fahrzeugmodell für Tests und Simulation ohne Trackmania.
+# Alle Größen in SI-Einheiten (m, s, rad), Zustand als Structure-of-Arrays,
+# sodass beliebig viele Autos mit einem Aufruf gerechnet werden.
+
+N_CHECKPOINTS = 10  # wie TrackmaniaEnv: nach 10 Checkpoints ist die Runde beendet
+
+ACCEL = 14.0         # m/s² bei Vollgas
+BRAKE = 30.0         # m/s² bei voller Bremse
+DRAG = 0.12          # 1/s, lineare Luft-/Rollreibung
+MAX_SPEED = 90.0     # m/s
+TURN_RADIUS = 12.0   # kleinster Kurvenradius bei niedriger Geschwindigkeit
+LATERAL_GRIP = 22.0  # m/s², maximale Querbeschleunigung
+
+# Aktionen von TrackmaniaEnv als (Lenkung, Gas, Bremse); Lenkung -1 = links
+ACTIONS = np.array([
+    [-1.0, 1.0, 0.0],
+    [0.0, 1.0, 0.0],
+    [1.0, 1.0, 0.0],
+    [0.0, 0.0, 1.0],
+], dtype=np.float64)
+
+
+class StadiumTrack:
+    # Geschlossene Strecke aus zwei Geraden und zwei Halbkreisen, gefahren gegen den Uhrzeigersinn.
+    # Start ist am Anfang der unteren Geraden in Richtung +x.
+    def __init__(self, straight=300.0, radius=60.0, half_width=12.0):
+        self.straight = straight
+        self.radius = radius
+        self.half_width = half_width
+        self.length = 2 * straight + 2 * np.pi * radius
+        self.start = (-straight / 2 + 1.0, -radius, 0.0)
+
+    def project(self, x, y):
+        # Liefert Streckenposition s in [0, length) und seitlichen Abstand zur Mittellinie
+        # (positiv = links in Fahrtrichtung, also zur Innenseite)
+        half, r = self.straight / 2, self.radius
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+
+        bottom_s = x + half
+        bottom_lat = y + r
+        top_s = self.straight + np.pi * r + (half - x)
+        top_lat = r - y
+
+        right_angle = np.arctan2(y, x - half)
+        right_s = self.straight + r * (right_angle + np.pi / 2)
+        right_lat = r - np.hypot(x - half, y)
+
+        left_angle = np.mod(np.arctan2(y, x + half), 2 * np.pi)
+        left_s = 2 * self.straight + np.pi * r + r * (left_angle - np.pi / 2)
+        left_lat = r - np.hypot(x + half, y)
+
+        on_right = x > half
+        on_left = x < -half
+        s = np.where(on_right, right_s, np.where(on_left, left_s, np.where(y < 0, bottom_s, top_s)))
+        lat = np.where(on_right, right_lat, np.where(on_left, left_lat, np.where(y < 0, bottom_lat, top_lat)))
+        return np.mod(s, self.length), lat
+
+    def centerline(self, spacing=2.0):
+        # Punkte der Mittellinie ab Start in Fahrtrichtung (z.B. für Track_geometry.TrackIndex)
+        half, r = self.straight / 2, self.radius
+        s = np.arange(0.0, self.length, spacing)
+        arc = np.pi * r
+        conditions = [s < self.straight, s < self.straight + arc, s < 2 * self.straight + arc]
+        angle_right = (s - self.straight) / r - np.pi / 2
+        angle_left = (s - 2 * self.straight - arc) / r + np.pi / 2
+        x = np.select(conditions, [s - half, half + r * np.cos(angle_right),
+                                   half - (s - self.straight - arc)], -half + r * np.cos(angle_left))
+        y = np.select(conditions, [np.full_like(s, -r), r * np.sin(angle_right), np.full_like(s, r)],
+                      r * np.sin(angle_left))
+        return np.stack([x, y], axis=1)
+
+
+class CarState:
+    def __init__(self, n, track=None):
+        self.track = track if track is not None else StadiumTrack()
+        self.n = n
+        self.x = np.zeros(n)
+        self.y = np.zeros(n)
+        self.yaw = np.zeros(n)
+        self.speed = np.zeros(n)
+        self.distance = np.zeros(n)   # gefahrene Strecke wie scriptPlayer.Distance
+        self.s = np.zeros(n)          # Position auf der Mittellinie
+        self.progress = np.zeros(n)   # Fortschritt entlang der Strecke seit dem Start
+        self.time = np.zeros(n)
+        self.last_cp_time = np.zeros(n)
+        self.cp_count = np.zeros(n, dtype=np.int64)
+        self.finished = np.zeros(n, dtype=bool)
+        self.reset()
+
+    def reset(self, mask=None):
+        # Autos an den Start setzen (alle oder nur die in mask)
+        idx = slice(None) if mask is None else mask
+        x0, y0, yaw0 = self.track.start
+        self.x[idx] = x0
+        self.y[idx] = y0
+        self.yaw[idx] = yaw0
+        self.speed[idx] = 0.0
+        self.distance[idx] = 0.0
+        self.s[idx] = self.track.project(x0, y0)[0]
+        self.progress[idx] = 0.0
+        self.cp_count[idx] = 0
+        self.finished[idx] = False
+        # Beim Neustart wechselt im Spiel der Respawn-Punkt, das Plugin startet die Checkpoint-Zeit neu
+        self.last_cp_time[idx] = self.time[idx]
+
+
+def step_cars(state, steer, gas, brake, dt):
+    # Integriert alle Autos um dt; liefert (Checkpoint erreicht, Zeit seit letztem Checkpoint)
+    track = state.track
+    active = ~state.finished
+    gas = np.where(active, gas, 0.0)
+    brake = np.where(active, brake, 1.0)
+
+    speed = state.speed
+    accel = gas * ACCEL - brake * BRAKE - DRAG * speed
+    speed = np.clip(speed + accel * dt, 0.0, MAX_SPEED)
+
+    # Lenkung begrenzt durch Mindestradius und Haftung; links lenken dreht gegen den Uhrzeigersinn
+    yaw_rate_limit = np.minimum(speed / TURN_RADIUS, LATERAL_GRIP / np.maximum(speed, 1e-3))
+    yaw = state.yaw - steer * yaw_rate_limit * dt
+    yaw = np.mod(yaw + np.pi, 2 * np.pi) - np.pi
+
+    x = state.x + np.cos(yaw) * speed * dt
+    y = state.y + np.sin(yaw) * speed * dt
+    s, lat = track.project(x, y)
+
+    # Abkommen von der Strecke = Wand: Auto bleibt an der alten Position stehen
+    crashed = np.abs(lat) > track.half_width
+    x = np.where(crashed, state.x, x)
+    y = np.where(crashed, state.y, y)
+    s = np.where(crashed, state.s, s)
+    speed = np.where(crashed, 0.0, speed)
+
+    ds = np.mod(s - state.s + track.length / 2, track.length) - track.length / 2
+    state.x, state.y, state.yaw, state.speed, state.s = x, y, yaw, speed, s
+    state.distance += speed * dt
+    state.progress += ds
+    state.time += dt
+
+    cp_spacing = track.length / N_CHECKPOINTS
+    checkpoint = active & (state.progress >= (state.cp_count + 1) * cp_spacing)
+    delta_time = np.where(checkpoint, state.time - state.last_cp_time, -1.0)
+    state.last_cp_time = np.where(checkpoint, state.time, state.last_cp_time)
+    state.cp_count += checkpoint
+    state.finished |= state.cp_count >= N_CHECKPOINTS
+    return checkpoint, delta_time
+
+
+def telemetry_frames(state, checkpoint, delta_time):
+    # Rohwerte wie vom Plugin: x, y, speed, dist, yaw, pitch, Checkpoint-Nummer oder -1, delta_time
+    frames = np.empty((state.n, 8), dtype=np.float64)
+    frames[:, 0] = state.x
+    frames[:, 1] = state.y
+    frames[:, 2] = state.speed
+    frames[:, 3] = state.distance
+    frames[:, 4] = state.yaw
+    frames[:, 5] = 0.0
+    frames[:, 6] = np.where(checkpoint, state.cp_count, -1)
+    frames[:, 7] = delta_time
+    return frames
+
+
+def autopilot(state, target_speed=30.0):
+    # Einfacher Regler entlang der Mittellinie, z.B. um Telemetrie für Tests aufzuzeichnen
+    track = state.track
+    lookahead = np.mod(state.s + 15.0, track.length)
+    _, lat = track.project(state.x, state.y)
+    heading_error = np.mod(_centerline_heading(track, lookahead) - state.yaw + np.pi, 2 * np.pi) - np.pi
+    steer = np.clip(0.15 * lat - 2.0 * heading_error, -1.0, 1.0)
+    gas = (state.speed < target_speed).astype(np.float64)
+    brake = (state.speed > target_speed * 1.2).astype(np.float64)
+    return steer, gas, brake
+
+
+def _centerline_heading(track, s):
+    L, r = track.straight, track.radius
+    s = np.asarray(s, dtype=np.float64)
+    on_right = (s >= L) & (s < L + np.pi * r)
+    on_top = (s >= L + np.pi * r) & (s < 2 * L + np.pi * r)
+    on_left = s >= 2 * L + np.pi * r
+    heading = np.zeros_like(s)
+    heading = np.where(on_right, (s - L) / r, heading)
+    heading = np.where(on_top, np.pi, heading)
+    heading = np.where(on_left, np.pi + (s - 2 * L - np.pi * r) / r, heading)
+    return np.mod(heading + np.pi, 2 * np.pi) - np.pi
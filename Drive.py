@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+
+# Fahren mit einem fertig trainierten Modell ohne SB3/torch zur Laufzeit:
+#   python Drive.py export ppo_trackmania.zip policy.npz   # Gewichte als NumPy-Arrays exportieren
+#   python Drive.py drive policy.npz --port 1337           # Regelschleife gegen TrackmaniaEnv
+#   python Drive.py bench ppo_trackmania.zip               # Latenz/Startzeit vs. model.predict
+# Beim Export wird SB3 gebraucht, beim Fahren nur numpy (+ gymnasium für TrackmaniaEnv).
+# Wurde mit FRAME_HISTORY bzw. TRACK_NAME trainiert, beim Export --history bzw. --track angeben:
+# drive() baut dann dieselben Wrapper um die TrackmaniaEnv und prüft die Beobachtungsgröße.
+
+ACTIVATIONS = ("tanh", "relu", "identity")
+
+
+def _load_sb3_model(model_path, algo=None):
+    from stable_baselines3 import DQN, PPO
+    if algo is None:
+        algo = "dqn" if "dqn" in os.path.basename(model_path).lower() else "ppo"
+    return algo, (DQN if algo == "dqn" else PPO).load(model_path, device="cpu")
+
+
+def _sequential_layers(modules):
+    # Linear-Schichten + Aktivierung danach aus einem torch.nn.Sequential bzw. einer Modul-Liste
+    import torch.nn as nn
+    layers = []
+    for module in modules:
+        if isinstance(module, nn.Linear):
+            layers.append([module.weight.detach().cpu().numpy().T, module.bias.detach().cpu().numpy(), "identity"])
+        elif isinstance(module, nn.Tanh):
+            layers[-1][2] = "tanh"
+        elif isinstance(module, nn.ReLU):
+            layers[-1][2] = "relu"
+        elif not isinstance(module, (nn.Flatten, nn.Identity)):
+            raise ValueError(f"Nicht unterstützte Schicht im Policy-Netz: {module}")
+    return layers
+
+
+def export_policy(model_path, out_path, algo=None, history=0, track=None):
+    # Deterministische Policy (argmax der Logits bzw. Q-Werte) als .npz mit W0, b0, W1, ...
+    # history/track: Wrapper aus dem Training (FRAME_HISTORY, Streckenindex-.npz aus track_cache)
+    algo, model = _load_sb3_model(model_path, algo)
+    policy = model.policy
+    if algo == "dqn":
+        layers = _sequential_layers(policy.q_net.q_net)
+    else:
+        layers = _sequential_layers(policy.mlp_extractor.policy_net) + _sequential_layers([policy.action_net])
+
+    arrays = {}
+    for i, (weight, bias, activation) in enumerate(layers):
+        arrays[f"W{i}"] = np.ascontiguousarray(weight, dtype=np.float32)
+        arrays[f"b{i}"] = np.ascontiguousarray(bias, dtype=np.float32)
+    meta = {
+        "algo": algo,
+        "source": os.path.abspath(model_path),
+        "obs_dim": int(layers[0][0].shape[0]),
+        "n_actions": int(layers[-1][0].shape[1]),
+        "activations": [activation for _, _, activation in layers],
+        "history": int(history),
+        "track": None if track is None else os.path.abspath(track),
+    }
+    np.savez(out_path, meta=json.dumps(meta), **arrays)
+    return meta
+
+
+class NumpyPolicy:
+    # Vorwärtsdurchlauf des MLP mit vorab angelegten Puffern, keine Allokation pro Entscheidung
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.meta = json.loads(str(data["meta"]))
+            n_layers = len(self.meta["activations"])
+            self.weights = [data[f"W{i}"] for i in range(n_layers)]
+            self.biases = [data[f"b{i}"] for i in range(n_layers)]
+        self.activations = self.meta["activations"]
+        for activation in self.activations:
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Unbekannte Aktivierung: {activation}")
+        self._input = np.zeros(self.weights[0].shape[0], dtype=np.float32)
+        self._buffers = [np.zeros(w.shape[1], dtype=np.float32) for w in self.weights]
+
+    def logits(self, obs):
+        np.copyto(self._input, obs, casting="unsafe")
+        x = self._input
+        for weight, bias, activation, out in zip(self.weights, self.biases, self.activations, self._buffers):
+            np.dot(x, weight, out=out)
+            out += bias
+            if activation == "tanh":
+                np.tanh(out, out=out)
+            elif activation == "relu":
+                np.maximum(out, 0.0, out=out)
+            x = out
+        return x
+
+    def predict(self, obs):
+        return int(self.logits(obs).argmax())
+
+
+def make_drive_env(meta, host="localhost", port=1337, gamepad=None, **env_kwargs):
+    # Gleiche Beobachtung wie im Training; die Wrapper (und damit SB3) werden nur bei Bedarf importiert
+    from Gym_env import TrackmaniaEnv
+    env = TrackmaniaEnv(host=host, port=port, gamepad=gamepad, **env_kwargs)
+    if meta.get("track"):
+        from Env_wrappers import TrackFeatureWrapper
+        from Track_geometry import TrackIndex
+        env = TrackFeatureWrapper(env, TrackIndex.load(meta["track"]))
+    if meta.get("history", 0) > 0:
+        from Env_wrappers import FrameHistoryWrapper
+        env = FrameHistoryWrapper(env, meta["history"])
+    obs_dim = env.observation_space.shape[0]
+    if obs_dim != meta["obs_dim"]:
+        env.close()
+        raise ValueError(f"Policy erwartet {meta['obs_dim']} Beobachtungswerte, die Umgebung liefert {obs_dim} "
+                         f"(history={meta.get('history', 0)}, track={meta.get('track')}); beim Export --history/--track "
+                         f"wie im Training (FRAME_HISTORY, TRACK_NAME) angeben")
+    return env
+
+
+def drive(policy_path, host="localhost", port=1337, episodes=None, gamepad=None, **env_kwargs):
+    policy = NumpyPolicy(policy_path)
+    env = make_drive_env(policy.meta, host, port, gamepad, **env_kwargs)
+    episode = 0
+    try:
+        while episodes is None or episode < episodes:
+            obs, _ = env.reset()
+            episode_reward, steps, done = 0.0, 0, False
+            while not done:
+                obs, reward, terminated, truncated, info = env.step(policy.predict(obs))
+                episode_reward += reward
+                steps += 1
+                done = terminated or truncated
+            episode += 1
+            print(f"[DRIVE] Episode {episode}: {steps} Schritte, Belohnung {episode_reward:.1f}")
+    except KeyboardInterrupt:
+        print("\n[INFO] Programm abgebrochen durch Benutzer.")
+    finally:
+        env.close()
+
+
+def _startup_seconds(code):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True)
+    return time.perf_counter() - start
+
+
+def benchmark(model_path, export_path=None, n=5000, algo=None, seed=0):
+    # Vergleicht Entscheidungslatenz und Startzeit (Import + Laden) mit model.predict
+    from Profiling import LatencyHistogram
+    if export_path is None:
+        export_path = os.path.splitext(model_path)[0] + "_policy.npz"
+    meta = export_policy(model_path, export_path, algo)
+    _, model = _load_sb3_model(model_path, meta["algo"])
+    policy = NumpyPolicy(export_path)
+    observations = np.random.default_rng(seed).normal(0.0, 50.0, (n, meta["obs_dim"])).astype(np.float32)
+
+    results = {}
+    for name, predict in (("sb3", lambda o: int(model.predict(o, deterministic=True)[0])),
+                          ("numpy", policy.predict)):
+        histogram = LatencyHistogram()
+        actions = np.empty(n, dtype=np.int64)
+        for i, obs in enumerate(observations):
+            start = time.perf_counter()
+            actions[i] = predict(obs)
+            histogram.add(time.perf_counter() - start)
+        results[name] = {"latency_us": {k: v * 1e6 for k, v in histogram.summary().items() if k != "count"},
+                         "actions": actions}
+    agreement = float(np.mean(results["sb3"]["actions"] == results["numpy"]["actions"]))
+
+    algo_class = "DQN" if meta["algo"] == "dqn" else "PPO"
+    results["sb3"]["startup_s"] = _startup_seconds(
+        f"from stable_baselines3 import {algo_class}; {algo_class}.load({os.path.abspath(model_path)!r}, device='cpu')")
+    repo = os.path.dirname(os.path.abspath(__file__))
+    results["numpy"]["startup_s"] = _startup_seconds(
+        f"import sys; sys.path.insert(0, {repo!r}); from Drive import NumpyPolicy; NumpyPolicy({os.path.abspath(export_path)!r})")
+
+    print(f"[BENCH] {n} Entscheidungen, gleiche Aktion in {agreement * 100:.2f} %")
+    for name in ("sb3", "numpy"):
+        latency = results[name]["latency_us"]
+        print(f"[BENCH] {name:>5}: p50 {latency['p50']:8.1f} µs  p99 {latency['p99']:8.1f} µs  "
+              f"mean {latency['mean']:8.1f} µs  Start {results[name]['startup_s']:.2f} s")
+    return {"agreement": agreement,
+            **{name: {k: v for k, v in r.items() if k != "actions"} for name, r in results.items()}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trainierte Policy exportieren und ohne SB3 fahren")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="SB3-Modell (.zip) als NumPy-Gewichte (.npz) exportieren")
+    export_parser.add_argument("model")
+    export_parser.add_argument("out")
+    export_parser.add_argument("--algo", choices=("ppo", "dqn"), default=None)
+    export_parser.add_argument("--history", type=int, default=0, help="FRAME_HISTORY aus dem Training")
+    export_parser.add_argument("--track", default=None, help="Streckenindex (.npz) aus dem Training, z.B. track_cache/<TRACK_NAME>.npz")
+
+    drive_parser = commands.add_parser("drive", help="Mit exportierter Policy fahren")
+    drive_parser.add_argument("policy")
+    drive_parser.add_argument("--host", default="localhost")
+    drive_parser.add_argument("--port", type=int, default=1337)
+    drive_parser.add_argument("--episodes", type=int, default=None)
+    drive_parser.add_argument("--gamepad", default=None, help="Ausgabe-Backend (vgamepad, null, socket, ...)")
+
+    bench_parser = commands.add_parser("bench", help="Latenz und Startzeit mit model.predict vergleichen")
+    bench_parser.add_argument("model")
+    bench_parser.add_argument("--out", default=None)
+    bench_parser.add_argument("-n", type=int, default=5000)
+    bench_parser.add_argument("--algo", choices=("ppo", "dqn"), default=None)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        print(f"[INFO] Exportiert: {export_policy(args.model, args.out, args.algo, args.history, args.track)}")
+    elif args.command == "drive":
+        drive(args.policy, args.host, args.port, args.episodes, args.gamepad)
+    else:
+        benchmark(args.model, args.out, args.n, args.algo)
@@ -0,0 +1,266 @@
+import time
+import numpy as np
+import gymnasium as gym
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnvWrapper
+
+# Wrapper um TrackmaniaEnv bzw. ein VecEnv (z.B. TrackmaniaSimVecEnv).
+#
+# FixedRateWrapper: Agent entscheidet mit fester Frequenz statt so schnell, wie Frames ankommen;
+# jede Aktion wird action_repeat Frames lang gehalten, die Belohnungen werden aufsummiert.
+#
+# FrameHistory: Ringpuffer der letzten K Frames, pro Frame die 8 Rohwerte plus abgeleitete Größen
+# (Geschwindigkeit in x/y, Gierrate, Distanz pro Sekunde, Beschleunigung) aus der Differenz
+# zum vorherigen Frame und dessen Zeitstempel. Der Puffer ist doppelt so lang wie K und jedes
+# Frame wird an zwei Stellen abgelegt, so dass die letzten K Frames immer zusammenhängend
+# (ältestes zuerst) darin liegen – ohne np.roll. Die Wrapper geben davon jeweils eine Kopie zurück.
+#
+# TrackFeatureWrapper / VecTrackFeatures: hängen Streckenfortschritt (0..1) und seitlichen Abstand
+# zur Ideallinie (m) aus einem TrackIndex (Track_geometry.py) an die Beobachtung an; optional
+# Belohnung pro gefahrenem Streckenmeter und Strafe pro Meter Abstand. Vor FrameHistory anwenden,
+# dann laufen die beiden Spalten im Verlauf mit.
+
+RAW_FIELDS = 8
+DERIVED_FIELDS = ("vel_x", "vel_y", "yaw_rate", "dist_rate", "accel")
+FRAME_WIDTH = RAW_FIELDS + len(DERIVED_FIELDS)
+
+
+class FrameHistory:
+    def __init__(self, n_envs, history=4, raw_fields=RAW_FIELDS):
+        # raw_fields > 8: zusätzliche Spalten (z.B. Streckenmerkmale) werden ohne Ableitung mitgeführt
+        self.n_envs = n_envs
+        self.history = history
+        self.raw_fields = raw_fields
+        self.width = raw_fields + len(DERIVED_FIELDS)
+        self._buffer = np.zeros((n_envs, 2 * history, self.width), dtype=np.float32)
+        self._pos = 0
+        self._last = np.zeros((n_envs, raw_fields), dtype=np.float64)
+        self._last_stamp = np.zeros(n_envs)
+        self._frame = np.zeros((n_envs, self.width), dtype=np.float32)
+        self.out = np.zeros((n_envs, history * self.width), dtype=np.float32)
+
+    def reset(self, obs, stamp, mask=None):
+        # Verlauf der Envs in mask (Standard: alle) mit dem ersten Frame füllen, ohne Ableitungen
+        idx = slice(None) if mask is None else mask
+        self._last[idx] = obs[idx]
+        self._last_stamp[idx] = stamp if np.isscalar(stamp) else stamp[idx]
+        self._frame[idx, :self.raw_fields] = obs[idx]
+        self._frame[idx, self.raw_fields:] = 0.0
+        self._buffer[idx] = self._frame[idx, None, :]
+        self._write_out()
+        return self.out
+
+    def push(self, obs, stamp):
+        dt = stamp - self._last_stamp
+        valid = dt > 1e-6
+        inv_dt = np.where(valid, 1.0 / np.where(valid, dt, 1.0), 0.0)
+        last = self._last
+        frame = self._frame
+
+        d = self.raw_fields
+        frame[:, :d] = obs
+        frame[:, d] = (obs[:, 0] - last[:, 0]) * inv_dt
+        frame[:, d + 1] = (obs[:, 1] - last[:, 1]) * inv_dt
+        frame[:, d + 2] = (np.mod(obs[:, 4] - last[:, 4] + np.pi, 2 * np.pi) - np.pi) * inv_dt
+        frame[:, d + 3] = (obs[:, 3] - last[:, 3]) * inv_dt
+        frame[:, d + 4] = (obs[:, 2] - last[:, 2]) * inv_dt
+        last[:] = obs
+        self._last_stamp[:] = stamp
+
+        k = self.history
+        self._buffer[:, self._pos] = frame
+        self._buffer[:, self._pos + k] = frame
+        self._pos = (self._pos + 1) % k
+        self._write_out()
+        return self.out
+
+    def _write_out(self):
+        k = self.history
+        np.copyto(self.out.reshape(self.n_envs, k, self.width), self._buffer[:, self._pos:self._pos + k])
+
+
+def history_space(history, raw_fields=RAW_FIELDS):
+    return spaces.Box(low=-np.inf, high=np.inf, shape=(history * (raw_fields + len(DERIVED_FIELDS)),),
+                      dtype=np.float32)
+
+
+class FixedRateWrapper(gym.Wrapper):
+    # rate: Entscheidungen pro Sekunde, None = ohne Takt; die Wiederholungen einer Aktion werden
+    # gleichmäßig auf die Periode verteilt. Die Fristen laufen fest weiter (kein Aufsummieren von
+    # Verspätungen); liegt ein Schritt mehr als eine Periode zurück, wird neu synchronisiert.
+    def __init__(self, env, rate=20.0, action_repeat=1):
+        super().__init__(env)
+        if action_repeat < 1:
+            raise ValueError("action_repeat muss mindestens 1 sein")
+        self.action_repeat = action_repeat
+        self.period = None if rate is None else 1.0 / (rate * action_repeat)
+        self.deadline = None
+        self.stats = {"decisions": 0, "frames": 0, "overruns": 0}
+
+    def _wait_for_tick(self):
+        now = time.perf_counter()
+        if self.deadline is None or now - self.deadline > self.period:
+            if self.deadline is not None:
+                self.stats["overruns"] += 1
+            self.deadline = now
+            return
+        if self.deadline > now:
+            time.sleep(self.deadline - now)
+
+    def reset(self, **kwargs):
+        self.deadline = None
+        return self.env.reset(**kwargs)
+
+    def step(self, action):
+        total_reward = 0.0
+        for repeat in range(self.action_repeat):
+            if self.period is not None:
+                self._wait_for_tick()
+                self.deadline += self.period
+            obs, reward, terminated, truncated, info = self.env.step(action)
+            total_reward += reward
+            self.stats["frames"] += 1
+            if terminated or truncated:
+                break
+        self.stats["decisions"] += 1
+        info["action_repeat"] = repeat + 1
+        return obs, total_reward, terminated, truncated, info
+
+
+class FrameHistoryWrapper(gym.Wrapper):
+    # Für eine einzelne TrackmaniaEnv; Zeitstempel vom Hintergrund-Reader, sonst time.monotonic()
+    def __init__(self, env, history=4):
+        super().__init__(env)
+        raw_fields = env.observation_space.shape[0]
+        self.observation_space = history_space(history, raw_fields)
+        self.frames = FrameHistory(1, history, raw_fields)
+
+    def _stamp(self):
+        stamp = getattr(self.env.unwrapped, "obs_stamp", None)
+        return time.monotonic() if stamp is None else stamp
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        out = self.frames.reset(obs[None], self._stamp())
+        return out[0].copy(), info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        out = self.frames.push(obs[None], self._stamp())
+        return out[0].copy(), reward, terminated, truncated, info
+
+
+class VecFrameHistory(VecEnvWrapper):
+    # Batch-Variante für VecEnvs; dt = feste Zeit pro Schritt (Simulator), None = Uhrzeit.
+    # frames.out wird bei jedem Schritt überschrieben, SB3 hält die letzte Beobachtung aber per
+    # Referenz (_last_obs, Rollout-Puffer) – deshalb immer eine Kopie zurückgeben.
+    def __init__(self, venv, history=4, dt=None):
+        raw_fields = venv.observation_space.shape[0]
+        super().__init__(venv, observation_space=history_space(history, raw_fields))
+        self.frames = FrameHistory(venv.num_envs, history, raw_fields)
+        self.dt = dt
+        self._time = 0.0
+
+    def _stamp(self):
+        if self.dt is None:
+            return time.monotonic()
+        self._time += self.dt
+        return self._time
+
+    def reset(self):
+        obs = self.venv.reset()
+        return self.frames.reset(obs, self._stamp()).copy()
+
+    def step_wait(self):
+        obs, rewards, dones, infos = self.venv.step_wait()
+        stamp = self._stamp()
+        if not dones.any():
+            return self.frames.push(obs, stamp).copy(), rewards, dones, infos
+
+        # Beendete Envs: Verlauf mit dem letzten Frame der Episode abschließen, dann neu beginnen
+        frames = obs.copy()
+        done_idx = np.flatnonzero(dones)
+        for i in done_idx:
+            if "terminal_observation" in infos[i]:
+                frames[i] = infos[i]["terminal_observation"]
+        out = self.frames.push(frames, stamp)
+        for i in done_idx:
+            if "terminal_observation" in infos[i]:
+                infos[i]["terminal_observation"] = out[i].copy()
+        return self.frames.reset(obs, stamp, mask=dones).copy(), rewards, dones, infos
+
+
+class TrackFeatures:
+    # Gemeinsamer Kern: eine Batch-Abfrage pro Schritt für alle Envs
+    def __init__(self, track, n_envs, progress_reward=0.0, lateral_penalty=0.0):
+        self.track = track
+        self.progress_reward = progress_reward
+        self.lateral_penalty = lateral_penalty
+        self._s = np.zeros(n_envs)
+
+    def observe(self, obs):
+        progress, s, lateral, _ = self.track.query(obs[:, 0], obs[:, 1])
+        out = np.concatenate([obs, progress[:, None], lateral[:, None]], axis=1).astype(obs.dtype, copy=False)
+        return out, s, lateral
+
+    def reset(self, obs, mask=None):
+        out, s, _ = self.observe(obs)
+        idx = slice(None) if mask is None else mask
+        self._s[idx] = s[idx]
+        return out
+
+    def step(self, obs):
+        out, s, lateral = self.observe(obs)
+        shaping = (self.progress_reward * self.track.progress_delta(s, self._s)
+                   - self.lateral_penalty * np.abs(lateral))
+        self._s[:] = s
+        return out, shaping
+
+
+def track_space(space):
+    low = np.concatenate([space.low, [0.0, -np.inf]]).astype(space.dtype)
+    high = np.concatenate([space.high, [1.0, np.inf]]).astype(space.dtype)
+    return spaces.Box(low=low, high=high, dtype=space.dtype)
+
+
+class TrackFeatureWrapper(gym.Wrapper):
+    def __init__(self, env, track, progress_reward=0.0, lateral_penalty=0.0):
+        super().__init__(env)
+        self.observation_space = track_space(env.observation_space)
+        self.features = TrackFeatures(track, 1, progress_reward, lateral_penalty)
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        return self.features.reset(obs[None])[0], info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        out, shaping = self.features.step(obs[None])
+        return out[0], reward + float(shaping[0]), terminated, truncated, info
+
+
+class VecTrackFeatures(VecEnvWrapper):
+    def __init__(self, venv, track, progress_reward=0.0, lateral_penalty=0.0):
+        super().__init__(venv, observation_space=track_space(venv.observation_space))
+        self.features = TrackFeatures(track, venv.num_envs, progress_reward, lateral_penalty)
+
+    def reset(self):
+        return self.features.reset(self.venv.reset())
+
+    def step_wait(self):
+        obs, rewards, dones, infos = self.venv.step_wait()
+        if not dones.any():
+            out, shaping = self.features.step(obs)
+            return out, rewards + shaping.astype(rewards.dtype), dones, infos
+
+        # Beendete Envs: Belohnung aus dem letzten Frame der Episode, dann neu beginnen
+        frames = obs.copy()
+        done_idx = np.flatnonzero(dones)
+        for i in done_idx:
+            if "terminal_observation" in infos[i]:
+                frames[i] = infos[i]["terminal_observation"]
+        out, shaping = self.features.step(frames)
+        for i in done_idx:
+            if "terminal_observation" in infos[i]:
+                infos[i]["terminal_observation"] = out[i].copy()
+        return self.features.reset(obs, mask=dones), rewards + shaping.astype(rewards.dtype), dones, infos
@@ -0,0 +1,292 @@
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnvWrapper
+from Car_model import N_CHECKPOINTS
+from Env_wrappers import DERIVED_FIELDS, VecFrameHistory, VecTrackFeatures
+from Sim_vec_env import TrackmaniaSimVecEnv
+from Track_geometry import TrackIndex
+from Trajectory_recorder import iter_chunks
+
+# Offline-Bewertung gespeicherter Modelle im Simulator (Sim_vec_env.py) statt im Spiel:
+#   python Evaluate.py --dirs saved_models3 saved_models4 saved_models5 --episodes 16
+# Jede .zip wird in einem Worker-Prozess erst bei Bedarf geladen (PPO oder DQN, aus der Datei
+# erkannt) und fährt episodes Episoden deterministisch, je ein Auto pro Episode mit leicht
+# verschobenem Start (fester seed). Ergebnis pro Modell: Anteil fertiger Runden, Rundenzeit,
+# Zwischenzeiten pro Checkpoint und Belohnung. Ergebnisse landen in eval_cache.json unter dem
+# SHA-256 der Datei plus Einstellungen; ein erneuter Lauf bewertet nur neue oder geänderte Dateien.
+# Byte-gleiche Dateien (z.B. <prefix>_latest.zip/_best.zip als Kopie eines Zwischenstands) werden
+# nur einmal bewertet und als Alias beim regulären Namen aufgeführt.
+# Mit --recordings zusätzlich: Anteil der aufgezeichneten Aktionen, die das Modell genauso wählt.
+
+DEFAULT_DIRS = ("saved_models3", "saved_models4", "saved_models5")
+CACHE_FILE = "eval_cache.json"
+EVAL_VERSION = 1
+MAX_STEPS = 6000            # 5 min Simulationszeit bei dt = 0.05
+START_JITTER = 2.0          # m seitlich
+YAW_JITTER = 0.05           # rad
+HASH_CHUNK = 1 << 20
+ALIAS_SUFFIXES = ("_latest.zip", "_best.zip")   # Kopien von CheckpointCallback
+
+
+def discover(dirs=DEFAULT_DIRS, pattern="*.zip"):
+    # Alle Modelle in dirs; halb geschriebene Dateien von CheckpointCallback enden auf .tmp
+    paths = []
+    for directory in dirs:
+        paths.extend(p for p in glob.glob(os.path.join(directory, "**", pattern), recursive=True)
+                     if os.path.isfile(p))
+    return sorted(set(paths))
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(digest, settings):
+    return hashlib.sha256(json.dumps({"file": digest, "version": EVAL_VERSION, **settings},
+                                     sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def model_info(path):
+    # Algorithmus und Beobachtungsform aus den Metadaten der .zip, ohne torch zu laden
+    with zipfile.ZipFile(path) as archive:
+        data = json.loads(archive.read("data"))
+    module = data["policy_class"].get("__module__", "")
+    shape = data["observation_space"].get("_shape")
+    return ("dqn" if ".dqn." in module else "ppo"), (tuple(shape) if shape is not None else None)
+
+
+def _sim_stack(n_raw, seed, episodes, obs_dim):
+    # Simulator mit denselben Wrappern wie beim Training: 8 Rohwerte, optional Streckenmerkmale
+    # (+2, Track_geometry.py) und FrameHistory (K Frames zu je Rohwerten + 5 Ableitungen)
+    sim = TrackmaniaSimVecEnv(n_envs=episodes, start_jitter=START_JITTER, yaw_jitter=YAW_JITTER, seed=seed)
+    recorder = EpisodeRecorder(sim)
+    env = recorder
+    if n_raw == 10:
+        env = VecTrackFeatures(env, TrackIndex(sim.cars.track.centerline()))
+    if obs_dim != n_raw:
+        env = VecFrameHistory(env, obs_dim // (n_raw + len(DERIVED_FIELDS)), dt=sim.dt)
+    return env, recorder
+
+
+def _raw_fields(obs_dim):
+    for n_raw in (8, 10):
+        if obs_dim == n_raw or obs_dim % (n_raw + len(DERIVED_FIELDS)) == 0:
+            return n_raw
+    raise ValueError(f"Beobachtung mit {obs_dim} Werten passt zu keiner Simulator-Konfiguration")
+
+
+def _episode_summary(returns, lengths, splits):
+    laps = [s for s in splits if len(s) >= N_CHECKPOINTS]
+    lap_times = [float(sum(s[:N_CHECKPOINTS])) for s in laps]
+    return {
+        "episodes": len(returns),
+        "lap_rate": len(laps) / len(returns),
+        "mean_return": float(np.mean(returns)),
+        "std_return": float(np.std(returns)),
+        "mean_length": float(np.mean(lengths)),
+        "mean_checkpoints": float(np.mean([len(s) for s in splits])),
+        "best_lap": min(lap_times) if lap_times else None,
+        "mean_lap": float(np.mean(lap_times)) if lap_times else None,
+        # Mittlere Zeit pro Abschnitt über die fertigen Runden
+        "splits": np.mean([s[:N_CHECKPOINTS] for s in laps], axis=0).round(3).tolist() if laps else [],
+    }
+
+
+def _agreement(model, recordings, obs_dim, limit=100_000):
+    matches = total = 0
+    for chunk in iter_chunks(recordings):
+        obs = np.asarray(chunk["obs"], dtype=np.float32)
+        if obs.shape[1:] != (obs_dim,):
+            return None
+        actions, _ = model.predict(obs, deterministic=True)
+        matches += int(np.count_nonzero(actions == np.asarray(chunk["action"]).reshape(-1)))
+        total += len(obs)
+        if total >= limit:
+            break
+    return matches / total if total else None
+
+
+def evaluate_checkpoint(path, episodes=16, seed=0, recordings=None):
+    # Läuft im Worker-Prozess: Modell laden, alle Episoden parallel im Simulator fahren
+    import torch
+    from stable_baselines3 import DQN, PPO
+    torch.set_num_threads(1)
+
+    start = time.perf_counter()
+    algo, shape = model_info(path)
+    obs_dim = shape[0]
+    model = (DQN if algo == "dqn" else PPO).load(path, device="cpu")
+    env, recorder = _sim_stack(_raw_fields(obs_dim), seed, episodes, obs_dim)
+    try:
+        obs = env.reset()
+        for _ in range(MAX_STEPS):
+            actions, _ = model.predict(obs, deterministic=True)
+            obs, _, _, _ = env.step(actions)
+            if recorder.all_done:
+                break
+        result = {"algo": algo, **_episode_summary(*recorder.results())}
+        if recordings is not None:
+            result["agreement"] = _agreement(model, recordings, obs_dim)
+    finally:
+        env.close()
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+class EpisodeRecorder(VecEnvWrapper):
+    # Direkt über dem Simulator: Belohnung, Länge und Zwischenzeiten der ersten Episode jedes Autos
+    # aus den Rohwerten (Checkpoint-Flag, Zeit seit letztem Checkpoint). Nach seiner ersten Episode
+    # fährt ein Auto weiter, zählt aber nicht mehr.
+    def __init__(self, venv):
+        super().__init__(venv)
+        n = venv.num_envs
+        self.returns = np.zeros(n)
+        self.lengths = np.zeros(n, dtype=np.int64)
+        self.splits = [[] for _ in range(n)]
+        self.done = np.zeros(n, dtype=bool)
+
+    @property
+    def all_done(self):
+        return bool(self.done.all())
+
+    def reset(self):
+        return self.venv.reset()
+
+    def step_wait(self):
+        obs, rewards, dones, infos = self.venv.step_wait()
+        active = ~self.done
+        self.returns[active] += rewards[active]
+        self.lengths[active] += 1
+        for i in np.flatnonzero(active):
+            frame = infos[i].get("terminal_observation", obs[i]) if dones[i] else obs[i]
+            if frame[6]:
+                self.splits[i].append(float(frame[7]))
+        self.done |= dones
+        return obs, rewards, dones, infos
+
+    def results(self):
+        # Autos ohne Ende bis MAX_STEPS zählen mit ihrem Stand
+        return self.returns.tolist(), self.lengths.tolist(), self.splits
+
+
+def load_cache(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_cache(cache, path):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(cache, f, indent=1)
+    os.replace(tmp, path)
+
+
+def evaluate_all(paths, episodes=16, seed=0, workers=None, cache_path=CACHE_FILE, recordings=None):
+    # Hashen im Hauptprozess, Laden und Fahren nur für Dateien ohne Cache-Eintrag
+    settings = {"episodes": episodes, "seed": seed, "max_steps": MAX_STEPS, "start_jitter": START_JITTER,
+                "yaw_jitter": YAW_JITTER, "recordings": recordings}
+    cache = load_cache(cache_path)
+    # Gleiche Inhalte nur einmal; Aliasnamen zuletzt, damit der reguläre Dateiname gewinnt
+    entries = {}
+    for path in sorted(paths, key=lambda p: p.endswith(ALIAS_SUFFIXES)):
+        digest = file_hash(path)
+        if digest in entries:
+            entries[digest]["aliases"].append(path)
+        else:
+            entries[digest] = {"path": path, "sha256": digest, "mtime": os.path.getmtime(path), "aliases": []}
+
+    results = []
+    pending = {}
+    for digest, entry in entries.items():
+        key = cache_key(digest, settings)
+        if key in cache:
+            results.append({**cache[key], **entry, "cached": True})
+        else:
+            pending[entry["path"]] = (key, entry)
+    print(f"[EVAL] {len(entries)} Modelle ({len(paths) - len(entries)} doppelte Dateien), "
+          f"{len(entries) - len(pending)} aus dem Cache, {len(pending)} zu bewerten")
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = {pool.submit(evaluate_checkpoint, path, episodes, seed, recordings): path for path in pending}
+            for future in as_completed(futures):
+                path = futures[future]
+                key, entry = pending[path]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # Z.B. beschädigte .zip oder unbekannte Beobachtungsform; nicht cachen
+                    print(f"[WARN] {path}: {type(e).__name__}: {e}")
+                    results.append({**entry, "error": f"{type(e).__name__}: {e}", "cached": False})
+                    continue
+                cache[key] = result
+                save_cache(cache, cache_path)
+                results.append({**result, **entry, "cached": False})
+                print(f"[EVAL] {path}: Runden {result['lap_rate']:.0%}, Belohnung {result['mean_return']:.1f} "
+                      f"({result['seconds']:.0f} s)")
+    return rank(results)
+
+
+def rank(results):
+    # Erst Anteil fertiger Runden, dann mittlere Rundenzeit, dann Belohnung
+    def key(r):
+        if r.get("error"):
+            return (1, 0.0, 0.0, 0.0)
+        lap = r["mean_lap"] if r["mean_lap"] is not None else math.inf
+        return (0, -r["lap_rate"], lap, -r["mean_return"])
+    return sorted(results, key=key)
+
+
+def write_results(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=1)
+
+
+def print_table(results):
+    print(f"{'#':>3}  {'Runden':>6}  {'Bestzeit':>8}  {'Mittel':>8}  {'CPs':>5}  {'Belohnung':>10}  Modell")
+    for i, r in enumerate(results, 1):
+        if r.get("error"):
+            print(f"{i:3d}  {'Fehler':>6}  {'':>8}  {'':>8}  {'':>5}  {'':>10}  {r['path']}")
+            continue
+        best = f"{r['best_lap']:.2f}" if r["best_lap"] is not None else "-"
+        mean = f"{r['mean_lap']:.2f}" if r["mean_lap"] is not None else "-"
+        agreement = f"  (Übereinstimmung {r['agreement']:.0%})" if r.get("agreement") is not None else ""
+        aliases = "".join(f" = {os.path.basename(a)}" for a in r.get("aliases", ()))
+        print(f"{i:3d}  {r['lap_rate']:6.0%}  {best:>8}  {mean:>8}  {r['mean_checkpoints']:5.1f}  "
+              f"{r['mean_return']:10.1f}  {r['path']}{aliases}{agreement}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gespeicherte Modelle im Simulator bewerten und sortieren")
+    parser.add_argument("paths", nargs="*", help="Einzelne .zip-Dateien statt --dirs")
+    parser.add_argument("--dirs", nargs="+", default=list(DEFAULT_DIRS))
+    parser.add_argument("--episodes", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="Prozesse, Standard: alle Kerne")
+    parser.add_argument("--cache", default=CACHE_FILE)
+    parser.add_argument("--recordings", default=None, help="Aufnahme (Trajectory_recorder.py) für die Übereinstimmung")
+    parser.add_argument("--top", type=int, default=20, help="Zeilen in der Tabelle")
+    parser.add_argument("--out", default=None, help="Sortierte Ergebnisse zusätzlich als JSON")
+    args = parser.parse_args()
+
+    paths = args.paths or discover(args.dirs)
+    if not paths:
+        parser.error(f"Keine Modelle in {args.dirs}")
+    results = evaluate_all(paths, args.episodes, args.seed, args.workers, args.cache, args.recordings)
+    if args.out is not None:
+        write_results(results, args.out)
+    print_table(results[:args.top])
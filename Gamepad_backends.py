@@ -0,0 +1,169 @@
+import socket
+import time
+from collections import deque
+
+try:
+    import vgamepad as vg
+except ImportError:  # vgamepad/ViGEmBus gibt es nur unter Windows
+    vg = None
+
+
+# Tastencodes wie vg.XUSB_BUTTON, damit die Umgebung auch ohne vgamepad funktioniert
+class _FallbackButtons:
+    XUSB_GAMEPAD_DPAD_UP = 0x0001
+    XUSB_GAMEPAD_DPAD_DOWN = 0x0002
+    XUSB_GAMEPAD_DPAD_LEFT = 0x0004
+    XUSB_GAMEPAD_DPAD_RIGHT = 0x0008
+    XUSB_GAMEPAD_START = 0x0010
+    XUSB_GAMEPAD_BACK = 0x0020
+    XUSB_GAMEPAD_A = 0x1000
+    XUSB_GAMEPAD_B = 0x2000
+    XUSB_GAMEPAD_X = 0x4000
+    XUSB_GAMEPAD_Y = 0x8000
+
+
+XUSB_BUTTON = vg.XUSB_BUTTON if vg is not None else _FallbackButtons
+
+# Eingabe-Port des SocketGamepad relativ zum Telemetrie-Port (1337 -> 1437)
+INPUT_PORT_OFFSET = 100
+
+
+class OutputBackend:
+    # Ausgabe der Steuerung mit der Schnittstelle von vg.VX360Gamepad. Die Setter ändern nur den
+    # gewünschten Zustand; update() gibt ihn nur dann mit einem einzigen Report aus, wenn er sich
+    # seit dem letzten Report geändert hat. Unterklassen implementieren _send().
+    def __init__(self):
+        self.steer = 0.0
+        self.gas = 0.0
+        self.brake = 0.0
+        self.buttons = 0
+        self._sent = None
+        self.stats = {"updates": 0, "reports": 0}
+
+    def left_joystick_float(self, x_value_float, y_value_float):
+        self.steer = float(x_value_float)
+
+    def right_trigger_float(self, value_float):
+        self.gas = float(value_float)
+
+    def left_trigger_float(self, value_float):
+        self.brake = float(value_float)
+
+    def press_button(self, button):
+        self.buttons |= button
+
+    def release_button(self, button):
+        self.buttons &= ~button
+
+    def update(self):
+        self.stats["updates"] += 1
+        state = (self.steer, self.gas, self.brake, self.buttons)
+        if state == self._sent:
+            return False
+        self._send(state, self._sent)
+        self._sent = state
+        self.stats["reports"] += 1
+        return True
+
+    def _send(self, state, previous):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class VGamepadBackend(OutputBackend):
+    # Virtueller Xbox-Controller (Windows, ViGEmBus); setzt nur geänderte Werte, dann ein update()
+    def __init__(self):
+        super().__init__()
+        if vg is None:
+            raise ImportError("vgamepad ist nicht installiert – ohne Controller erreicht keine Aktion das Spiel. "
+                              "Für Tests ohne Spiel gamepad=\"null\" (oder \"socket\" für Mock_plugin.py) angeben.")
+        self.pad = vg.VX360Gamepad()
+
+    def _send(self, state, previous):
+        steer, gas, brake, buttons = state
+        old_steer, old_gas, old_brake, old_buttons = previous if previous is not None else (None, None, None, 0)
+        pad = self.pad
+        if steer != old_steer:
+            pad.left_joystick_float(x_value_float=steer, y_value_float=0.0)
+        if gas != old_gas:
+            pad.right_trigger_float(gas)
+        if brake != old_brake:
+            pad.left_trigger_float(brake)
+        for bit in _bits(buttons & ~old_buttons):
+            pad.press_button(bit)
+        for bit in _bits(old_buttons & ~buttons):
+            pad.release_button(bit)
+        pad.update()
+
+
+class NullGamepad(OutputBackend):
+    # Gamepad ohne Wirkung, z.B. für Tests unter Linux
+    def _send(self, state, previous):
+        pass
+
+
+class RecordingGamepad(OutputBackend):
+    # Merkt sich jeden ausgegebenen Report als (time.monotonic(), steer, gas, brake, buttons)
+    def __init__(self, maxlen=None):
+        super().__init__()
+        self.reports = deque(maxlen=maxlen)
+
+    def _send(self, state, previous):
+        self.reports.append((time.monotonic(),) + state)
+
+
+class SocketGamepad(OutputBackend):
+    # Schickt jeden Report als Textzeile "steer,gas,brake,buttons\n" an einen Eingabe-Port,
+    # z.B. an Mock_plugin.py (--input-port); das Openplanet-Plugin kann keine Eingaben setzen
+    def __init__(self, host="localhost", port=1337 + INPUT_PORT_OFFSET):
+        super().__init__()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            self.sock.connect((host, port))
+        except OSError as e:
+            self.sock.close()
+            raise ConnectionError(f"Verbindung zum Eingabe-Port {host}:{port} fehlgeschlagen: {e}") from e
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send(self, state, previous):
+        self.sock.sendall(encode_input(*state))
+
+    def close(self):
+        self.sock.close()
+
+
+def encode_input(steer, gas, brake, buttons):
+    return f"{steer!r},{gas!r},{brake!r},{int(buttons)}\n".encode("utf-8")
+
+
+def parse_input(line):
+    steer, gas, brake, buttons = line.strip().split(b"," if isinstance(line, bytes) else ",")
+    return float(steer), float(gas), float(brake), int(buttons)
+
+
+def _bits(mask):
+    bit = 1
+    while mask:
+        if mask & 1:
+            yield bit
+        mask >>= 1
+        bit <<= 1
+
+
+BACKENDS = ("vgamepad", "null", "recording", "socket")
+
+
+def make_gamepad(backend=None, host="localhost", port=1337 + INPUT_PORT_OFFSET):
+    # backend=None: vgamepad; fehlt es, ImportError statt stillem Training ohne Eingaben.
+    # NullGamepad nur, wenn ausdrücklich "null" angegeben ist.
+    if backend is None or backend == "vgamepad":
+        return VGamepadBackend()
+    if backend == "null":
+        return NullGamepad()
+    if backend == "recording":
+        return RecordingGamepad()
+    if backend == "socket":
+        return SocketGamepad(host, port)
+    raise ValueError(f"Unbekanntes Gamepad-Backend: {backend} (erlaubt: {BACKENDS})")
@@ -1,72 +1,23 @@
-import socket
 import numpy as np
 import gymnasium as gym
 from gymnasium import spaces
 import time
-import vgamepad as vg
-
-class TelemetryClient:
-    def __init__(self, host='localhost', port=1337):
-        self.server_address = (host, port)
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-
-        try:
-            self.sock.connect(self.server_address)
-            #print("[INFO] Verbunden mit dem Server auf Port 1337.")
-        except Exception as e:
-            #print(f"[ERROR] Verbindung zum Server fehlgeschlagen: {e}")
-            exit(1)
-
-    def _get_obs(self):
-        try:
-            data = self.sock.recv(1024)
-            decoded = data.decode("utf-8", errors="ignore").strip()
-
-            # Mehrere Zeilen möglich
-            lines = decoded.split("\n")
-            for line in lines:
-                if not line.strip():
-                    continue
-
-                parts = line.strip().split(",")
- 
-                x, y, speed, dist, yaw, pitch, cp, delta_time = map(float, parts)
-                cp = int(cp)
-                if cp != -1:
-                    cp_changed = 1
-                else :
-                    cp_changed = 0
-
-
-                return np.array([x, y, speed, dist, yaw, pitch, cp_changed, delta_time], dtype= np.float32)
-
-
-        except Exception as e:
-            #print(f"[ERROR] Fehler beim Empfangen: {e}")
-            return None
-
-
-    def close(self):
-        self.sock.close()
-        #print("[INFO] Verbindung zum Server geschlossen.")
+from Gamepad_backends import INPUT_PORT_OFFSET, make_gamepad
+from Car_model import ACTIONS
+from Reset_sequence import ResetSequence, RESPAWN_STEPS, FINISH_STEPS
+from Telemetry_client import DEFAULT_FIELDS, TelemetryClient
+from Telemetry_reader import TelemetryReader
+from Telemetry_hub import HubReader
+from Profiling import Profiler
 
+RESET_MAX_BACKOFF = 60.0  # s zwischen zwei Warnungen, solange keine Telemetrie kommt
 
 class TrackmaniaEnv(gym.Env):
     metadata = {"render_modes": []}
 
-    def append_float_to_txt(self,filename: str, value: float):
-        try:
-            with open(filename, "a") as f:
-                f.write(f"{value}\n")
-            #print(f"[INFO] Wert {value} in {filename} gespeichert.")
-        except Exception as e:
-            pass
-
-
-
-
-    def __init__(self):
+    def __init__(self, host="localhost", port=1337, gamepad=None, protocol="csv", telemetry_mode="latest",
+                 background_reader=False, reader_wait=True, obs_timeout=5.0, reset_confirm_timeout=2.0,
+                 profile=False, extra_fields=(), rate=None, hub=None, reset_wait_limit=None):
         super(TrackmaniaEnv, self).__init__()
         self.last_reward = 0
         self.low_speed_start_time = None
@@ -80,105 +31,228 @@ class TrackmaniaEnv(gym.Env):
         self.average_delta = [-1] * 10
         self.checkpoint_counter = 0 
 
+        # Zusätzliche Felder (z.B. "vel_x", "vel_y") oder eine Rate (Frames/s, "pull") werden beim
+        # Plugin abonniert (Telemetry_client.py); die 8 Standardwerte stehen immer vorne
+        fields = DEFAULT_FIELDS + tuple(extra_fields) if extra_fields or rate is not None else None
+
         self.observation_space = spaces.Box(
             low=-np.inf,
             high=np.inf,
-            shape=(8,),
+            shape=(len(DEFAULT_FIELDS) + len(extra_fields),),
             dtype=np.float32
         )
 
-        self.client = TelemetryClient()
         self.current_obs = None
 
-        try:
-            self.gamepad = vg.VX360Gamepad()
-        except Exception as e:
-            #print(f"[ERROR] Gamepad konnte nicht initialisiert werden: {e}")
-            exit(1)
-
-    def _get_valid_obs(self):
-        while True:
-            obs = self.client._get_obs()
-            if obs is not None:
-                return obs
+        # Optional: Hintergrund-Thread liest die Telemetrie, step() liest nur noch den Slot.
+        # reader_wait=True wartet auf ein Frame, das nach dem Senden der Aktion ankam,
+        # reader_wait=False nimmt ohne zu warten das neueste vorhandene Frame.
+        # Mit hub (Name des Shared Memory von Telemetry_hub.py) liest die Env die Frames ihres
+        # Ports aus dem Hub statt über einen eigenen Socket; Felder und Rate legt dann der Hub fest.
+        if hub is not None:
+            self.reader = HubReader(hub, port=port, fields=fields)
+            if self.reader.n_fields != self.observation_space.shape[0]:
+                self.reader.close()
+                raise ValueError(f"Hub {hub} liefert {self.reader.n_fields} Felder, "
+                                 f"erwartet {self.observation_space.shape[0]}")
+            self.client = self.reader
+        else:
+            self.client = TelemetryClient(host, port, protocol=protocol, mode=telemetry_mode, fields=fields, rate=rate)
+            self.reader = TelemetryReader(self.client).start() if background_reader else None
+        self.reader_wait = reader_wait
+        self.sent_seq = 0
+        self.obs_stamp = None
+
+        # Sekunden ohne gültiges Frame (z.B. Spiel pausiert), bis die Episode abgebrochen wird
+        self.obs_timeout = obs_timeout
+        # reset() wartet ohne Telemetrie mit wachsenden Abständen (bis RESET_MAX_BACKOFF), bis wieder
+        # Frames kommen; erst nach reset_wait_limit Sekunden TimeoutError, None = unbegrenzt
+        self.reset_wait_limit = reset_wait_limit
+
+        # Laufender Reset (Reset_sequence.py): wird in step() gestartet und in reset() zu Ende geführt
+        self.reset_sequence = None
+        self.reset_confirm_timeout = reset_confirm_timeout
+
+        # Zeitmessung pro Phase (Profiling.py), abgeholt über take_profile(); None = aus
+        self.profiler = Profiler() if profile else None
+        self.client.profiler = self.profiler
+        self.action_stamp = None
+        self._tick_offset = None
+
+        # Pro Instanz eine eigene Ausgabe (Gamepad_backends.py): Objekt oder Name des Backends
+        # ("vgamepad", "null", "recording", "socket"); None = vgamepad (ImportError, wenn nicht installiert)
+        if gamepad is None or isinstance(gamepad, str):
+            gamepad = make_gamepad(gamepad, host, port + INPUT_PORT_OFFSET)
+        self.gamepad = gamepad
+
+    def _get_valid_obs(self, timeout=None):
+        # None, wenn innerhalb von timeout (Standard: obs_timeout) kein gültiges Frame ankam
+        if timeout is None:
+            timeout = self.obs_timeout
+        if self.reader is not None:
+            return self._get_reader_obs(timeout)
+        return self.client._get_obs(timeout=timeout)
+
+    def _get_reader_obs(self, timeout):
+        if self.reader_wait or self.reader.seq == 0:
+            obs, seq, stamp = self.reader.wait_newer(self.sent_seq, timeout=timeout)
+        else:
+            obs, seq, stamp = self.reader.latest()
+        if self.reader.error is not None:
+            raise RuntimeError(f"Telemetrie-Thread beendet: {self.reader.error}")
+        if obs is None:
+            self.client.stats["timeouts"] += 1
+        else:
+            self.obs_stamp = stamp
+            self.sent_seq = seq
+        return obs
+
+    def take_profile(self):
+        # Für ProfilingCallback (auch über SubprocVecEnv.env_method)
+        return self.profiler.take() if self.profiler is not None else {}
+
+    def _profile_obs(self):
+        # Alter der Beobachtung und, mit Zeitstempel vom Plugin, Latenz Aktion -> Frame
+        profiler = self.profiler
+        now = time.monotonic()
+        received = now
+        if self.reader is not None and self.obs_stamp is not None:
+            received = self.obs_stamp
+            profiler.add("obs_age", now - received)
+        tick = (self.reader or self.client).tick
+        if tick is None:
+            return
+        # Uhrenabgleich Spiel -> Python: kleinster beobachteter Abstand = Frame ohne Verzögerung
+        offset = received - tick / 1000.0
+        if self._tick_offset is None or offset < self._tick_offset:
+            self._tick_offset = offset
+        produced = tick / 1000.0 + self._tick_offset
+        profiler.add("frame_age", now - produced)
+        if produced >= self.action_stamp:
+            profiler.add("action_to_obs", received - self.action_stamp)
 
     def _send_action_to_gamepad(self, action):
-        self.gamepad.left_joystick_float(x_value_float=0.0, y_value_float=0.0)
-        self.gamepad.right_trigger_float(0.0)
-        self.gamepad.left_trigger_float(0.0)
-
-        if action == 0:
-            self.gamepad.left_joystick_float(x_value_float=-1.0, y_value_float=0.0)
-            self.gamepad.right_trigger_float(1.0)
-        elif action == 1:
-            self.gamepad.left_joystick_float(x_value_float=0.0, y_value_float=0.0)
-            self.gamepad.right_trigger_float(1.0)
-        elif action == 2:
-            self.gamepad.left_joystick_float(x_value_float=1.0, y_value_float=0.0)
-            self.gamepad.right_trigger_float(1.0)
-        elif action == 3:
-            self.gamepad.left_trigger_float(1.0)
-
+        if self.profiler is None:
+            return self._apply_action(action)
+        start = time.perf_counter()
+        self._apply_action(action)
+        self.profiler.add("gamepad", time.perf_counter() - start)
+
+    def _apply_action(self, action):
+        # Kompletter Zustand pro Aktion; das Backend sendet nur, wenn sich etwas geändert hat
+        steer, gas, brake = ACTIONS[int(action)]
+        self.gamepad.left_joystick_float(x_value_float=steer, y_value_float=0.0)
+        self.gamepad.right_trigger_float(gas)
+        self.gamepad.left_trigger_float(brake)
         self.gamepad.update()
 
     def reset(self, seed=None, options=None):
+        if self.profiler is None:
+            return self._reset(seed)
+        start = time.perf_counter()
+        result = self._reset(seed)
+        self.profiler.add("reset", time.perf_counter() - start)
+        return result
+
+    def _reset(self, seed=None):
         super().reset(seed=seed)
         #print("[ENV] Resetting environment...")
-        time.sleep(1)
-        self.current_obs = self._get_valid_obs()
+        # Sonst bricht die neue Episode beim ersten langsamen Frame sofort wieder ab
+        self.low_speed_start_time = None
+        if self.reader is not None:
+            self.sent_seq = self.reader.seq
+        if self.reset_sequence is not None:
+            self.current_obs = self._finish_reset()
+        else:
+            self.current_obs = self._get_valid_obs()
+        while self.current_obs is None:
+            self._wait_for_telemetry()
+            # Spiel lief wieder an, das Auto steht aber irgendwo: Episode sauber neu starten
+            self._perform_reset()
+            self.current_obs = self._finish_reset()
         return self.current_obs, {}
 
-    def _perform_reset(self):
-        print("[ENV] Reset wird über Gamepad ausgelöst.")
-        print (self.checkpoint_counter)
-        if self.checkpoint_counter == 10:
-            time.sleep(6)
-            # 1. Drücken nach unten
-            self.gamepad.press_button(vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN)
-            self.gamepad.update()
-            time.sleep(0.2)  # Kurze Pause
-            self.gamepad.release_button(vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN)
-            self.gamepad.update()
-
-            # 2. Drücken der "A"-Taste
-            self.gamepad.press_button(vg.XUSB_BUTTON.XUSB_GAMEPAD_A)
-            self.gamepad.update()
-            time.sleep(0.2)  # Kurze Pause
-            self.gamepad.release_button(vg.XUSB_BUTTON.XUSB_GAMEPAD_A)
-            self.gamepad.update()
-
-            # 3. Drücken nach oben
-            self.gamepad.press_button(vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP)
-            self.gamepad.update()
-            time.sleep(0.2)  # Kurze Pause
-            self.gamepad.release_button(vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP)
-            self.gamepad.update()
-
-            # 4. Erneutes Drücken der "A"-Taste
-            self.gamepad.press_button(vg.XUSB_BUTTON.XUSB_GAMEPAD_A)
-            self.gamepad.update()
-            time.sleep(0.2)  # Kurze Pause
-            self.gamepad.release_button(vg.XUSB_BUTTON.XUSB_GAMEPAD_A)
-            self.gamepad.update()
-            self.checkpoint_counter = 0
-
-        else :
-            self.gamepad.press_button(vg.XUSB_BUTTON.XUSB_GAMEPAD_B)
-            self.gamepad.update()
-            time.sleep(0.2)
-            self.gamepad.release_button(vg.XUSB_BUTTON.XUSB_GAMEPAD_B)
-            self.gamepad.update()
-        
+    def _wait_for_telemetry(self):
+        # Spiel pausiert o.ä.: warten statt abbrechen, damit model.learn weiterläuft
+        waited = self.obs_timeout
+        backoff = self.obs_timeout
+        while True:
+            if self.reset_wait_limit is not None and waited >= self.reset_wait_limit:
+                raise TimeoutError(f"Keine Telemetrie innerhalb von {waited:.0f} s empfangen")
+            print(f"[WARN] Keine Telemetrie seit {waited:.1f} s (Spiel pausiert?), warte {backoff:.1f} s ...")
+            if self._get_valid_obs(timeout=backoff) is not None:
+                print("[ENV] Telemetrie wieder da, starte Episode neu.")
+                return
+            waited += backoff
+            backoff = min(2 * backoff, RESET_MAX_BACKOFF)
 
-    
+    def _perform_reset(self):
+        # Startet nur die Tastenfolge; step() kehrt sofort zurück, reset() wartet auf die Bestätigung
+        #print("[ENV] Reset wird über Gamepad ausgelöst.")
+        steps = FINISH_STEPS if self.checkpoint_counter == 10 else RESPAWN_STEPS
+        distance = self.current_obs[3] if self.current_obs is not None else None
+        self.reset_sequence = ResetSequence(self.gamepad, steps, confirm_timeout=self.reset_confirm_timeout).start(
+            distance=distance)
         self.checkpoint_counter = 0
 
-
-
+    def _finish_reset(self):
+        # Schaltet die Reset-Sequenz mit jedem Frame bzw. jeder Frist weiter, ohne zu schlafen
+        sequence = self.reset_sequence
+        timeouts = self.client.stats["timeouts"]
+        obs = None
+        last_frame = time.monotonic()
+        while not sequence.done:
+            frame = self._get_valid_obs(timeout=sequence.timeout())
+            now = time.monotonic()
+            if frame is not None:
+                obs, last_frame = frame, now
+            elif now - last_frame >= self.obs_timeout:
+                sequence.cancel()
+                break
+            sequence.advance(frame, now)
+        # Abgelaufene Fristen der Sequenz sind keine Telemetrie-Timeouts
+        self.client.stats["timeouts"] = timeouts
+        self.reset_sequence = None
+
+        if obs is None:
+            obs = self._get_valid_obs()
+        if obs is not None:
+            # Checkpoint-Ereignisse aus dem Respawn gehören zu keiner Episode
+            (self.reader or self.client).clear_checkpoints()
+            obs[6] = 0.0
+            obs[7] = -1.0
+        return obs
 
     def step(self, action):
+        if self.profiler is None:
+            return self._step(action)
+        start = time.perf_counter()
+        result = self._step(action)
+        self.profiler.add("step", time.perf_counter() - start)
+        return result
+
+    def _step(self, action):
         self._send_action_to_gamepad(action)
-        obs = self._get_valid_obs()
+        if self.reader is not None:
+            self.sent_seq = self.reader.seq
+        if self.profiler is None:
+            obs = self._get_valid_obs()
+        else:
+            self.action_stamp = time.monotonic()
+            start = time.perf_counter()
+            obs = self._get_valid_obs()
+            self.profiler.add("obs_wait", time.perf_counter() - start)
+            if obs is not None:
+                self._profile_obs()
+        if obs is None:
+            # Keine Telemetrie mehr (Spiel pausiert o.ä.): Episode abbrechen statt ewig zu warten
+            # Episodenbelohnung und -länge liefert Monitor im "episode"-Eintrag (Training_callbacks.MetricsCallback)
+            info = {"reason": "telemetry_timeout", "checkpoints": self.checkpoint_counter,
+                    "telemetry": dict(self.client.stats)}
+            self.reward_sum = 0
+            self.checkpoint_counter = 0
+            self.low_speed_start_time = None
+            return self.current_obs, 0.0, False, True, info
         speed = obs[2]
         current_distance = obs[3]
         previous_distance = self.current_obs[3]
@@ -200,7 +274,6 @@ class TrackmaniaEnv(gym.Env):
                 reward += 3
                 self.average_delta[self.checkpoint_counter] = delta_time
             self.checkpoint_counter += 1
-            print (self.checkpoint_counter)
 
         if self.checkpoint_counter == 10:
             reward += 5
@@ -229,12 +302,24 @@ class TrackmaniaEnv(gym.Env):
                 self.low_speed_start_time = now
             elif now - self.low_speed_start_time >= self.low_speed_duration or self.checkpoint_counter == 10:
                 #print("[INFO] Fahrzeug zu langsam – Reset über Taste B.")
+                info = {"reason": "low_speed", "checkpoints": self.checkpoint_counter,
+                        "telemetry": dict(self.client.stats)}
                 self._perform_reset()
-                self.append_float_to_txt(filename="rewards.txt", value = self.reward_sum)
                 self.reward_sum = 0
-                return obs, reward, False, True, {"reason": "low_speed"}
+                return obs, reward, False, True, info
             
         else:
             self.low_speed_start_time = None
         
         return obs, reward, False, False, {}
+
+    def close(self):
+        if self.reset_sequence is not None:
+            self.reset_sequence.cancel()
+        close_gamepad = getattr(self.gamepad, "close", None)
+        if close_gamepad is not None:
+            close_gamepad()
+        if self.reader is not None:
+            self.reader.stop()
+        else:
+            self.client.close()
@@ -0,0 +1,105 @@
+import csv
+import os
+import threading
+import numpy as np
+
+# Sammelt Kennzahlen (Schritte, Episoden, Losses) im Speicher und schreibt sie gebündelt:
+# pro Stream ein vorab angelegter Puffer, ein Hintergrund-Thread tauscht ihn alle flush_interval
+# Sekunden (oder wenn er voll ist) gegen einen leeren aus und hängt den Inhalt an
+# <log_dir>/<stream>.csv an bzw. schreibt ihn nach TensorBoard. record() selbst macht kein I/O.
+
+
+class _Stream:
+    def __init__(self, name, columns, capacity):
+        self.name = name
+        self.columns = list(columns)
+        self.capacity = capacity
+        self.active = np.empty((capacity, 1 + len(columns)))
+        self.spare = np.empty_like(self.active)
+        self.count = 0
+
+
+class MetricsSink:
+    def __init__(self, log_dir="metrics", flush_interval=10.0, capacity=4096, tensorboard_dir=None,
+                 tensorboard_streams=("episode", "loss")):
+        self.log_dir = log_dir
+        self.flush_interval = flush_interval
+        self.capacity = capacity
+        self.tensorboard_streams = set(tensorboard_streams)
+        os.makedirs(log_dir, exist_ok=True)
+
+        self.writer = None
+        if tensorboard_dir is not None:
+            try:
+                from torch.utils.tensorboard import SummaryWriter
+                self.writer = SummaryWriter(tensorboard_dir)
+            except ImportError:
+                print("[WARN] TensorBoard nicht verfügbar – Kennzahlen nur als CSV.")
+
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="MetricsSink", daemon=True)
+        self._thread.start()
+
+    def record(self, stream, step, **values):
+        # Spalten werden beim ersten Aufruf eines Streams festgelegt
+        with self._lock:
+            s = self._streams.get(stream)
+            if s is None:
+                s = self._streams[stream] = _Stream(stream, values, self.capacity)
+            row = s.active[s.count]
+            row[0] = step
+            for i, column in enumerate(s.columns, 1):
+                row[i] = values.get(column, np.nan)
+            s.count += 1
+            full = s.count == s.capacity
+        if full:
+            # Nicht auf den Timer warten; wenn der Thread nicht hinterherkommt, selbst schreiben
+            self._flush_stream(s)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _flush_stream(self, s):
+        with self._io_lock:
+            with self._lock:
+                if s.count == 0:
+                    return
+                rows, n = s.active, s.count
+                s.active, s.spare, s.count = s.spare, s.active, 0
+            self._write(s, rows[:n])
+
+    def _write(self, s, rows):
+        path = os.path.join(self.log_dir, f"{s.name}.csv")
+        new_file = not os.path.exists(path)
+        with open(path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["step"] + s.columns)
+            writer.writerows(rows.tolist())
+        if self.writer is not None and s.name in self.tensorboard_streams:
+            for row in rows:
+                step = int(row[0])
+                for column, value in zip(s.columns, row[1:]):
+                    if not np.isnan(value):
+                        self.writer.add_scalar(f"{s.name}/{column}", value, step)
+
+    def flush(self):
+        for s in list(self._streams.values()):
+            self._flush_stream(s)
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval + 1.0)
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
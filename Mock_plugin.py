@@ -0,0 +1,338 @@
+import argparse
+import select
+import socket
+import threading
+import time
+import numpy as np
+from Car_model import CarState, step_cars, telemetry_frames, autopilot
+from Gamepad_backends import XUSB_BUTTON, parse_input
+from Telemetry_client import (
+    DEFAULT_FIELDS, HANDSHAKE_GRACE, KNOWN_FIELDS, PULL,
+    encode_csv_frame, encode_binary_frame, encode_subscription, parse_subscription,
+)
+
+# Ersatz für das Openplanet-Plugin (main.as), z.B. für Tests und Benchmarks unter Linux:
+# lauscht auf einem Port, nimmt einen Client an und sendet Telemetrie im selben Format.
+# Die Frames stammen entweder aus Car_model (gesteuert über FakeGamepad oder Autopilot)
+# oder aus einer aufgezeichneten Telemetriedatei (eine CSV-Zeile pro Frame).
+# Mit input_port nimmt der Server zusätzlich Eingaben von Gamepad_backends.SocketGamepad an.
+# Wie main.as beantwortet er ein Abo ("SUB ...", siehe Telemetry_client.py): Felder, Rate in
+# simulierter Zeit bzw. "pull" und Kodierung gelten dann für diese Verbindung.
+
+
+class FakeGamepad:
+    # Schnittstelle von vg.VX360Gamepad; der Zustand wird bei update() für den Server übernommen
+    def __init__(self):
+        self._steer = 0.0
+        self._gas = 0.0
+        self._brake = 0.0
+        self._buttons = 0
+        self.state = (0.0, 0.0, 0.0)
+        self.buttons = 0
+        self._presses = 0
+        self._lock = threading.Lock()
+
+    def left_joystick_float(self, x_value_float, y_value_float):
+        self._steer = x_value_float
+
+    def right_trigger_float(self, value_float):
+        self._gas = value_float
+
+    def left_trigger_float(self, value_float):
+        self._brake = value_float
+
+    def press_button(self, button):
+        self._buttons |= button
+
+    def release_button(self, button):
+        self._buttons &= ~button
+
+    def update(self):
+        with self._lock:
+            # Kurze Tastendrücke zwischen zwei Ticks sollen nicht verloren gehen
+            self._presses |= self._buttons & ~self.buttons
+            self.buttons = self._buttons
+            self.state = (self._steer, self._gas, self._brake)
+
+    def take_presses(self):
+        with self._lock:
+            presses, self._presses = self._presses, 0
+        return presses
+
+
+class MockPluginServer:
+    # tick_rate: Frames pro Sekunde (Echtzeit), 0 = so schnell wie der Client liest
+    # dt:        simulierte Zeit pro Frame, standardmäßig 1 / tick_rate bzw. 1/60 s
+    def __init__(self, host="127.0.0.1", port=1337, protocol="csv", tick_rate=60.0, dt=None,
+                 gamepad=None, replay=None, use_autopilot=False, track=None, record=None,
+                 tick_stamp=False, input_port=None):
+        self.protocol = protocol
+        self.tick_rate = tick_rate
+        self.dt = dt if dt is not None else (1.0 / tick_rate if tick_rate > 0 else 1.0 / 60.0)
+        self.gamepad = gamepad if gamepad is not None else FakeGamepad()
+        self.use_autopilot = use_autopilot
+        self.replay = np.loadtxt(replay, delimiter=",", ndmin=2) if replay is not None else None
+        self.record = record
+        # Wie die Plugin-Einstellung "Tick stamp": Zeit seit Serverstart in ms an jedes Frame
+        self.tick_stamp = tick_stamp
+        self._started = time.monotonic()
+        self.car = CarState(1, track)
+        self.frames_sent = 0
+        self.frames_generated = 0
+        self._last_xy = None
+        # Zuletzt bestätigtes Abo (None = Verbindung ohne Handshake)
+        self.subscription = None
+
+        self.server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_sock.bind((host, port))
+        self.server_sock.listen(1)
+        self.server_sock.settimeout(0.2)
+        self.address = self.server_sock.getsockname()
+        self.port = self.address[1]
+
+        self.input_sock = None
+        self.input_port = None
+        if input_port is not None:
+            self.input_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.input_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.input_sock.bind((host, input_port))
+            self.input_sock.listen(1)
+            self.input_sock.settimeout(0.2)
+            self.input_port = self.input_sock.getsockname()[1]
+
+        self._running = False
+        self._thread = None
+        self._input_thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self.serve_forever, name=f"MockPlugin:{self.port}", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._running = True
+        if self.input_sock is not None and self._input_thread is None:
+            self._input_thread = threading.Thread(target=self._serve_inputs, name=f"MockInput:{self.input_port}", daemon=True)
+            self._input_thread.start()
+        print(f"[MOCK] Lausche auf Port {self.port}...")
+        while self._running:
+            try:
+                conn, _ = self.server_sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            print("[MOCK] Client verbunden.")
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                subscription, pending = self._handshake(conn)
+                if subscription is not False:
+                    self._stream(conn, subscription, pending)
+            except OSError:
+                print("[MOCK] Senden fehlgeschlagen. Trenne Client.")
+            finally:
+                conn.close()
+
+    def _serve_inputs(self):
+        # Eine Zeile "steer,gas,brake,buttons" pro Report, wie ein Gamepad-Update
+        while self._running:
+            try:
+                conn, _ = self.input_sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            print("[MOCK] Eingabe-Client verbunden.")
+            conn.settimeout(0.2)
+            pending = b""
+            try:
+                while self._running:
+                    try:
+                        data = conn.recv(4096)
+                    except socket.timeout:
+                        continue
+                    if not data:
+                        break
+                    *lines, pending = (pending + data).split(b"\n")
+                    for line in lines:
+                        if line.strip():
+                            self._apply_input(*parse_input(line))
+            except (OSError, ValueError):
+                print("[MOCK] Ungültige Eingabe oder Verbindung verloren.")
+            finally:
+                conn.close()
+
+    def _apply_input(self, steer, gas, brake, buttons):
+        gamepad = self.gamepad
+        gamepad.left_joystick_float(steer, 0.0)
+        gamepad.right_trigger_float(gas)
+        gamepad.left_trigger_float(brake)
+        gamepad.release_button(~buttons)
+        gamepad.press_button(buttons)
+        gamepad.update()
+
+    def _handshake(self, conn):
+        # Wartet HANDSHAKE_GRACE auf eine SUB-Zeile; (Abo oder None, restliche Bytes),
+        # (False, b"") wenn das Abo abgelehnt wurde
+        conn.settimeout(HANDSHAKE_GRACE)
+        data = b""
+        try:
+            while b"\n" not in data:
+                chunk = conn.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+        except socket.timeout:
+            pass
+        finally:
+            conn.settimeout(None)
+        line, _, pending = data.partition(b"\n")
+        if not line.startswith(b"SUB"):
+            self.subscription = None
+            return None, b""
+        try:
+            _, subscription = parse_subscription(line)
+        except ValueError as e:
+            print(f"[MOCK] Abo abgelehnt: {e}")
+            conn.sendall(f"ERR {e}\n".encode("utf-8"))
+            return False, b""
+        if subscription["tick"] is None:
+            subscription["tick"] = self.tick_stamp
+        conn.sendall(encode_subscription(subscription["fields"], subscription["rate"], subscription["encoding"],
+                                         subscription["tick"], command="OK"))
+        print(f"[MOCK] Abo: {line.decode('utf-8')}")
+        self.subscription = subscription
+        return subscription, pending
+
+    def _full_frame(self):
+        # Alle KNOWN_FIELDS; die Geschwindigkeit als Differenz zur vorherigen Position
+        frame = self._next_frame()
+        self.frames_generated += 1
+        x, y = float(frame[0]), float(frame[1])
+        if self._last_xy is None or frame[3] < 1e-6:
+            vel_x = vel_y = 0.0
+        else:
+            vel_x, vel_y = (x - self._last_xy[0]) / self.dt, (y - self._last_xy[1]) / self.dt
+        self._last_xy = (x, y)
+        return np.concatenate([frame, [vel_x, vel_y, 0.0]])
+
+    def _next_frame(self):
+        if self.replay is not None:
+            return self.replay[self.frames_generated % len(self.replay)]
+
+        car = self.car
+        presses = self.gamepad.take_presses()
+        if presses & XUSB_BUTTON.XUSB_GAMEPAD_B or (car.finished[0] and presses & XUSB_BUTTON.XUSB_GAMEPAD_A):
+            # B = Neustart, A im Zielmenü = nächster Versuch
+            car.reset()
+        elif car.finished[0] and self.use_autopilot:
+            car.reset()
+
+        if self.use_autopilot:
+            steer, gas, brake = autopilot(car)
+        else:
+            steer, gas, brake = self.gamepad.state
+        checkpoint, delta_time = step_cars(car, steer, gas, brake, self.dt)
+        return telemetry_frames(car, checkpoint, delta_time)[0]
+
+    def _stream(self, conn, subscription=None, pending=b""):
+        if subscription is None:
+            subscription = {"fields": DEFAULT_FIELDS, "rate": 0, "encoding": self.protocol, "tick": self.tick_stamp}
+        encode = encode_binary_frame if subscription["encoding"] == "binary" else encode_csv_frame
+        index = [KNOWN_FIELDS.index(f) for f in subscription["fields"]]
+        cp, dt = KNOWN_FIELDS.index("cp"), KNOWN_FIELDS.index("dt")
+        rate = subscription["rate"]
+        pull = rate == PULL
+        period = 1.0 / rate if not pull and rate > 0 else 0.0
+        requests = pending.count(b"GET")
+        next_send = 0.0
+        latched = None
+
+        record = open(self.record, "a") if self.record else None
+        next_tick = time.perf_counter()
+        try:
+            while self._running:
+                if pull and (requests == 0 or self.tick_rate > 0):
+                    # Ohne Takt erzeugt erst eine Anforderung das nächste Frame, mit Takt läuft das Spiel weiter
+                    requests += self._read_requests(conn, block=requests == 0 and self.tick_rate <= 0)
+                frame = self._full_frame()
+                if record is not None:
+                    record.write(encode_csv_frame(frame[:len(DEFAULT_FIELDS)]).decode("utf-8"))
+                if frame[cp] != -1:
+                    # Checkpoint bis zum nächsten gesendeten Frame aufheben (wie main.as)
+                    latched = (frame[cp], frame[dt])
+
+                sim_time = self.frames_generated * self.dt
+                if pull:
+                    send = requests > 0
+                elif period > 0:
+                    send = sim_time + 1e-9 >= next_send
+                    if send:
+                        next_send = next_send + period if sim_time - next_send < period else sim_time + period
+                else:
+                    send = True
+                if send:
+                    if latched is not None:
+                        frame[cp], frame[dt] = latched
+                        latched = None
+                    tick = int((time.monotonic() - self._started) * 1000) if subscription["tick"] else None
+                    conn.sendall(encode(frame[index], tick))
+                    self.frames_sent += 1
+                    requests -= pull
+
+                if self.tick_rate > 0:
+                    next_tick += 1.0 / self.tick_rate
+                    delay = next_tick - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_tick = time.perf_counter()
+        finally:
+            if record is not None:
+                record.close()
+
+    def _read_requests(self, conn, block):
+        # Anzahl "GET"-Zeilen, die seit dem letzten Aufruf angekommen sind
+        if not block and not select.select([conn], [], [], 0)[0]:
+            return 0
+        data = conn.recv(4096)
+        if not data:
+            raise ConnectionResetError("Client hat die Verbindung geschlossen")
+        return data.count(b"GET")
+
+    def stop(self):
+        self._running = False
+        self.server_sock.close()
+        if self.input_sock is not None:
+            self.input_sock.close()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        if self._input_thread is not None:
+            self._input_thread.join(timeout=1.0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trackmania-Ersatz, der das Plugin-Protokoll spricht")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1337)
+    parser.add_argument("--protocol", choices=("csv", "binary"), default="csv")
+    parser.add_argument("--tick-rate", type=float, default=60.0, help="Frames/s, 0 = so schnell wie möglich")
+    parser.add_argument("--dt", type=float, default=None, help="Simulierte Zeit pro Frame in s")
+    parser.add_argument("--replay", default=None, help="Aufgezeichnete Telemetrie (CSV) abspielen")
+    parser.add_argument("--autopilot", action="store_true", help="Auto fährt selbst entlang der Mittellinie")
+    parser.add_argument("--record", default=None, help="Gesendete Frames als CSV anhängen")
+    parser.add_argument("--input-port", type=int, default=None, help="Eingaben von SocketGamepad annehmen (Standard-Offset: Port + 100)")
+    parser.add_argument("--tick-stamp", action="store_true", help="Spielzeit in ms an jedes Frame anhängen")
+    args = parser.parse_args()
+
+    server = MockPluginServer(args.host, args.port, args.protocol, args.tick_rate, args.dt,
+                              replay=args.replay, use_autopilot=args.autopilot, record=args.record,
+                              tick_stamp=args.tick_stamp, input_port=args.input_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[INFO] Programm abgebrochen durch Benutzer.")
+    finally:
+        server.stop()
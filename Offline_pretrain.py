@@ -0,0 +1,121 @@
+import os
+import numpy as np
+import torch as th
+from Trajectory_recorder import INDEX_FILE, _read_index, iter_chunks
+
+# Aufgezeichnete Fahrten (Trajectory_recorder.py) vor dem eigentlichen Training nutzen:
+# - prefill_replay_buffer: füllt den ReplayBuffer von DQN, bevor model.learn() startet
+# - behaviour_cloning:     trainiert die PPO-Policy per Maximum-Likelihood auf die Aktionen
+
+
+def find_recordings(path):
+    # Alle Aufzeichnungsordner (mit index.json) unterhalb von path, z.B. recordings/env_0, env_1, ...
+    found = []
+    for root, dirs, files in os.walk(path):
+        if INDEX_FILE in files:
+            found.append(root)
+            dirs.clear()
+    return sorted(found)
+
+
+def check_recordings(path, obs_shape):
+    # Aufgezeichnet wird die rohe Beobachtung der TrackmaniaEnv; mit FrameHistory oder Strecken-
+    # merkmalen erwartet das Modell eine andere Form. Vorab prüfen statt tief in torch zu scheitern.
+    recordings = find_recordings(path)
+    if not recordings:
+        raise ValueError(f"Keine Aufzeichnungen unter {path} gefunden")
+    for recording in recordings:
+        recorded = tuple(_read_index(recording)["fields"]["obs"]["shape"])
+        if recorded != tuple(obs_shape):
+            raise ValueError(f"{recording}: aufgezeichnete Beobachtung hat Form {recorded}, das Modell erwartet "
+                             f"{tuple(obs_shape)} (FRAME_HISTORY/TRACK_NAME beim Aufzeichnen und Training gleich wählen)")
+    return recordings
+
+
+def iter_recordings(path, chunk_size=65_536):
+    for recording in find_recordings(path):
+        yield from iter_chunks(recording, chunk_size)
+
+
+def prefill_replay_buffer(replay_buffer, path, chunk_size=65_536, max_transitions=None):
+    # Schreibt die Übergänge blockweise direkt in die Arrays des SB3-ReplayBuffers
+    if replay_buffer.optimize_memory_usage:
+        raise ValueError("prefill_replay_buffer unterstützt optimize_memory_usage=True nicht")
+    check_recordings(path, replay_buffer.obs_shape)
+    n_envs = replay_buffer.n_envs
+    size = replay_buffer.buffer_size
+    obs_shape = replay_buffer.obs_shape
+    added = 0
+
+    for chunk in iter_recordings(path, chunk_size):
+        rows = len(chunk["reward"]) // n_envs * n_envs
+        if max_transitions is not None:
+            rows = min(rows, (max_transitions - added) // n_envs * n_envs)
+        if rows <= 0:
+            break
+        steps = rows // n_envs
+
+        obs = chunk["obs"][:rows].reshape(steps, n_envs, *obs_shape)
+        next_obs = chunk["next_obs"][:rows].reshape(steps, n_envs, *obs_shape)
+        actions = chunk["action"][:rows].reshape(steps, n_envs, replay_buffer.action_dim)
+        rewards = chunk["reward"][:rows].reshape(steps, n_envs)
+        terminated = chunk["terminated"][:rows].reshape(steps, n_envs)
+        truncated = chunk["truncated"][:rows].reshape(steps, n_envs)
+
+        start = 0
+        while start < steps:
+            pos = replay_buffer.pos
+            n = min(steps - start, size - pos)
+            block = slice(start, start + n)
+            replay_buffer.observations[pos:pos + n] = obs[block]
+            replay_buffer.next_observations[pos:pos + n] = next_obs[block]
+            replay_buffer.actions[pos:pos + n] = actions[block]
+            replay_buffer.rewards[pos:pos + n] = rewards[block]
+            # SB3: done = Episode vorbei, timeout = nur abgebrochen (kein echter Endzustand)
+            replay_buffer.dones[pos:pos + n] = terminated[block] | truncated[block]
+            if replay_buffer.handle_timeout_termination:
+                replay_buffer.timeouts[pos:pos + n] = truncated[block] & ~terminated[block]
+            replay_buffer.pos = (pos + n) % size
+            if replay_buffer.pos == 0:
+                replay_buffer.full = True
+            start += n
+        added += rows
+
+    return added
+
+
+def behaviour_cloning(model, path, epochs=5, batch_size=1024, learning_rate=3e-4, chunk_size=262_144, seed=0):
+    # Minimiert -log pi(a|s) der aufgezeichneten Aktionen; pro Block wird nur dieser Block geladen
+    check_recordings(path, model.observation_space.shape)
+    policy = model.policy
+    optimizer = th.optim.Adam(policy.parameters(), lr=learning_rate)
+    rng = np.random.default_rng(seed)
+    policy.set_training_mode(True)
+
+    losses = []
+    for epoch in range(epochs):
+        epoch_loss, batches = 0.0, 0
+        for chunk in iter_recordings(path, chunk_size):
+            obs = np.asarray(chunk["obs"])
+            actions = np.asarray(chunk["action"])
+            order = rng.permutation(len(actions))
+            for start in range(0, len(order), batch_size):
+                idx = order[start:start + batch_size]
+                obs_batch = th.as_tensor(obs[idx], device=policy.device)
+                action_batch = th.as_tensor(actions[idx], device=policy.device)
+                loss = -policy.get_distribution(obs_batch).log_prob(action_batch).mean()
+
+                optimizer.zero_grad()
+                loss.backward()
+                th.nn.utils.clip_grad_norm_(policy.parameters(), model.max_grad_norm)
+                optimizer.step()
+                epoch_loss += loss.item()
+                batches += 1
+
+        if batches == 0:
+            raise ValueError(f"Keine Aufzeichnungen unter {path} gefunden")
+        losses.append(epoch_loss / batches)
+        print(f"[BC] Epoche {epoch + 1}/{epochs}: Loss {losses[-1]:.4f}")
+
+    policy.set_training_mode(False)
+    return losses
@@ -0,0 +1,132 @@
+import time
+from Gamepad_backends import XUSB_BUTTON
+
+# Reset über das Gamepad als Zustandsmaschine statt fester time.sleep-Pausen.
+# Die Schritte werden mit jedem Telemetrie-Frame (oder bei Ablauf einer Frist) weitergeschaltet:
+#   ("wait", s, v)        höchstens s Sekunden warten, z.B. bis das Zielmenü erscheint; mit v endet
+#                         das Warten früher, sobald das Auto langsamer als v m/s ist (Menü erreicht)
+#   ("press", taste, s)   Taste drücken und nach mind. s Sekunden und min_frames Frames loslassen
+#                         (ohne Frames spätestens nach BUTTON_MAX_HOLD, wie früher 0.2 s)
+# Zu Beginn werden Lenkung, Gas und Bremse losgelassen, damit das Auto nicht weiterfährt.
+# Der Neustart (gefahrene Distanz fällt auf nahe 0) wird bei jedem Frame geprüft, auch während
+# Tasten gedrückt sind; restliche Eingaben entfallen dann. Nach der letzten Eingabe gilt der
+# Reset als abgeschlossen, sobald die Telemetrie den Neustart zeigt, spätestens nach confirm_timeout.
+
+BUTTON_HOLD = 0.05         # s, die eine Taste mindestens gedrückt bleibt
+BUTTON_MAX_HOLD = 0.2      # s, nach denen sie auch ohne neue Frames losgelassen wird
+FINISH_MENU_DELAY = 6.0    # s, höchstens bis das Zielmenü nach der Runde Eingaben annimmt
+MENU_SPEED = 0.5           # m/s, darunter steht das Auto im Zielmenü
+
+RESPAWN_STEPS = [("press", XUSB_BUTTON.XUSB_GAMEPAD_B, BUTTON_HOLD)]
+FINISH_STEPS = [
+    ("wait", FINISH_MENU_DELAY, MENU_SPEED),
+    ("press", XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN, BUTTON_HOLD),
+    ("press", XUSB_BUTTON.XUSB_GAMEPAD_A, BUTTON_HOLD),
+    ("press", XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP, BUTTON_HOLD),
+    ("press", XUSB_BUTTON.XUSB_GAMEPAD_A, BUTTON_HOLD),
+]
+
+
+class ResetSequence:
+    def __init__(self, gamepad, steps, confirm_distance=5.0, confirm_timeout=2.0, min_frames=2):
+        self.gamepad = gamepad
+        self.steps = list(steps)
+        self.confirm_distance = confirm_distance
+        self.confirm_timeout = confirm_timeout
+        self.min_frames = min_frames
+
+        self.index = -1
+        self.deadline = None
+        self.release_at = None
+        self.frames = 0
+        self.pressed = None
+        self.done = False
+        self.confirmed = False
+        # Größte gesehene Distanz: ein Neustart ist erst erkennbar, wenn das Auto vorher weiter weg war
+        self.max_distance = 0.0
+
+    def start(self, now=None, distance=None):
+        # distance: gefahrene Distanz beim Auslösen (letzte Beobachtung)
+        if distance is not None:
+            self.max_distance = float(distance)
+        self.gamepad.left_joystick_float(x_value_float=0.0, y_value_float=0.0)
+        self.gamepad.right_trigger_float(0.0)
+        self.gamepad.left_trigger_float(0.0)
+        self.gamepad.update()
+        self._next_step(time.monotonic() if now is None else now)
+        return self
+
+    def _next_step(self, now):
+        self.index += 1
+        self.frames = 0
+        if self.index == len(self.steps):
+            # Alle Eingaben gesendet, jetzt nur noch auf die Bestätigung durch die Telemetrie warten
+            self.deadline = now + self.confirm_timeout
+            return
+        step = self.steps[self.index]
+        if step[0] == "press":
+            self.pressed = step[1]
+            self.gamepad.press_button(self.pressed)
+            self.gamepad.update()
+            self.deadline = now + step[2]
+            self.release_at = now + max(step[2], BUTTON_MAX_HOLD)
+        else:
+            self.deadline = now + step[1]
+
+    def _restarted(self, obs):
+        return obs is not None and obs[3] <= self.confirm_distance
+
+    def _dropped(self, obs):
+        # Neustart mitten in der Folge: Distanz war über confirm_distance und ist jetzt wieder nahe 0
+        return self._restarted(obs) and self.max_distance > self.confirm_distance
+
+    def _menu_reached(self, step, obs):
+        # Auto steht: Zielmenü ist da, nicht bis zur Frist warten
+        return len(step) > 2 and obs is not None and obs[2] <= step[2]
+
+    def _release(self):
+        if self.pressed is not None:
+            self.gamepad.release_button(self.pressed)
+            self.gamepad.update()
+            self.pressed = None
+
+    def advance(self, obs, now=None):
+        # obs = neues Frame oder None (Frist abgelaufen, kein Frame); liefert True, wenn fertig
+        if self.done:
+            return True
+        now = time.monotonic() if now is None else now
+        if obs is not None:
+            self.frames += 1
+            if self._dropped(obs):
+                # Spiel hat schon neu gestartet: restliche Eingaben überspringen
+                self._release()
+                self.confirmed = self.done = True
+                return True
+            self.max_distance = max(self.max_distance, float(obs[3]))
+
+        while not self.done:
+            if self.index == len(self.steps):
+                if self._restarted(obs) or now >= self.deadline:
+                    self.confirmed = self._restarted(obs)
+                    self.done = True
+                break
+            step = self.steps[self.index]
+            if step[0] == "press":
+                if now < self.deadline or (self.frames < self.min_frames and now < self.release_at):
+                    break
+                self._release()
+            elif now < self.deadline and not self._menu_reached(step, obs):
+                break
+            self._next_step(now)
+        return self.done
+
+    def timeout(self, now=None):
+        # Sekunden bis zur nächsten Frist, an der advance() auch ohne neues Frame etwas tun muss
+        now = time.monotonic() if now is None else now
+        if self.pressed is not None and now >= self.deadline:
+            return max(0.0, self.release_at - now)
+        return max(0.0, self.deadline - now)
+
+    def cancel(self):
+        self._release()
+        self.done = True
@@ -0,0 +1,145 @@
+import time
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+from Car_model import ACTIONS, N_CHECKPOINTS, CarState, step_cars
+
+# Vektorisierter Simulator mit derselben Beobachtung (8 Werte) und denselben Aktionen
+# (Discrete(4)) wie TrackmaniaEnv. Alle Autos werden in einem NumPy-Aufruf gerechnet,
+# damit PPO/DQN vor dem Training im Spiel schnell vortrainiert werden können.
+
+
+class TrackmaniaSimVecEnv(VecEnv):
+    # start_jitter / yaw_jitter: Start seitlich um bis zu start_jitter m und um bis zu yaw_jitter rad
+    # verdreht (gleichverteilt, reproduzierbar über seed), damit Episoden sich unterscheiden
+    def __init__(self, n_envs=256, dt=0.05, track=None, speed_threshold=1.39, low_speed_duration=2.0,
+                 start_jitter=0.0, yaw_jitter=0.0, seed=None):
+        observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(8,), dtype=np.float32)
+        self.render_mode = None
+        super().__init__(n_envs, observation_space, spaces.Discrete(4))
+        self.dt = dt
+        self.speed_threshold = speed_threshold
+        self.low_speed_duration = low_speed_duration
+        self.start_jitter = start_jitter
+        self.yaw_jitter = yaw_jitter
+        self.rng = np.random.default_rng(seed)
+
+        self.cars = CarState(n_envs, track)
+        self.actions = np.zeros(n_envs, dtype=np.int64)
+        self.obs = np.zeros((n_envs, 8), dtype=np.float32)
+
+        # Zustand der Belohnung wie in TrackmaniaEnv, pro Auto
+        self.average_delta = np.full((n_envs, N_CHECKPOINTS), -1.0)
+        self.checkpoint_counter = np.zeros(n_envs, dtype=np.int64)
+        self.low_speed_start_time = np.full(n_envs, np.nan)
+        self.episode_return = np.zeros(n_envs)
+        self.episode_length = np.zeros(n_envs, dtype=np.int64)
+        self.episode_start = np.full(n_envs, time.time())
+
+    def _write_obs(self, checkpoint, delta_time):
+        cars = self.cars
+        obs = self.obs
+        obs[:, 0] = cars.x
+        obs[:, 1] = cars.y
+        obs[:, 2] = cars.speed
+        obs[:, 3] = cars.distance
+        obs[:, 4] = cars.yaw
+        obs[:, 5] = 0.0
+        obs[:, 6] = checkpoint
+        obs[:, 7] = delta_time
+
+    def _reset_cars(self, mask):
+        self.cars.reset(mask)
+        if self.start_jitter or self.yaw_jitter:
+            # Start liegt auf der unteren Geraden in Richtung +x: seitlich = y
+            n = int(np.count_nonzero(mask))
+            self.cars.y[mask] += self.rng.uniform(-self.start_jitter, self.start_jitter, n)
+            self.cars.yaw[mask] += self.rng.uniform(-self.yaw_jitter, self.yaw_jitter, n)
+        self.checkpoint_counter[mask] = 0
+        self.low_speed_start_time[mask] = np.nan
+        self.episode_return[mask] = 0.0
+        self.episode_length[mask] = 0
+        self.episode_start[mask] = time.time()
+
+    def reset(self):
+        self._reset_cars(np.ones(self.num_envs, dtype=bool))
+        self._write_obs(0.0, -1.0)
+        return self.obs.copy()
+
+    def step_async(self, actions):
+        self.actions[:] = np.asarray(actions).reshape(self.num_envs)
+
+    def step_wait(self):
+        cars = self.cars
+        controls = ACTIONS[self.actions]
+        previous_distance = cars.distance.copy()
+        checkpoint, delta_time = step_cars(cars, controls[:, 0], controls[:, 1], controls[:, 2], self.dt)
+        self._write_obs(checkpoint, delta_time)
+
+        # Belohnung wie TrackmaniaEnv.step(), nur für alle Autos gleichzeitig
+        reward = np.zeros(self.num_envs)
+        rows = np.flatnonzero(checkpoint)
+        if len(rows):
+            cols = np.minimum(self.checkpoint_counter[rows], N_CHECKPOINTS - 1)
+            known = self.average_delta[rows, cols]
+            delta = delta_time[rows]
+            first = known == -1
+            faster = ~first & (known >= delta)
+            reward[rows] += np.where(first, 3.0, np.where(faster, 5.0, 0.0))
+            self.average_delta[rows, cols] = np.where(first, delta, np.where(faster, (known + delta) / 2, known))
+            self.checkpoint_counter[rows] += 1
+
+        lap_done = self.checkpoint_counter == N_CHECKPOINTS
+        reward += np.where(lap_done, 5.0, 0.0)
+        reward += cars.distance - previous_distance
+        reward += cars.speed
+        reward += 2.0 * checkpoint
+        reward -= np.where(cars.speed <= 15, 3.0, 0.0)
+
+        # Abbruch bei zu langsamer Fahrt bzw. nach der Runde (Simulationszeit statt Uhrzeit)
+        slow = (cars.speed < self.speed_threshold) | lap_done
+        waiting = ~np.isnan(self.low_speed_start_time)
+        truncated = slow & waiting & ((cars.time - self.low_speed_start_time >= self.low_speed_duration) | lap_done)
+        self.low_speed_start_time = np.where(slow & ~waiting, cars.time, np.where(slow, self.low_speed_start_time, np.nan))
+
+        self.episode_return += reward
+        self.episode_length += 1
+        infos = [{} for _ in range(self.num_envs)]
+        obs = self.obs.copy()
+        for i in np.flatnonzero(truncated):
+            infos[i]["terminal_observation"] = obs[i].copy()
+            infos[i]["TimeLimit.truncated"] = True
+            infos[i]["reason"] = "low_speed"
+            infos[i]["episode"] = {
+                "r": float(self.episode_return[i]),
+                "l": int(self.episode_length[i]),
+                "t": round(float(time.time() - self.episode_start[i]), 6),
+            }
+
+        if truncated.any():
+            self._reset_cars(truncated)
+            self._write_obs(checkpoint & ~truncated, np.where(truncated, -1.0, delta_time))
+            obs[truncated] = self.obs[truncated]
+        return obs, reward.astype(np.float32), truncated.copy(), infos
+
+    def close(self):
+        pass
+
+    def _indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name) for _ in self._indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return [getattr(self, method_name)(*method_args, **method_kwargs) for _ in self._indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._indices(indices)]
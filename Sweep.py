@@ -0,0 +1,174 @@
+import argparse
+import csv
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+# Hyperparameter-Suche für PPO im Simulator (Sim_vec_env.py) statt im Spiel:
+#   python Sweep.py --trials 27 --budget 20000 --eta 3 --rungs 3 --out sweeps/ppo
+# Jeder Versuch läuft in einem eigenen Prozess (ProcessPoolExecutor, Standard: alle Kerne).
+# Successive Halving: alle Versuche trainieren budget Schritte, nur das beste 1/eta läuft mit
+# eta-mal so vielen Schritten weiter (vom gespeicherten Modell aus), usw. Bewertet wird die
+# mittlere Episodenbelohnung der zuletzt beendeten Episoden. Ergebnis: results.csv (sortiert)
+# und results.json im Ausgabeordner; nur die besten Konfigurationen kommen ins Spiel.
+
+# (Art, Parameter): "log" = log-gleichverteilt in [lo, hi], "choice" = eine der Möglichkeiten
+SEARCH_SPACE = {
+    "learning_rate": ("log", 1e-5, 1e-3),
+    "n_steps": ("choice", [128, 256, 512, 1024]),
+    "batch_size": ("choice", [64, 128, 256]),
+    "n_epochs": ("choice", [5, 10, 20]),
+    "gamma": ("choice", [0.95, 0.98, 0.99, 0.995]),
+    "gae_lambda": ("choice", [0.9, 0.95, 0.98]),
+    "ent_coef": ("log", 1e-4, 5e-2),
+    "clip_range": ("choice", [0.1, 0.2, 0.3]),
+    "net_arch": ("choice", [[64, 64], [128, 64], [256, 128]]),
+}
+
+# Feste Werte wie in TestTrain.py
+BASE_KWARGS = dict(vf_coef=0.5, max_grad_norm=0.5)
+SIM_N_ENVS = 16
+
+
+def sample_params(space, rng):
+    params = {}
+    for name, (kind, *args) in space.items():
+        if kind == "log":
+            lo, hi = args
+            params[name] = float(math.exp(rng.uniform(math.log(lo), math.log(hi))))
+        elif kind == "choice":
+            choices = args[0]
+            params[name] = choices[rng.integers(len(choices))]
+        else:
+            raise ValueError(f"Unbekannte Verteilung für {name}: {kind}")
+    return params
+
+
+def _ppo_kwargs(params):
+    kwargs = {**BASE_KWARGS, **params}
+    net_arch = kwargs.pop("net_arch", None)
+    if net_arch is not None:
+        kwargs["policy_kwargs"] = dict(net_arch=list(net_arch))
+    return kwargs
+
+
+def run_trial(trial_id, params, timesteps, model_path, seed=0, n_envs=SIM_N_ENVS):
+    # Läuft im Worker-Prozess; setzt ein vorhandenes Modell (vorherige Stufe) fort
+    import torch
+    from stable_baselines3 import PPO
+    from Sim_vec_env import TrackmaniaSimVecEnv
+    torch.set_num_threads(1)
+
+    start = time.perf_counter()
+    env = TrackmaniaSimVecEnv(n_envs=n_envs)
+    try:
+        if os.path.exists(model_path):
+            model = PPO.load(model_path, env=env, device="cpu")
+            # Gespeichertes _last_obs gehört zur alten Env: neu starten, sonst beginnt der erste
+            # Rollout mit einer Beobachtung, die nicht zum Zustand der neuen Env passt
+            model._last_obs = env.reset()
+            model._last_episode_starts = np.ones((env.num_envs,), dtype=bool)
+            # Nur Episoden dieser Stufe bewerten (learn legt den Puffer dann neu an)
+            model.ep_info_buffer = None
+            model.learn(timesteps, reset_num_timesteps=False)
+        else:
+            model = PPO("MlpPolicy", env, seed=seed + trial_id, device="cpu", verbose=0, **_ppo_kwargs(params))
+            model.learn(timesteps)
+        returns = [info["r"] for info in model.ep_info_buffer]
+        model.save(model_path)
+        return {
+            "trial": trial_id,
+            "score": float(np.mean(returns)) if returns else -math.inf,
+            "episodes": len(returns),
+            "timesteps": int(model.num_timesteps),
+            "seconds": time.perf_counter() - start,
+            "error": None,
+        }
+    except Exception as e:
+        # Z.B. ungültige Kombination (batch_size > n_steps * n_envs) oder NaN im Training
+        return {"trial": trial_id, "score": -math.inf, "episodes": 0, "timesteps": 0,
+                "seconds": time.perf_counter() - start, "error": f"{type(e).__name__}: {e}"}
+    finally:
+        env.close()
+
+
+def successive_halving(n_trials=27, budget=20_000, eta=3, rungs=3, out_dir="sweeps/ppo", workers=None,
+                       seed=0, space=SEARCH_SPACE, n_envs=SIM_N_ENVS):
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    trials = {i: {"trial": i, "params": sample_params(space, rng), "rung": -1, "score": None,
+                  "timesteps": 0, "seconds": 0.0, "error": None} for i in range(n_trials)}
+    workers = workers or os.cpu_count()
+
+    survivors = list(trials)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for rung in range(rungs):
+            # Gesamtschritte pro Versuch nach dieser Stufe: budget, budget * eta, ...
+            steps = budget * eta ** rung - (budget * eta ** (rung - 1) if rung else 0)
+            print(f"[SWEEP] Stufe {rung}: {len(survivors)} Versuche, je {steps} Schritte")
+            futures = [pool.submit(run_trial, i, trials[i]["params"], steps,
+                                   os.path.join(out_dir, f"trial_{i}.zip"), seed, n_envs) for i in survivors]
+            for future in as_completed(futures):
+                result = future.result()
+                trial = trials[result["trial"]]
+                trial.update(rung=rung, score=result["score"], timesteps=result["timesteps"] or trial["timesteps"],
+                             seconds=trial["seconds"] + result["seconds"], error=result["error"])
+                print(f"[SWEEP] Versuch {result['trial']:3d}: Belohnung {result['score']:10.1f} "
+                      f"({result['episodes']} Episoden, {result['seconds']:.0f} s)"
+                      + (f"  {result['error']}" if result["error"] else ""))
+
+            ranked = sorted(survivors, key=lambda i: trials[i]["score"], reverse=True)
+            if rung < rungs - 1:
+                survivors = [i for i in ranked[:max(1, len(ranked) // eta)] if trials[i]["error"] is None]
+                if not survivors:
+                    break
+            write_results(trials, out_dir)
+
+    results = write_results(trials, out_dir)
+    print_table(results[:10])
+    return results
+
+
+def ranked_trials(trials):
+    # Zuerst nach erreichter Stufe, dann nach Belohnung in dieser Stufe
+    return sorted(trials.values(), key=lambda t: (t["rung"], t["score"] if t["score"] is not None else -math.inf),
+                  reverse=True)
+
+
+def write_results(trials, out_dir):
+    results = ranked_trials(trials)
+    with open(os.path.join(out_dir, "results.json"), "w") as f:
+        json.dump(results, f, indent=1, default=str)
+    with open(os.path.join(out_dir, "results.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        names = list(results[0]["params"]) if results else []
+        writer.writerow(["rank", "trial", "rung", "score", "timesteps", "seconds"] + names + ["error"])
+        for rank, t in enumerate(results, 1):
+            writer.writerow([rank, t["trial"], t["rung"], t["score"], t["timesteps"], round(t["seconds"], 1)]
+                            + [t["params"][name] for name in names] + [t["error"] or ""])
+    return results
+
+
+def print_table(results):
+    for rank, t in enumerate(results, 1):
+        params = ", ".join(f"{k}={v:.3g}" if isinstance(v, float) else f"{k}={v}" for k, v in t["params"].items())
+        print(f"[SWEEP] #{rank:2d} Versuch {t['trial']:3d}  Stufe {t['rung']}  Belohnung {t['score']:10.1f}  {params}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PPO-Hyperparameter im Simulator per Successive Halving suchen")
+    parser.add_argument("--trials", type=int, default=27)
+    parser.add_argument("--budget", type=int, default=20_000, help="Schritte pro Versuch in der ersten Stufe")
+    parser.add_argument("--eta", type=int, default=3, help="Nur das beste 1/eta kommt weiter, mit eta-fachem Budget")
+    parser.add_argument("--rungs", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None, help="Prozesse, Standard: alle Kerne")
+    parser.add_argument("--n-envs", type=int, default=SIM_N_ENVS, help="Autos pro Simulator")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="sweeps/ppo")
+    args = parser.parse_args()
+
+    successive_halving(args.trials, args.budget, args.eta, args.rungs, args.out, args.workers, args.seed,
+                       n_envs=args.n_envs)
@@ -0,0 +1,85 @@
+import argparse
+import socket
+import threading
+import time
+import numpy as np
+from Telemetry_client import (
+    TelemetryClient, encode_csv_frame, encode_binary_frame,
+    parse_csv_line, parse_binary_payload, FRAME_HEADER,
+)
+
+# Micro-Benchmark: Frames/s für CSV- und Binärprotokoll, einmal nur Parsen
+# und einmal über einen lokalen Socket mit TelemetryClient._get_obs.
+
+
+def make_frames(n, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = rng.normal(0.0, 100.0, size=(n, 8)).astype(np.float32)
+    frames[:, 6] = np.where(rng.random(n) < 0.01, 1.0, -1.0)
+    frames[:, 7] = np.where(frames[:, 6] == -1, -1.0, frames[:, 7])
+    return frames
+
+
+def bench_parse(frames, repeat=3):
+    csv_lines = [encode_csv_frame(f)[:-1] for f in frames]
+    payloads = [encode_binary_frame(f)[FRAME_HEADER.size:] for f in frames]
+    out = np.empty(8, dtype=np.float32)
+
+    results = {}
+    for name, parse, data in (("csv", parse_csv_line, csv_lines), ("binary", parse_binary_payload, payloads)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for item in data:
+                parse(item, out)
+            best = min(best, time.perf_counter() - start)
+        results[name] = len(data) / best
+    return results
+
+
+def _serve(server, blob):
+    conn, _ = server.accept()
+    try:
+        while True:
+            conn.sendall(blob)
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def bench_socket(frames, protocol, n_obs):
+    encode = encode_binary_frame if protocol == "binary" else encode_csv_frame
+    blob = b"".join(encode(f) for f in frames)
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    thread = threading.Thread(target=_serve, args=(server, blob), daemon=True)
+    thread.start()
+
+    client = TelemetryClient("127.0.0.1", server.getsockname()[1], protocol=protocol)
+    out = np.empty(8, dtype=np.float32)
+    received = 0
+    start = time.perf_counter()
+    while received < n_obs:
+        if client._get_obs(out) is not None:
+            received += 1
+    elapsed = time.perf_counter() - start
+    client.close()
+    server.close()
+    return received / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vergleich CSV- vs. Binär-Telemetrie")
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--obs", type=int, default=100000, help="Anzahl Beobachtungen im Socket-Test")
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames)
+    for name, fps in bench_parse(frames).items():
+        print(f"[PARSE]  {name:6s} {fps:12,.0f} Frames/s")
+    for protocol in ("csv", "binary"):
+        fps = bench_socket(frames, protocol, args.obs)
+        print(f"[SOCKET] {protocol:6s} {fps:12,.0f} Frames/s")
@@ -0,0 +1,346 @@
+import selectors
+import socket
+import time
+import struct
+from collections import deque
+import numpy as np
+
+# Telemetrie-Protokolle des Plugins (main.as):
+#   "csv":    eine Textzeile pro Frame: x,y,speed,dist,yaw,pitch,cp,delta_time\n
+#   "binary": uint16 Länge (Version + Nutzdaten), uint8 Version, danach die
+#             Werte als little-endian float32 in derselben Reihenfolge wie bei csv
+# Mit der Plugin-Einstellung "Tick stamp" folgt jedem Frame zusätzlich die Spielzeit in ms
+# (Time::Now), bei csv als letzter Wert, binär als uint32 nach den Nutzdaten.
+#
+# Abo (optional): Der Client schickt direkt nach dem Verbinden eine Zeile
+#   SUB fields=x,y,speed,dist,yaw,pitch,cp,dt,vel_x rate=20 encoding=binary tick=1
+# und das Plugin antwortet mit "OK ..." (dieselben Schlüssel plus version) oder "ERR <Grund>".
+# Danach kommen nur die gewünschten Felder in dieser Reihenfolge, höchstens rate Frames pro
+# Sekunde Spielzeit (0 = jedes Frame, "pull" = ein Frame pro "GET"-Zeile vom Client).
+# Ohne SUB innerhalb von HANDSHAKE_GRACE sendet das Plugin wie bisher alle 8 Felder in jedem
+# Frame im eingestellten Format, alte Clients funktionieren also unverändert.
+FRAME_HEADER = struct.Struct("<HB")
+FRAME_VERSION = 1
+FRAME_FIELDS = 8
+FRAME_DTYPE = np.dtype("<f4")
+FRAME_PAYLOAD_SIZE = FRAME_FIELDS * FRAME_DTYPE.itemsize
+FRAME_TICK = struct.Struct("<I")
+
+PROTOCOLS = ("csv", "binary")
+MODES = ("next", "latest")
+RECV_CHUNK = 65536
+
+DEFAULT_FIELDS = ("x", "y", "speed", "dist", "yaw", "pitch", "cp", "dt")
+# Geschwindigkeitsvektor (scriptPlayer.Velocity), y/z wie bei der Position vertauscht
+EXTRA_FIELDS = ("vel_x", "vel_y", "vel_z")
+KNOWN_FIELDS = DEFAULT_FIELDS + EXTRA_FIELDS
+PULL = "pull"
+SUBSCRIPTION_VERSION = 1
+HANDSHAKE_GRACE = 0.25
+HANDSHAKE_TIMEOUT = 2.0
+
+
+def encode_subscription(fields=DEFAULT_FIELDS, rate=0, encoding="csv", tick=None, command="SUB"):
+    # command="OK" für die Antwort des Plugins (Mock_plugin.py)
+    rate = PULL if rate == PULL else f"{float(rate):g}"
+    line = f"{command} fields={','.join(fields)} rate={rate} encoding={encoding}"
+    if tick is not None:
+        line += f" tick={int(bool(tick))}"
+    if command == "OK":
+        line += f" version={SUBSCRIPTION_VERSION}"
+    return (line + "\n").encode("utf-8")
+
+
+def parse_subscription(line):
+    # "SUB ..." bzw. "OK ..." -> (Befehl, {"fields", "rate", "encoding", "tick"}); ValueError bei Unsinn
+    words = (line.decode("utf-8") if isinstance(line, (bytes, bytearray)) else line).split()
+    if not words:
+        raise ValueError("Leere Abo-Zeile")
+    options = dict(word.split("=", 1) for word in words[1:] if "=" in word)
+    fields = tuple(options.get("fields", ",".join(DEFAULT_FIELDS)).split(","))
+    unknown = [f for f in fields if f not in KNOWN_FIELDS]
+    if unknown or len(set(fields)) != len(fields):
+        raise ValueError(f"Unbekannte oder doppelte Felder: {','.join(fields)}")
+    rate = options.get("rate", "0")
+    if rate != PULL:
+        rate = float(rate)
+        if rate < 0:
+            raise ValueError(f"Ungültige Rate: {rate}")
+    encoding = options.get("encoding", "csv")
+    if encoding not in PROTOCOLS:
+        raise ValueError(f"Unbekannte Kodierung: {encoding}")
+    tick = bool(int(options["tick"])) if "tick" in options else None
+    return words[0], {"fields": fields, "rate": rate, "encoding": encoding, "tick": tick}
+
+
+def encode_csv_frame(values, tick=None):
+    line = ",".join(repr(float(v)) for v in values)
+    if tick is not None:
+        line += f",{int(tick)}"
+    return (line + "\n").encode("utf-8")
+
+
+def encode_binary_frame(values, tick=None):
+    payload = np.asarray(values, dtype=FRAME_DTYPE).tobytes()
+    if tick is not None:
+        payload += FRAME_TICK.pack(int(tick) & 0xFFFFFFFF)
+    return FRAME_HEADER.pack(1 + len(payload), FRAME_VERSION) + payload
+
+
+def _finish_obs(obs, cp=6):
+    # Plugin sendet den Checkpoint-Zähler oder -1, die Umgebung braucht nur "Checkpoint erreicht"
+    if cp is not None:
+        obs[cp] = 0.0 if obs[cp] == -1 else 1.0
+    return obs
+
+
+def parse_csv_line(line, out=None, n_fields=FRAME_FIELDS, cp=6):
+    parts = line.strip().split(b"," if isinstance(line, (bytes, bytearray)) else ",")
+    if len(parts) != n_fields:
+        raise ValueError(f"Ungültige Telemetriezeile: {line!r}")
+    if out is None:
+        out = np.empty(n_fields, dtype=np.float32)
+    out[:] = [float(p) for p in parts]
+    return _finish_obs(out, cp)
+
+
+def parse_binary_payload(payload, out=None, n_fields=FRAME_FIELDS, cp=6):
+    # np.frombuffer liest direkt aus dem Empfangspuffer, kopiert wird nur ins Ziel-Array
+    values = np.frombuffer(payload, dtype=FRAME_DTYPE, count=n_fields)
+    if out is None:
+        out = np.empty(n_fields, dtype=np.float32)
+    np.copyto(out, values)
+    return _finish_obs(out, cp)
+
+
+class TelemetryClient:
+    # mode="next":   liefert jedes Frame der Reihe nach (nichts geht verloren)
+    # mode="latest": liest alles Verfügbare ohne zu blockieren und liefert das neueste
+    #                Frame; Checkpoint-Ereignisse übersprungener Frames werden übernommen
+    # fields/rate/tick: Abo beim Plugin (siehe oben), None = ohne Handshake wie bisher
+    def __init__(self, host='localhost', port=1337, protocol="csv", mode="next", fields=None, rate=None,
+                 tick=None, handshake_timeout=HANDSHAKE_TIMEOUT):
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"Unbekanntes Protokoll: {protocol} (erlaubt: {PROTOCOLS})")
+        if mode not in MODES:
+            raise ValueError(f"Unbekannter Modus: {mode} (erlaubt: {MODES})")
+        subscribe = fields is not None or rate is not None or tick is not None
+        self.fields = tuple(fields) if fields is not None else DEFAULT_FIELDS
+        self.rate = rate if rate is not None else 0
+        unknown = [f for f in self.fields if f not in KNOWN_FIELDS]
+        if unknown:
+            raise ValueError(f"Unbekannte Felder: {unknown} (erlaubt: {KNOWN_FIELDS})")
+        self.n_fields = len(self.fields)
+        # Positionen von Checkpoint und Zeitdifferenz, None wenn nicht abonniert
+        self.cp_index = self.fields.index("cp") if "cp" in self.fields else None
+        self.dt_index = self.fields.index("dt") if "dt" in self.fields else None
+        self.pull = self.rate == PULL
+        self.server_address = (host, port)
+        self.protocol = protocol
+        self.mode = mode
+        self._payload_size = self.n_fields * FRAME_DTYPE.itemsize
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+        # Persistenter Empfangspuffer: unvollständige Frames bleiben bis zum nächsten recv erhalten
+        self._rx = bytearray()
+        self._rx_pos = 0
+        self._chunk = bytearray(RECV_CHUNK)
+        self._chunk_view = memoryview(self._chunk)
+        self._scratch = np.empty(self.n_fields, dtype=np.float32)
+        self._last = np.zeros(self.n_fields, dtype=np.float32)
+        # Zeitdifferenzen von Checkpoints, die im "latest"-Modus noch nicht ausgeliefert wurden
+        self._pending_checkpoints = deque()
+        # Spielzeit (ms) des zuletzt gelesenen Frames, None ohne "Tick stamp" im Plugin
+        self.tick = None
+        # Optionaler Profiling.Profiler für die Parse-Zeit
+        self.profiler = None
+
+        # Zähler für Diagnose: empfangene, fehlerhafte, im "latest"-Modus verworfene Frames, Timeouts
+        self.stats = {"frames": 0, "malformed": 0, "dropped": 0, "timeouts": 0}
+
+        try:
+            self.sock.connect(self.server_address)
+            #print(f"[INFO] Verbunden mit dem Server auf {host}:{port}.")
+        except Exception as e:
+            self.sock.close()
+            raise ConnectionError(f"Verbindung zum Plugin auf {host}:{port} fehlgeschlagen: {e}") from e
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.sock, selectors.EVENT_READ)
+        # Vom Plugin bestätigtes Abo, None ohne Handshake
+        self.subscription = None
+        if subscribe:
+            try:
+                self._subscribe(tick, handshake_timeout)
+            except Exception:
+                self.close()
+                raise
+
+    def _subscribe(self, tick, timeout):
+        self.sock.sendall(encode_subscription(self.fields, self.rate, self.protocol, tick))
+        deadline = time.monotonic() + timeout
+        while True:
+            rx = self._rx
+            head = bytes(rx[self._rx_pos:self._rx_pos + 3])
+            if head and not (b"OK "[:len(head)] == head or b"ERR"[:len(head)] == head):
+                # Altes Plugin ohne Handshake streamt sofort Frames
+                raise ConnectionError("Plugin unterstützt kein Abo (main.as aktualisieren)")
+            end = rx.find(b"\n", self._rx_pos)
+            if end != -1:
+                break
+            if not self._wait_readable(deadline):
+                raise ConnectionError(f"Keine Antwort des Plugins auf das Abo innerhalb von {timeout} s")
+            self._recv()
+        line = bytes(rx[self._rx_pos:end])
+        self._rx_pos = end + 1
+        if line.startswith(b"ERR"):
+            raise ValueError(f"Plugin lehnt das Abo ab: {line[3:].decode('utf-8', 'replace').strip()}")
+        _, reply = parse_subscription(line)
+        if reply["fields"] != self.fields or reply["encoding"] != self.protocol or \
+                (reply["rate"] == PULL) != self.pull:
+            raise ValueError(f"Plugin bestätigt ein anderes Abo: {line.decode('utf-8')}")
+        self.subscription = reply
+
+    def _recv(self):
+        n = self.sock.recv_into(self._chunk_view)
+        if n == 0:
+            raise ConnectionError("Verbindung vom Plugin geschlossen")
+        if self._rx_pos:
+            del self._rx[:self._rx_pos]
+            self._rx_pos = 0
+        self._rx += self._chunk_view[:n]
+
+    def _wait_readable(self, deadline):
+        # Blockiert im Selector statt im recv, damit eine Frist eingehalten werden kann
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if self._selector.select(timeout):
+            return True
+        self.stats["timeouts"] += 1
+        return False
+
+    def _drain(self):
+        # Alles lesen, was der Kernel bereits gepuffert hat, ohne zu blockieren
+        while self._selector.select(0):
+            self._recv()
+
+    def _pop_frame(self, out):
+        # Nächstes vollständiges Frame aus dem Puffer parsen, None falls noch keins komplett ist
+        rx = self._rx
+        if self.protocol == "binary":
+            while len(rx) - self._rx_pos >= FRAME_HEADER.size:
+                length, version = FRAME_HEADER.unpack_from(rx, self._rx_pos)
+                end = self._rx_pos + 2 + length
+                if end > len(rx):
+                    return None
+                start = self._rx_pos + FRAME_HEADER.size
+                self._rx_pos = end
+                # Längenpräfix erlaubt es, unbekannte Versionen zu überspringen
+                size = self._payload_size
+                if version != FRAME_VERSION or length not in (1 + size, 1 + size + FRAME_TICK.size):
+                    raise ValueError(f"Unbekanntes Frame: Version {version}, Länge {length}")
+                if length > 1 + size:
+                    self.tick = FRAME_TICK.unpack_from(rx, end - FRAME_TICK.size)[0]
+                with memoryview(rx) as view:
+                    return parse_binary_payload(view[start:start + size], out, self.n_fields, self.cp_index)
+            return None
+
+        while True:
+            end = rx.find(b"\n", self._rx_pos)
+            if end == -1:
+                return None
+            line = rx[self._rx_pos:end]
+            self._rx_pos = end + 1
+            if line.count(b",") == self.n_fields:
+                split = line.rindex(b",")
+                self.tick = int(float(line[split + 1:]))
+                line = line[:split]
+            if line.strip():
+                return parse_csv_line(line, out, self.n_fields, self.cp_index)
+
+    def _pop_valid_frame(self, out):
+        # Fehlerhafte Frames werden gezählt und übersprungen
+        profiler = self.profiler
+        while True:
+            try:
+                if profiler is None:
+                    frame = self._pop_frame(out)
+                else:
+                    start = time.perf_counter()
+                    frame = self._pop_frame(out)
+                    if frame is not None:
+                        profiler.add("parse", time.perf_counter() - start)
+            except ValueError:
+                self.stats["malformed"] += 1
+                continue
+            if frame is not None:
+                self.stats["frames"] += 1
+            return frame
+
+    def _next_obs(self, out, deadline=None):
+        while True:
+            obs = self._pop_valid_frame(out)
+            if obs is not None:
+                return obs
+            if not self._wait_readable(deadline):
+                return None
+            self._recv()
+
+    def _latest_obs(self, out, deadline=None):
+        self._drain()
+        if out is None:
+            out = np.empty(self.n_fields, dtype=np.float32)
+        cp, dt = self.cp_index, self.dt_index
+        obs = None
+        while True:
+            frame = self._pop_valid_frame(self._scratch)
+            if frame is None:
+                if obs is not None:
+                    break
+                if self._pending_checkpoints:
+                    # Kein neues Frame, aber noch ein Checkpoint offen: letztes Frame erneut liefern
+                    obs = out
+                    np.copyto(obs, self._last)
+                    break
+                # Noch gar nichts da: auf das nächste Frame warten
+                if not self._wait_readable(deadline):
+                    return None
+                self._recv()
+                continue
+            if cp is not None and frame[cp]:
+                self._pending_checkpoints.append(float(frame[dt]) if dt is not None else -1.0)
+            if obs is not None:
+                self.stats["dropped"] += 1
+            obs = out
+            np.copyto(obs, frame)
+        np.copyto(self._last, obs)
+
+        # Pro Beobachtung höchstens ein Checkpoint, weitere folgen mit den nächsten Beobachtungen
+        if cp is not None:
+            pending = self._pending_checkpoints.popleft() if self._pending_checkpoints else None
+            obs[cp] = 0.0 if pending is None else 1.0
+            if dt is not None:
+                obs[dt] = -1.0 if pending is None else pending
+        return obs
+
+    def _get_obs(self, out=None, timeout=None):
+        # Liefert None, wenn innerhalb von timeout Sekunden kein gültiges Frame ankam.
+        # Verbindungsfehler werden nicht verschluckt, sondern weitergereicht.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self.pull:
+            self.request()
+        if self.mode == "latest":
+            return self._latest_obs(out, deadline)
+        return self._next_obs(out, deadline)
+
+    def request(self):
+        # Abo mit rate="pull": das Plugin sendet genau ein Frame pro Anforderung
+        self.sock.sendall(b"GET\n")
+
+    def clear_checkpoints(self):
+        # Noch nicht ausgelieferte Checkpoint-Ereignisse verwerfen (z.B. nach einem Reset)
+        self._pending_checkpoints.clear()
+
+    def close(self):
+        self._selector.close()
+        self.sock.close()
+        #print("[INFO] Verbindung zum Server geschlossen.")
@@ -0,0 +1,391 @@
+import argparse
+import hashlib
+import selectors
+import signal
+import threading
+import time
+from collections import deque
+from multiprocessing import parent_process, resource_tracker, shared_memory
+import numpy as np
+from Telemetry_client import DEFAULT_FIELDS, PULL, TelemetryClient
+
+# Ein Hub für alle Trackmania-Instanzen auf einem Rechner: ein Prozess hält die Verbindungen zu
+# allen Plugins (main.as lauscht, der Hub verbindet sich wie TelemetryClient), parst jedes Frame
+# genau einmal und legt es in einem Ringpuffer in multiprocessing.shared_memory ab. Env-Worker
+# (SubprocVecEnv) und Lerner lesen per HubReader direkt aus dem geteilten Speicher, ohne eigenen
+# Socket, ohne Parsen und ohne Pickle durch eine Pipe.
+#
+#   python Telemetry_hub.py --ports 1337 1338 1339 --name trackmania_hub
+#   env = TrackmaniaEnv(port=1338, hub="trackmania_hub")
+#
+# Pro Instanz: head = Anzahl veröffentlichter Frames, dazu slots Plätze mit je einer
+# Sequenznummer (Seqlock): ungerade während des Schreibens, 2 * n + 2 sobald Frame n fertig ist.
+# Ein Leser kopiert Frame n und prüft die Nummer davor und danach; stimmt sie nicht, wurde der
+# Platz inzwischen überschrieben. Pro Platz schreibt nur der Hub, die Reihenfolge der Speicher-
+# zugriffe entspricht auf x86 der Programmreihenfolge.
+# Im Kopf steht ein Hash der Feldnamen in Hub-Reihenfolge; HubReader prüft ihn beim Verbinden,
+# damit gleich viele Felder in anderer Reihenfolge nicht still vertauscht gelesen werden.
+# Zähler pro Instanz (STAT_FIELDS): Frames, fehlerhafte Frames, von Lesern übersprungene Frames
+# (dropped), Frames pro Sekunde, verbunden ja/nein, Anzahl Neuverbindungen.
+
+HUB_MAGIC = 0x54484232  # "THB2"
+HEADER_FIELDS = ("magic", "n_instances", "slots", "n_fields", "running", "fields_hash")
+STAT_FIELDS = ("frames", "malformed", "dropped", "fps", "connected", "reconnects")
+DEFAULT_SLOTS = 64
+POLL_INTERVAL = 0.0005
+ATTACH_TIMEOUT = 10.0
+
+# Von Hubs dieses Prozesses angelegt (der eigene resource_tracker kennt sie schon)
+_CREATED = set()
+
+
+def _fields_hash(fields):
+    # Feldnamen und Reihenfolge als positive int64 für den Kopf
+    digest = hashlib.sha256(",".join(fields).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little") >> 1
+
+
+def _layout(n_instances, slots, n_fields):
+    # Name -> (dtype, Form, Offset); jedes Array beginnt auf einer eigenen Cache-Line
+    arrays = [
+        ("header", np.int64, (len(HEADER_FIELDS),)),
+        ("ports", np.int64, (n_instances,)),
+        ("head", np.uint64, (n_instances,)),
+        ("stats", np.float64, (n_instances, len(STAT_FIELDS))),
+        ("slot_seq", np.uint64, (n_instances, slots)),
+        ("stamp", np.float64, (n_instances, slots)),
+        ("tick", np.int64, (n_instances, slots)),
+        ("frames", np.float32, (n_instances, slots, n_fields)),
+    ]
+    layout = {}
+    offset = 0
+    for name, dtype, shape in arrays:
+        offset = (offset + 63) // 64 * 64
+        layout[name] = (dtype, shape, offset)
+        offset += np.dtype(dtype).itemsize * int(np.prod(shape))
+    return layout, offset
+
+
+def _views(buf, layout):
+    return {name: np.ndarray(shape, dtype, buf, offset) for name, (dtype, shape, offset) in layout.items()}
+
+
+class TelemetryHub:
+    # ports: ein Plugin-Port pro Instanz; protocol/fields/rate/tick wie TelemetryClient (für alle gleich).
+    # Nicht erreichbare oder getrennte Plugins werden alle reconnect_interval Sekunden neu versucht.
+    def __init__(self, ports, host="localhost", name=None, slots=DEFAULT_SLOTS, protocol="csv", fields=None,
+                 rate=None, tick=None, reconnect_interval=1.0):
+        if rate == PULL:
+            raise ValueError("Der Hub liest alle Frames selbst, rate=\"pull\" ist nicht möglich")
+        self.ports = list(ports)
+        self.host = host
+        self.slots = slots
+        self.client_kwargs = dict(protocol=protocol, mode="next", fields=fields, rate=rate, tick=tick)
+        self.fields = tuple(fields) if fields is not None else DEFAULT_FIELDS
+        self.n_fields = len(self.fields)
+        self.reconnect_interval = reconnect_interval
+
+        layout, size = _layout(len(self.ports), slots, self.n_fields)
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = self.shm.name
+        _CREATED.add(self.shm._name)
+        self._arrays = _views(self.shm.buf, layout)
+        self._arrays["header"][:] = (HUB_MAGIC, len(self.ports), slots, self.n_fields, 1, _fields_hash(self.fields))
+        self._arrays["ports"][:] = self.ports
+
+        self.clients = [None] * len(self.ports)
+        self._retry_at = [0.0] * len(self.ports)
+        self._scratch = np.empty(self.n_fields, dtype=np.float32)
+        self._selector = selectors.DefaultSelector()
+        self._rate_frames = np.zeros(len(self.ports))
+        self._rate_time = time.monotonic()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        # Im Hintergrund-Thread dieses Prozesses; für einen eigenen Prozess serve_forever() bzw. run_hub()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="TelemetryHub", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._running = True
+        self._run()
+
+    def _connect(self, i):
+        try:
+            client = TelemetryClient(self.host, self.ports[i], **self.client_kwargs)
+        except (ConnectionError, ValueError, OSError):
+            self._retry_at[i] = time.monotonic() + self.reconnect_interval
+            return
+        self.clients[i] = client
+        self._selector.register(client.sock, selectors.EVENT_READ, i)
+        stats = self._arrays["stats"][i]
+        stats[STAT_FIELDS.index("connected")] = 1
+        stats[STAT_FIELDS.index("reconnects")] += 1
+        print(f"[HUB] Instanz {i} (Port {self.ports[i]}) verbunden.")
+
+    def _disconnect(self, i, reason):
+        client = self.clients[i]
+        self._selector.unregister(client.sock)
+        client.close()
+        self.clients[i] = None
+        self._retry_at[i] = time.monotonic() + self.reconnect_interval
+        self._arrays["stats"][i, STAT_FIELDS.index("connected")] = 0
+        print(f"[HUB] Instanz {i} (Port {self.ports[i]}) getrennt: {reason}")
+
+    def _publish(self, i, frame, stamp, tick):
+        a = self._arrays
+        n = int(a["head"][i])
+        k = n % self.slots
+        a["slot_seq"][i, k] = 2 * n + 1
+        a["frames"][i, k] = frame
+        a["stamp"][i, k] = stamp
+        a["tick"][i, k] = -1 if tick is None else tick
+        a["slot_seq"][i, k] = 2 * n + 2
+        a["head"][i] = n + 1
+
+    def _read_client(self, i):
+        client = self.clients[i]
+        try:
+            client._recv()
+        except (ConnectionError, OSError) as e:
+            self._disconnect(i, e)
+            return
+        stamp = time.monotonic()
+        stats = self._arrays["stats"][i]
+        while True:
+            try:
+                frame = client._pop_valid_frame(self._scratch)
+            except ValueError as e:
+                # Unbekanntes Binärframe: Strom nicht mehr synchron
+                self._disconnect(i, e)
+                return
+            if frame is None:
+                break
+            self._publish(i, frame, stamp, client.tick)
+            stats[STAT_FIELDS.index("frames")] += 1
+        # Über Neuverbindungen hinweg aufsummiert
+        stats[STAT_FIELDS.index("malformed")] += client.stats["malformed"]
+        client.stats["malformed"] = 0
+
+    def _update_rates(self, now):
+        elapsed = now - self._rate_time
+        if elapsed < 1.0:
+            return
+        frames = self._arrays["stats"][:, STAT_FIELDS.index("frames")]
+        self._arrays["stats"][:, STAT_FIELDS.index("fps")] = (frames - self._rate_frames) / elapsed
+        self._rate_frames[:] = frames
+        self._rate_time = now
+
+    def _run(self):
+        try:
+            while self._running:
+                now = time.monotonic()
+                for i, client in enumerate(self.clients):
+                    if client is None and now >= self._retry_at[i]:
+                        self._connect(i)
+                if not self._selector.get_map():
+                    time.sleep(min(0.1, self.reconnect_interval))
+                    continue
+                for key, _ in self._selector.select(0.1):
+                    self._read_client(key.data)
+                self._update_rates(time.monotonic())
+        finally:
+            self._arrays["header"][HEADER_FIELDS.index("running")] = 0
+
+    def stats(self):
+        return [{"port": port, **dict(zip(STAT_FIELDS, map(float, row)))}
+                for port, row in zip(self.ports, self._arrays["stats"])]
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self._arrays["header"][HEADER_FIELDS.index("running")] = 0
+        for i, client in enumerate(self.clients):
+            if client is not None:
+                self._disconnect(i, "Hub beendet")
+        self._selector.close()
+        self._arrays = None
+        self.shm.close()
+        self.shm.unlink()
+        _CREATED.discard(self.shm._name)
+
+
+def run_hub(ports, name, **kwargs):
+    # Einstiegspunkt für einen eigenen Prozess (multiprocessing.Process oder CLI); SIGTERM beendet sauber
+    hub = TelemetryHub(ports, name=name, **kwargs)
+    signal.signal(signal.SIGTERM, lambda signum, frame: setattr(hub, "_running", False))
+    print(f"[HUB] Shared Memory \"{hub.name}\" für Ports {hub.ports}")
+    try:
+        hub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hub.stop()
+
+
+def _attach(name, timeout):
+    # Wartet, bis der Hub den Speicher angelegt hat
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+            break
+        except FileNotFoundError:
+            if time.monotonic() >= deadline:
+                raise ConnectionError(f"Kein Telemetrie-Hub \"{name}\" gefunden")
+            time.sleep(0.05)
+    if parent_process() is None and shm._name not in _CREATED:
+        # Unabhängiger Prozess: sonst gibt sein resource_tracker den Speicher beim Beenden frei
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class HubReader:
+    # Liest die Frames einer Instanz aus dem Hub; gleiche Schnittstelle wie TelemetryReader
+    # (latest, wait_newer, clear_checkpoints, seq, tick, error, stop), daher in TrackmaniaEnv
+    # austauschbar. Checkpoints aus übersprungenen Frames werden weitergereicht, solange sie noch
+    # im Ring stehen. Instanz per Index oder per Plugin-Port.
+    def __init__(self, name, instance=None, port=None, attach_timeout=ATTACH_TIMEOUT, fields=None):
+        self.shm = _attach(name, attach_timeout)
+        header = np.ndarray((len(HEADER_FIELDS),), np.int64, self.shm.buf, 0)
+        if header[0] != HUB_MAGIC:
+            self.shm.close()
+            raise ValueError(f"\"{name}\" ist kein Telemetrie-Hub (oder von einer anderen Version)")
+        n_instances, self.slots, self.n_fields = (int(v) for v in header[1:4])
+        self.fields = tuple(fields) if fields is not None else DEFAULT_FIELDS[:self.n_fields]
+        if int(header[HEADER_FIELDS.index("fields_hash")]) != _fields_hash(self.fields):
+            self.shm.close()
+            raise ValueError(f"Hub \"{name}\" liefert andere Felder (oder eine andere Reihenfolge) als erwartet: "
+                             f"{self.fields}; fields von Hub und Env müssen übereinstimmen")
+        layout, _ = _layout(n_instances, self.slots, self.n_fields)
+        a = self._arrays = _views(self.shm.buf, layout)
+        if instance is None:
+            ports = list(a["ports"])
+            if port not in ports:
+                self.close()
+                raise ValueError(f"Port {port} gehört zu keiner Instanz des Hubs {name} ({ports})")
+            instance = ports.index(port)
+        self.instance = instance
+        self._cp = self.fields.index("cp") if "cp" in self.fields else None
+        self._dt = self.fields.index("dt") if "dt" in self.fields else None
+
+        self._head = a["head"][instance:instance + 1]
+        self._slot_seq = a["slot_seq"][instance]
+        self._frames = a["frames"][instance]
+        self._stamp = a["stamp"][instance]
+        self._tick = a["tick"][instance]
+        self._hub_stats = a["stats"][instance]
+        self._running = a["header"][HEADER_FIELDS.index("running"):HEADER_FIELDS.index("running") + 1]
+        self._frame = np.empty(self.n_fields, dtype=np.float32)
+
+        self.seq = 0
+        self.stamp = 0.0
+        self.tick = None
+        self.error = None
+        self.pull = False
+        self.profiler = None
+        # overwritten: im Ring überschrieben, bevor Checkpoints daraus gelesen wurden
+        self.stats = {"frames": 0, "malformed": 0, "dropped": 0, "timeouts": 0, "overwritten": 0}
+        self._read_n = int(self._head[0])
+        self._pending_checkpoints = deque()
+
+    def _copy_frame(self, n, out):
+        # Seqlock: False, wenn Frame n nicht (mehr) im Ring steht oder gerade überschrieben wird
+        k = n % self.slots
+        expected = 2 * n + 2
+        if self._slot_seq[k] != expected:
+            return False
+        np.copyto(out, self._frames[k])
+        stamp = float(self._stamp[k])
+        tick = int(self._tick[k])
+        if self._slot_seq[k] != expected:
+            return False
+        self.stamp = stamp
+        self.tick = None if tick < 0 else tick
+        return True
+
+    def _read_slot(self, out):
+        if out is None:
+            out = np.empty(self.n_fields, dtype=np.float32)
+        while True:
+            head = int(self._head[0])
+            start = max(self._read_n, head - self.slots)
+            lost = start - self._read_n
+            # Checkpoint-Ereignisse der Frames seit dem letzten Lesen einsammeln; erst übernehmen,
+            # wenn das neueste Frame gültig kopiert wurde, sonst kämen sie beim Wiederholen doppelt
+            checkpoints = []
+            if self._cp is not None:
+                for n in range(start, head - 1):
+                    if not self._copy_frame(n, self._frame):
+                        lost += 1
+                    elif self._frame[self._cp]:
+                        checkpoints.append(float(self._frame[self._dt]) if self._dt is not None else -1.0)
+            if self._copy_frame(head - 1, out):
+                break
+        if self._cp is not None and out[self._cp]:
+            checkpoints.append(float(out[self._dt]) if self._dt is not None else -1.0)
+        self._pending_checkpoints.extend(checkpoints)
+        dropped = head - self._read_n - 1
+        if dropped > 0:
+            self.stats["dropped"] += dropped
+            self._hub_stats[STAT_FIELDS.index("dropped")] += dropped
+        self.stats["overwritten"] += lost
+        self.stats["frames"] += 1
+        self._read_n = head
+        self.seq = head
+
+        if self._cp is not None:
+            pending = self._pending_checkpoints.popleft() if self._pending_checkpoints else None
+            out[self._cp] = 0.0 if pending is None else 1.0
+            if self._dt is not None:
+                out[self._dt] = -1.0 if pending is None else pending
+        return out, self.seq, self.stamp
+
+    def latest(self, out=None):
+        # Neueste Beobachtung ohne zu warten, (None, seq, 0.0) solange noch kein neues Frame da ist
+        if int(self._head[0]) == 0:
+            return None, 0, 0.0
+        return self._read_slot(out)
+
+    def wait_newer(self, seq, timeout=None, out=None):
+        # Pollt den Kopf des Rings; bei Timeout oder beendetem Hub ist obs None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while int(self._head[0]) <= seq:
+            if not self._running[0]:
+                self.error = ConnectionError("Telemetrie-Hub beendet")
+                return None, self.seq, self.stamp
+            if deadline is not None and time.monotonic() >= deadline:
+                return None, self.seq, self.stamp
+            time.sleep(POLL_INTERVAL)
+        return self._read_slot(out)
+
+    def hub_stats(self):
+        return dict(zip(STAT_FIELDS, map(float, self._hub_stats)))
+
+    def clear_checkpoints(self):
+        self._pending_checkpoints.clear()
+
+    def close(self):
+        # Views vor dem Schließen freigeben, sonst kann mmap nicht geschlossen werden
+        self._arrays = self._head = self._slot_seq = self._frames = None
+        self._stamp = self._tick = self._hub_stats = self._running = None
+        self.shm.close()
+
+    def stop(self):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Telemetrie aller Trackmania-Instanzen in Shared Memory bereitstellen")
+    parser.add_argument("--ports", type=int, nargs="+", default=[1337], help="Plugin-Port pro Instanz")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--name", default="trackmania_hub", help="Name des Shared-Memory-Blocks")
+    parser.add_argument("--slots", type=int, default=DEFAULT_SLOTS, help="Frames pro Instanz im Ring")
+    parser.add_argument("--protocol", default="csv", choices=("csv", "binary"))
+    args = parser.parse_args()
+
+    run_hub(args.ports, args.name, host=args.host, slots=args.slots, protocol=args.protocol)
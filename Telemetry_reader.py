@@ -0,0 +1,104 @@
+import socket
+import threading
+import time
+from collections import deque
+import numpy as np
+
+
+class TelemetryReader:
+    # Liest im Hintergrund jedes Frame vom TelemetryClient und legt das neueste
+    # mit Empfangszeitpunkt (time.monotonic) und Sequenznummer in einem festen Slot ab.
+    # Checkpoint-Ereignisse werden wie im "latest"-Modus des Clients nicht verloren,
+    # sondern an die folgenden gelesenen Beobachtungen weitergegeben.
+    def __init__(self, client):
+        if client.pull:
+            raise ValueError("Hintergrund-Reader und Abo mit rate=\"pull\" schließen sich aus")
+        self.client = client
+        self.seq = 0
+        self.stamp = 0.0
+        self.error = None
+        # Spielzeit (ms) des zuletzt ausgelesenen Frames, falls das Plugin sie mitsendet
+        self.tick = None
+        self._slot_tick = None
+
+        self._frame = np.empty(client.n_fields, dtype=np.float32)
+        self._slot = np.zeros(client.n_fields, dtype=np.float32)
+        self._cp, self._dt = client.cp_index, client.dt_index
+        self._pending_checkpoints = deque()
+        self._read_seq = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="TelemetryReader", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while self._running:
+            try:
+                frame = self.client._next_obs(self._frame)
+            except Exception as e:
+                with self._cond:
+                    self.error = e
+                    self._running = False
+                    self._cond.notify_all()
+                return
+
+            stamp = time.monotonic()
+            with self._cond:
+                np.copyto(self._slot, frame)
+                self._slot_tick = self.client.tick
+                if self._cp is not None and frame[self._cp]:
+                    self._pending_checkpoints.append(float(frame[self._dt]) if self._dt is not None else -1.0)
+                self.seq += 1
+                self.stamp = stamp
+                self._cond.notify_all()
+
+    def _read_slot(self, out):
+        if out is None:
+            out = np.empty(self.client.n_fields, dtype=np.float32)
+        np.copyto(out, self._slot)
+        # Frames, die überschrieben wurden, bevor sie jemand gelesen hat
+        if self.seq - self._read_seq > 1:
+            self.client.stats["dropped"] += self.seq - self._read_seq - 1
+        self._read_seq = self.seq
+        self.tick = self._slot_tick
+        if self._cp is not None:
+            pending = self._pending_checkpoints.popleft() if self._pending_checkpoints else None
+            out[self._cp] = 0.0 if pending is None else 1.0
+            if self._dt is not None:
+                out[self._dt] = -1.0 if pending is None else pending
+        return out, self.seq, self.stamp
+
+    def latest(self, out=None):
+        # Neueste Beobachtung ohne zu warten, (None, 0, 0.0) solange noch kein Frame da ist
+        with self._cond:
+            if self.seq == 0:
+                return None, 0, 0.0
+            return self._read_slot(out)
+
+    def wait_newer(self, seq, timeout=None, out=None):
+        # Wartet auf ein Frame mit Sequenznummer > seq; bei Timeout oder Lesefehler ist obs None
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq > seq or not self._running, timeout)
+            if self.seq <= seq:
+                return None, self.seq, self.stamp
+            return self._read_slot(out)
+
+    def clear_checkpoints(self):
+        with self._cond:
+            self._pending_checkpoints.clear()
+
+    def stop(self):
+        self._running = False
+        try:
+            # Weckt den Thread aus einem blockierenden recv
+            self.client.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self.client.close()
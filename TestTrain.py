@@ -1,43 +1,57 @@
 import os
-import csv
-from datetime import datetime
+import multiprocessing
 from Gym_env import TrackmaniaEnv
+from Trajectory_recorder import TrajectoryRecorder
+from Training_callbacks import CheckpointCallback, MetricsCallback, ProfilingCallback
+from Metrics import MetricsSink
+from Env_wrappers import FixedRateWrapper, FrameHistoryWrapper, TrackFeatureWrapper, VecFrameHistory, VecTrackFeatures
+from Offline_pretrain import behaviour_cloning
+from Sim_vec_env import TrackmaniaSimVecEnv
+from Track_geometry import TrackIndex, load_or_build
+from Telemetry_hub import run_hub
 from stable_baselines3 import PPO
-from stable_baselines3.common.env_util import make_vec_env
-from stable_baselines3.common.callbacks import BaseCallback, CallbackList
-from torch.utils.tensorboard import SummaryWriter  # TensorBoard Logging
-import sys
-
-# Callback zum Speichern des Modells alle N-Epochen
-class SaveEveryNEpochsCallback(BaseCallback):
-    def __init__(self, save_freq, save_path, verbose=1):
-        super().__init__(verbose)
-        self.save_freq = save_freq
-        self.save_path = save_path
-        os.makedirs(save_path, exist_ok=True)
-
-    def _on_step(self) -> bool:
-        if self.n_calls % self.save_freq == 0:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            model_path = os.path.join(self.save_path, f"ppo_trackmania_{timestamp}")
-            self.model.save(model_path)
-            if self.verbose:
-                print(f"Modell gespeichert: {model_path}")
-        return True
-
-
-
-# Optional: Wrapper-Funktion für VectorEnv
-def make_env():
-    return TrackmaniaEnv()
-
-# Vektorisiertes Environment – 1 Env reicht zum Start
-env = make_vec_env(make_env, n_envs=1)
-
-# PPO-Modell initialisieren
-model = PPO(
-    "MlpPolicy",
-    env,
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+from stable_baselines3.common.callbacks import CallbackList
+
+# Parallele Trackmania-Instanzen: Env i verbindet sich mit Port BASE_PORT + i
+# (im Plugin jeder Instanz den Port entsprechend einstellen)
+N_ENVS = 1
+BASE_HOST = "localhost"
+BASE_PORT = 1337
+
+# Ein Hub-Prozess liest die Telemetrie aller Instanzen und legt sie in Shared Memory ab
+# (Telemetry_hub.py), die Envs lesen dort statt über eigene Sockets; None = aus
+HUB_NAME = None
+
+# Alle Übergänge aufzeichnen (Trajectory_recorder.py), None = aus; pro Env ein Unterordner
+RECORD_DIR = None
+
+# Feste Entscheidungsfrequenz in Hz (None = so schnell wie Frames ankommen) und
+# Anzahl Frames, die jede Aktion gehalten wird (Env_wrappers.FixedRateWrapper)
+CONTROL_RATE = None
+ACTION_REPEAT = 1
+
+# Zeitmessung pro Phase (Socket, Parsen, Gamepad, Reset, Inferenz, Update) nach TensorBoard "timing/"
+PROFILE = False
+
+# Beobachtung = letzte K Frames inkl. Geschwindigkeit, Gierrate usw. (Env_wrappers.py), 0 = aus
+FRAME_HISTORY = 0
+
+# Streckenfortschritt und seitlicher Abstand zur Ideallinie als zusätzliche Beobachtung
+# (Track_geometry.py); Index aus den Runden in TRACK_RECORDINGS, gecacht unter track_cache/TRACK_NAME.npz.
+# None = aus. Belohnung pro gefahrenem Streckenmeter bzw. Strafe pro Meter Abstand, 0 = nur Beobachtung.
+TRACK_NAME = None
+TRACK_RECORDINGS = ["recordings/env_0"]
+TRACK_PROGRESS_REWARD = 0.0
+TRACK_LATERAL_PENALTY = 0.0
+
+# Behaviour Cloning auf aufgezeichneten Fahrten vor dem PPO-Training, None = aus
+BC_DATA_DIR = None
+BC_EPOCHS = 5
+
+# PPO-Hyperparameter
+PPO_KWARGS = dict(
     verbose=1,
     n_steps=1024,               # Etwas weniger Schritte pro Update (damit das Modell schneller lernt)
     batch_size=128,             # Größere Batches für stabilere Updates
@@ -53,34 +67,93 @@ model = PPO(
     policy_kwargs=dict(net_arch=[128, 64]),  # Kleinere Netzwerkarchitektur für spezialisierte Lernfähigkeit
 )
 
-# Speichern alle (3 * n_steps) Schritte = alle 3 Epochs
-save_callback = SaveEveryNEpochsCallback(
-    save_freq=10 * model.n_steps,
-    save_path="./saved_models4"
-)
-
-# Alle Callbacks zusammenstellen
-callback = CallbackList([save_callback])
-
-def redirect_stdout_to_log(log_file_path="output.txt"):
-    # Öffne die Log-Datei im Anhängemodus (falls sie nicht existiert, wird sie erstellt)
-    log_file = open(log_file_path, "a")
-    
-    # Umleiten der Standardausgabe (alles, was mit print() ausgegeben wird)
-    sys.stdout = log_file
-
-    print(f"Logging gestartet. Alle Ausgaben werden in {log_file_path} gespeichert.")
-
-# Funktion zum Zurücksetzen der Standardausgabe
-def reset_stdout():
-    sys.stdout = sys.__stdout__  # Setzt stdout auf den ursprünglichen Wert zurück
-
-redirect_stdout_to_log()
-
-# Training mit Callback
-model.learn(total_timesteps=20_000_000, callback=callback)
-
-# Modell speichern
-model.save("ppo_trackmania")
-
-env.close()
+# Episoden, Losses und Belohnungs-Stichproben (Metrics.py): CSV pro Stream + TensorBoard "episode/", "loss/"
+METRICS_DIR = "./metrics/ppo"
+
+# Vortraining im Simulator (Sim_vec_env.py), 0 = aus
+SIM_PRETRAIN_STEPS = 0
+SIM_N_ENVS = 256
+SIM_N_STEPS = 64
+SIM_BATCH_SIZE = 2048
+
+def make_env(rank, track=None):
+    # track: im Hauptprozess gebauter TrackIndex, damit die Env-Prozesse den Cache nicht gleichzeitig schreiben
+    def _init():
+        env = TrackmaniaEnv(host=BASE_HOST, port=BASE_PORT + rank, profile=PROFILE, hub=HUB_NAME)
+        if RECORD_DIR is not None:
+            env = TrajectoryRecorder(env, os.path.join(RECORD_DIR, f"env_{rank}"))
+        if CONTROL_RATE is not None or ACTION_REPEAT > 1:
+            env = FixedRateWrapper(env, CONTROL_RATE, ACTION_REPEAT)
+        if track is not None:
+            env = TrackFeatureWrapper(env, track, TRACK_PROGRESS_REWARD, TRACK_LATERAL_PENALTY)
+        if FRAME_HISTORY > 0:
+            env = FrameHistoryWrapper(env, FRAME_HISTORY)
+        return Monitor(env)
+    return _init
+
+if __name__ == "__main__":
+    hub = None
+    if HUB_NAME is not None:
+        hub = multiprocessing.Process(target=run_hub, args=([BASE_PORT + i for i in range(N_ENVS)], HUB_NAME),
+                                      kwargs=dict(host=BASE_HOST), daemon=True)
+        hub.start()
+
+    # Vektorisiertes Environment – SubprocVecEnv, sobald mehrere Instanzen laufen
+    track = load_or_build(TRACK_NAME, TRACK_RECORDINGS) if TRACK_NAME is not None else None
+    env_fns = [make_env(i, track) for i in range(N_ENVS)]
+    env = SubprocVecEnv(env_fns) if N_ENVS > 1 else DummyVecEnv(env_fns)
+
+    # Optional: zuerst im Simulator vortrainieren, dann mit denselben Gewichten im Spiel weiter
+    if SIM_PRETRAIN_STEPS > 0:
+        sim_env = TrackmaniaSimVecEnv(n_envs=SIM_N_ENVS)
+        if TRACK_NAME is not None:
+            # Im Simulator ist die Mittellinie bekannt
+            sim_env = VecTrackFeatures(sim_env, TrackIndex(sim_env.cars.track.centerline()),
+                                       TRACK_PROGRESS_REWARD, TRACK_LATERAL_PENALTY)
+        if FRAME_HISTORY > 0:
+            sim_env = VecFrameHistory(sim_env, FRAME_HISTORY, dt=sim_env.dt)
+        sim_model = PPO("MlpPolicy", sim_env, **{**PPO_KWARGS, "n_steps": SIM_N_STEPS, "batch_size": SIM_BATCH_SIZE})
+        sim_model.learn(total_timesteps=SIM_PRETRAIN_STEPS, tb_log_name="PPO_sim")
+        sim_model.save("ppo_trackmania_sim")
+        # load statt set_env, da sich die Anzahl der Envs ändert
+        model = PPO.load("ppo_trackmania_sim", env=env, custom_objects={
+            "n_steps": PPO_KWARGS["n_steps"], "batch_size": PPO_KWARGS["batch_size"],
+        })
+    else:
+        # PPO-Modell initialisieren
+        model = PPO("MlpPolicy", env, **PPO_KWARGS)
+
+    # Policy zuerst auf die aufgezeichneten Aktionen trainieren
+    if BC_DATA_DIR is not None:
+        behaviour_cloning(model, BC_DATA_DIR, epochs=BC_EPOCHS)
+
+    # Speichern alle (3 * n_steps) Schritte = alle 3 Epochs
+    save_callback = CheckpointCallback(
+        save_freq=10 * model.n_steps,
+        save_path="./saved_models4",
+        name_prefix="ppo_trackmania",
+    )
+
+    # Kennzahlen gepuffert sammeln, geschrieben wird gebündelt im Hintergrund
+    metrics = MetricsSink(METRICS_DIR, tensorboard_dir=os.path.join(PPO_KWARGS["tensorboard_log"], "metrics"))
+
+    # Alle Callbacks zusammenstellen
+    callbacks = [save_callback, MetricsCallback(metrics)]
+    if PROFILE:
+        callbacks.append(ProfilingCallback())
+    callback = CallbackList(callbacks)
+
+    # Training mit Callback
+    try:
+        model.learn(total_timesteps=20_000_000, callback=callback)
+    finally:
+        metrics.close()
+
+    # Modell speichern
+    model.save("ppo_trackmania")
+
+    env.close()
+    if hub is not None:
+        # SIGTERM: der Hub gibt das Shared Memory selbst frei
+        hub.terminate()
+        hub.join()
@@ -1,90 +1,90 @@
 import os
-import csv
-from datetime import datetime
 from Gym_env import TrackmaniaEnv
+from Trajectory_recorder import TrajectoryRecorder
+from Env_wrappers import FixedRateWrapper
+from Training_callbacks import CheckpointCallback, MetricsCallback, ProfilingCallback
+from Metrics import MetricsSink
+from Offline_pretrain import prefill_replay_buffer
 from stable_baselines3 import DQN
-from stable_baselines3.common.env_util import make_vec_env
-from stable_baselines3.common.callbacks import BaseCallback, CallbackList
-from torch.utils.tensorboard import SummaryWriter  # TensorBoard Logging
-import sys
-
-# Callback zum Speichern des Modells alle N-Epochen
-class SaveEveryNEpochsCallback(BaseCallback):
-    def __init__(self, save_freq, save_path, verbose=1):
-        super().__init__(verbose)
-        self.save_freq = save_freq
-        self.save_path = save_path
-        os.makedirs(save_path, exist_ok=True)
-
-    def _on_step(self) -> bool:
-        if self.n_calls % self.save_freq == 0:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            model_path = os.path.join(self.save_path, f"dqn_trackmania_{timestamp}")
-            self.model.save(model_path)
-            if self.verbose:
-                print(f"Modell gespeichert: {model_path}")
-        return True
-
-
-# Callback zum Loggen der Loss-Werte
-class LossLoggingCallback(BaseCallback):
-    def __init__(self, log_path="loss_log.txt", verbose=0, tensorboard_log="./dqn_trackmania_tensorboard/"):
-        super().__init__(verbose)
-        self.log_path = log_path
-        self.header_written = False
-        self.writer = SummaryWriter(tensorboard_log)
-
-    def _on_step(self) -> bool:
-        log_dict = self.model.logger.name_to_value
-        q_loss = log_dict.get("train/q_loss")  # DQN speichert den Q-Loss als "train/q_loss"
-        
-        if q_loss is not None:
-            with open(self.log_path, "a") as logfile:
-                if not self.header_written:
-                    logfile.write("step\tq_loss\n")
-                    self.header_written = True
-                logfile.write(f"{self.num_timesteps}\t{q_loss}\n")
-            self.writer.add_scalar("Loss/Q_Loss", q_loss, self.num_timesteps)
-
-        return True
-
-def redirect_stdout_to_log(log_file_path="output.txt"):
-    log_file = open(log_file_path, "a")
-    sys.stdout = log_file
-    print(f"Logging gestartet. Alle Ausgaben werden in {log_file_path} gespeichert.")
-
-def reset_stdout():
-    sys.stdout = sys.__stdout__
-
-redirect_stdout_to_log()
-
-# Vektorisiertes Environment – 1 Env reicht zum Start
-env = make_vec_env(lambda: TrackmaniaEnv(), n_envs=1)
-
-# DQN-Modell initialisieren
-model = DQN(
-    "MlpPolicy",
-    env,
-    verbose=1
-)
-
-# Speichern alle (3 * n_steps) Schritte = alle 3 Epochs
-save_callback = SaveEveryNEpochsCallback(
-    save_freq=10000,
-    save_path="./saved_models3"
-)
-
-# Callback zum Loggen der Loss-Werte
-loss_callback = LossLoggingCallback()
-
-# Alle Callbacks zusammenstellen
-callback = CallbackList([save_callback, loss_callback])
-
-# Training mit Callback
-model.learn(total_timesteps=10_000_000, callback=callback)
-
-# Modell speichern
-model.save("dqn_trackmania")
-
-env.close()
-reset_stdout()
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+from stable_baselines3.common.callbacks import CallbackList
+
+# Parallele Trackmania-Instanzen: Env i verbindet sich mit Port BASE_PORT + i
+# (im Plugin jeder Instanz den Port entsprechend einstellen)
+N_ENVS = 1
+BASE_HOST = "localhost"
+BASE_PORT = 1337
+
+# Alle Übergänge aufzeichnen (Trajectory_recorder.py), None = aus; pro Env ein Unterordner
+RECORD_DIR = None
+
+# Feste Entscheidungsfrequenz in Hz (None = so schnell wie Frames ankommen) und
+# Anzahl Frames, die jede Aktion gehalten wird (Env_wrappers.FixedRateWrapper)
+CONTROL_RATE = None
+ACTION_REPEAT = 1
+
+# Zeitmessung pro Phase (Socket, Parsen, Gamepad, Reset, Inferenz, Update) nach TensorBoard "timing/"
+PROFILE = False
+PROFILE_LOG_EVERY = 500     # Rollouts à train_freq=4 Schritte, also etwa alle 2000 Schritte ein "timing/"-Eintrag
+
+# Episoden, Losses und Belohnungs-Stichproben (Metrics.py): CSV pro Stream + TensorBoard "episode/", "loss/"
+METRICS_DIR = "./metrics/dqn"
+TENSORBOARD_DIR = "./dqn_trackmania_tensorboard/"
+
+# Aufzeichnungen, mit denen der ReplayBuffer vor dem Training gefüllt wird, None = aus
+OFFLINE_DATA_DIR = None
+
+def make_env(rank):
+    def _init():
+        env = TrackmaniaEnv(host=BASE_HOST, port=BASE_PORT + rank, profile=PROFILE)
+        if RECORD_DIR is not None:
+            env = TrajectoryRecorder(env, os.path.join(RECORD_DIR, f"env_{rank}"))
+        if CONTROL_RATE is not None or ACTION_REPEAT > 1:
+            env = FixedRateWrapper(env, CONTROL_RATE, ACTION_REPEAT)
+        return Monitor(env)
+    return _init
+
+if __name__ == "__main__":
+    # Vektorisiertes Environment – SubprocVecEnv, sobald mehrere Instanzen laufen
+    env_fns = [make_env(i) for i in range(N_ENVS)]
+    env = SubprocVecEnv(env_fns) if N_ENVS > 1 else DummyVecEnv(env_fns)
+
+    # DQN-Modell initialisieren
+    model = DQN(
+        "MlpPolicy",
+        env,
+        verbose=1
+    )
+
+    # ReplayBuffer mit bereits aufgezeichneten Fahrten vorfüllen
+    if OFFLINE_DATA_DIR is not None:
+        n_offline = prefill_replay_buffer(model.replay_buffer, OFFLINE_DATA_DIR)
+        print(f"[INFO] {n_offline} aufgezeichnete Übergänge in den ReplayBuffer geladen.")
+
+    # Speichern alle (3 * n_steps) Schritte = alle 3 Epochs
+    save_callback = CheckpointCallback(
+        save_freq=10000,
+        save_path="./saved_models3",
+        name_prefix="dqn_trackmania",
+    )
+
+    # Kennzahlen gepuffert sammeln; der Loss ("train/loss") wird einmal pro Update gelesen
+    metrics = MetricsSink(METRICS_DIR, tensorboard_dir=os.path.join(TENSORBOARD_DIR, "metrics"))
+
+    # Alle Callbacks zusammenstellen
+    callbacks = [save_callback, MetricsCallback(metrics)]
+    if PROFILE:
+        callbacks.append(ProfilingCallback(log_every=PROFILE_LOG_EVERY))
+    callback = CallbackList(callbacks)
+
+    # Training mit Callback
+    try:
+        model.learn(total_timesteps=10_000_000, callback=callback)
+    finally:
+        metrics.close()
+
+    # Modell speichern
+    model.save("dqn_trackmania")
+
+    env.close()
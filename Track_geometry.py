@@ -0,0 +1,251 @@
+import argparse
+import hashlib
+import json
+import os
+import numpy as np
+from Car_model import N_CHECKPOINTS
+
+# Streckengeometrie aus aufgezeichneten Runden:
+# - build_centerline(): mittelt mehrere Runden (x, y) nach normierter Bogenlänge zu einer Linie
+# - TrackIndex: Segmente der Linie in einem gleichmäßigen Raster; jede Zelle kennt alle Segmente,
+#   die näher als radius an ihr liegen (fest gepolstertes Array). Eine Abfrage ist damit O(1):
+#   Zelle berechnen, höchstens max_candidates Segmente projizieren. Punkte weiter als radius von
+#   der Strecke fallen auf eine Suche über alle Segmente zurück.
+# - query(x, y) liefert für beliebig viele Punkte auf einmal Fortschritt (0..1), Bogenlänge,
+#   seitlichen Abstand (m, positiv = links in Fahrtrichtung) und Segmentnummer
+# - load_or_build(): Index pro Strecke als .npz im Cache, neu gebaut nur bei geänderten Aufnahmen
+#   (Schlüssel = Hash der verwendeten Daten, nicht der Änderungszeiten; Schreiben über .tmp + os.replace)
+#
+#   python Track_geometry.py build recordings/env_0 --name A01 --cache track_cache
+
+CACHE_DIR = "track_cache"
+
+
+def _resample(points, n):
+    # n Punkte in gleichen Bogenlängen-Abständen entlang der Polylinie
+    steps = np.hypot(*np.diff(points, axis=0).T)
+    keep = np.concatenate([[True], steps > 1e-6])
+    points = points[keep]
+    s = np.concatenate([[0.0], np.cumsum(steps[keep[1:]])])
+    if s[-1] <= 0:
+        raise ValueError("Runde ohne Bewegung")
+    u = np.linspace(0.0, s[-1], n)
+    return np.stack([np.interp(u, s, points[:, 0]), np.interp(u, s, points[:, 1])], axis=1)
+
+
+def build_centerline(laps, spacing=2.0):
+    # laps: Liste von (n, 2)-Arrays mit Positionen vom Start bis zum Ziel
+    laps = [np.asarray(lap, dtype=np.float64)[:, :2] for lap in laps if len(lap) > 1]
+    if not laps:
+        raise ValueError("Keine Runden für die Mittellinie")
+    length = np.median([np.hypot(*np.diff(lap, axis=0).T).sum() for lap in laps])
+    n = max(2, int(np.ceil(length / spacing)) + 1)
+    return np.mean([_resample(lap, n) for lap in laps], axis=0)
+
+
+class TrackIndex:
+    def __init__(self, points, closed=None, cell_size=5.0, radius=20.0, _grid=None):
+        points = np.ascontiguousarray(points, dtype=np.float64)
+        if closed is None:
+            # Rundkurs, wenn Start und Ziel fast zusammenfallen
+            spacing = np.median(np.hypot(*np.diff(points, axis=0).T))
+            gap = np.hypot(*(points[-1] - points[0]))
+            closed = bool(gap < 2 * spacing)
+            if closed and gap < 0.5 * spacing:
+                points = points[:-1]
+        self.points = points
+        self.closed = bool(closed)
+        self.cell_size = float(cell_size)
+        self.radius = float(radius)
+
+        ends = np.roll(points, -1, axis=0) if self.closed else points[1:]
+        starts = points if self.closed else points[:-1]
+        self.seg_a = starts
+        self.seg_d = ends - starts
+        self.seg_len = np.hypot(self.seg_d[:, 0], self.seg_d[:, 1])
+        self.seg_len2 = np.maximum(self.seg_len ** 2, 1e-12)
+        self.seg_s0 = np.concatenate([[0.0], np.cumsum(self.seg_len)[:-1]])
+        self.length = float(self.seg_len.sum())
+
+        if _grid is None:
+            _grid = self._build_grid()
+        self.origin, self.shape, self.table = _grid
+
+    def _build_grid(self):
+        ends = self.seg_a + self.seg_d
+        lo = np.minimum(self.seg_a, ends).min(axis=0) - self.radius
+        hi = np.maximum(self.seg_a, ends).max(axis=0) + self.radius
+        shape = np.maximum(np.ceil((hi - lo) / self.cell_size).astype(np.int64), 1)
+        # Ein Segment gehört zu allen Zellen, deren Mittelpunkt näher als radius + halbe Diagonale liegt:
+        # dann ist für jeden Punkt der Zelle jedes Segment im Abstand <= radius Kandidat
+        reach2 = (self.radius + self.cell_size * np.sqrt(0.5)) ** 2
+        c_lo = np.floor((np.minimum(self.seg_a, ends) - self.radius - lo) / self.cell_size).astype(np.int64)
+        c_hi = np.floor((np.maximum(self.seg_a, ends) + self.radius - lo) / self.cell_size).astype(np.int64)
+        c_lo, c_hi = np.maximum(c_lo, 0), np.minimum(c_hi, shape - 1)
+        cells = [[] for _ in range(int(shape[0] * shape[1]))]
+        for seg in range(len(self.seg_a)):
+            cx, cy = np.meshgrid(np.arange(c_lo[seg, 0], c_hi[seg, 0] + 1),
+                                 np.arange(c_lo[seg, 1], c_hi[seg, 1] + 1), indexing="ij")
+            cx, cy = cx.ravel(), cy.ravel()
+            centers = lo + (np.stack([cx, cy], axis=1) + 0.5) * self.cell_size
+            rel = centers - self.seg_a[seg]
+            t = np.clip(rel @ self.seg_d[seg] / self.seg_len2[seg], 0.0, 1.0)
+            dist2 = ((rel - t[:, None] * self.seg_d[seg]) ** 2).sum(axis=1)
+            for cell in (cx * shape[1] + cy)[dist2 <= reach2]:
+                cells[cell].append(seg)
+        width = max(1, max(len(c) for c in cells))
+        table = np.full((len(cells), width), -1, dtype=np.int32)
+        for i, segs in enumerate(cells):
+            table[i, :len(segs)] = segs
+        return lo, shape, table
+
+    @property
+    def max_candidates(self):
+        return self.table.shape[1]
+
+    def _project(self, px, py, segs):
+        # Projektion der Punkte auf die Kandidaten-Segmente (B, K); -1 = kein Segment
+        valid = segs >= 0
+        segs = np.where(valid, segs, 0)
+        ax, ay = self.seg_a[segs, 0], self.seg_a[segs, 1]
+        dx, dy = self.seg_d[segs, 0], self.seg_d[segs, 1]
+        rx, ry = px[:, None] - ax, py[:, None] - ay
+        t = np.clip((rx * dx + ry * dy) / self.seg_len2[segs], 0.0, 1.0)
+        ex, ey = rx - t * dx, ry - t * dy
+        dist2 = np.where(valid, ex * ex + ey * ey, np.inf)
+        best = np.argmin(dist2, axis=1)
+        rows = np.arange(len(px))
+        seg, t_best = segs[rows, best], t[rows, best]
+        cross = dx[rows, best] * ry[rows, best] - dy[rows, best] * rx[rows, best]
+        lateral = np.sqrt(dist2[rows, best]) * np.where(cross >= 0, 1.0, -1.0)
+        return seg, self.seg_s0[seg] + t_best * self.seg_len[seg], lateral, dist2[rows, best]
+
+    def query(self, x, y):
+        # Liefert (progress 0..1, s in m, lateral in m, Segment) in der Form von x
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        shape = np.broadcast(x, y).shape
+        px, py = np.broadcast_to(x, shape).ravel(), np.broadcast_to(y, shape).ravel()
+
+        cx = np.floor((px - self.origin[0]) / self.cell_size).astype(np.int64)
+        cy = np.floor((py - self.origin[1]) / self.cell_size).astype(np.int64)
+        inside = (cx >= 0) & (cx < self.shape[0]) & (cy >= 0) & (cy < self.shape[1])
+        cells = np.where(inside, cx * self.shape[1] + cy, 0)
+        segs = np.where(inside[:, None], self.table[cells], -1)
+        seg, s, lateral, dist2 = self._project(px, py, segs)
+
+        far = dist2 > self.radius ** 2
+        if far.any():
+            # Abseits der Strecke: alle Segmente prüfen (selten, O(n))
+            all_segs = np.broadcast_to(np.arange(len(self.seg_a), dtype=np.int64), (int(far.sum()), len(self.seg_a)))
+            seg[far], s[far], lateral[far], _ = self._project(px[far], py[far], all_segs)
+        return (s / self.length).reshape(shape), s.reshape(shape), lateral.reshape(shape), seg.reshape(shape)
+
+    def progress_delta(self, s_new, s_old):
+        # Fortschritt in m zwischen zwei Abfragen; bei Rundkursen über die Ziellinie hinweg
+        delta = np.asarray(s_new) - np.asarray(s_old)
+        if self.closed:
+            delta = np.mod(delta + self.length / 2, self.length) - self.length / 2
+        return delta
+
+    def save(self, path, **meta):
+        # Temp-Datei pro Prozess, damit parallele Env-Prozesse nie eine halb geschriebene Datei lesen
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, points=self.points, closed=self.closed, cell_size=self.cell_size, radius=self.radius,
+                     origin=self.origin, shape=self.shape, table=self.table, meta=json.dumps(meta))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            index = cls(data["points"], bool(data["closed"]), float(data["cell_size"]), float(data["radius"]),
+                        _grid=(data["origin"], data["shape"], data["table"]))
+            index.meta = json.loads(str(data["meta"]))
+        return index
+
+
+def _split_episodes(xy, distance, done):
+    # Episodengrenzen: Ende laut Aufnahme oder Neustart (gefahrene Distanz springt zurück)
+    starts = np.flatnonzero(np.concatenate([[True], done[:-1] | (np.diff(distance) < -1.0)]))
+    return np.split(np.arange(len(xy)), starts[1:])
+
+
+def laps_from_recording(path, min_checkpoints=N_CHECKPOINTS):
+    # path: Ordner von Trajectory_recorder.py oder CSV-Telemetrie (Mock_plugin.py --record);
+    # nur vollständige Runden (mindestens min_checkpoints Checkpoints) werden verwendet
+    if os.path.isdir(path):
+        from Trajectory_recorder import load_shards
+        shards = load_shards(path)
+        if not shards:
+            return []
+        obs = np.concatenate([np.asarray(shard["next_obs"]) for shard in shards])
+        done = np.concatenate([np.asarray(shard["terminated"]) | np.asarray(shard["truncated"]) for shard in shards])
+        checkpoint = obs[:, 6] > 0
+    else:
+        obs = np.loadtxt(path, delimiter=",", ndmin=2)
+        done = np.zeros(len(obs), dtype=bool)
+        checkpoint = obs[:, 6] != -1
+    laps = []
+    for rows in _split_episodes(obs[:, :2], obs[:, 3], done):
+        if checkpoint[rows].sum() >= min_checkpoints:
+            last = rows[np.flatnonzero(checkpoint[rows])[min_checkpoints - 1]]
+            laps.append(obs[rows[0]:last + 1, :2].astype(np.float64))
+    return laps
+
+
+def _source_key(paths, params):
+    # Hash über genau die Daten, die laps_from_recording liest: bei Aufzeichnungsordnern nur die im
+    # Index eingetragenen Zeilen (ein laufender Recorder ändert den Schlüssel erst mit neuen Daten)
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8"))
+    for path in sorted(paths):
+        digest.update(b"\0")
+        if os.path.isdir(path):
+            from Trajectory_recorder import load_shards
+            for shard in load_shards(path):
+                for field in ("next_obs", "terminated", "truncated"):
+                    digest.update(np.ascontiguousarray(shard[field]).data)
+        else:
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+def load_or_build(name, recordings, cache_dir=CACHE_DIR, spacing=2.0, cell_size=5.0, radius=20.0,
+                  min_checkpoints=N_CHECKPOINTS):
+    # Index der Strecke name aus dem Cache, sonst aus den Aufnahmen bauen und ablegen
+    recordings = [recordings] if isinstance(recordings, str) else list(recordings)
+    params = {"spacing": spacing, "cell_size": cell_size, "radius": radius, "min_checkpoints": min_checkpoints}
+    key = _source_key(recordings, params)
+    path = os.path.join(cache_dir, f"{name}.npz")
+    if os.path.exists(path):
+        index = TrackIndex.load(path)
+        if index.meta.get("source_key") == key:
+            return index
+
+    laps = [lap for recording in recordings for lap in laps_from_recording(recording, min_checkpoints)]
+    if not laps:
+        raise ValueError(f"Keine vollständige Runde in {recordings}")
+    index = TrackIndex(build_centerline(laps, spacing), cell_size=cell_size, radius=radius)
+    os.makedirs(cache_dir, exist_ok=True)
+    index.save(path, source_key=key, laps=len(laps))
+    index.meta = {"source_key": key, "laps": len(laps)}
+    print(f"[INFO] Streckenindex {name}: {len(laps)} Runden, {index.length:.0f} m, "
+          f"{len(index.seg_a)} Segmente, gespeichert in {path}")
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streckenindex aus aufgezeichneten Runden bauen")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build")
+    build_parser.add_argument("recordings", nargs="+", help="Ordner von Trajectory_recorder.py oder CSV-Telemetrie")
+    build_parser.add_argument("--name", required=True, help="Name der Strecke (Dateiname im Cache)")
+    build_parser.add_argument("--cache", default=CACHE_DIR)
+    build_parser.add_argument("--spacing", type=float, default=2.0, help="Punktabstand der Mittellinie in m")
+    build_parser.add_argument("--cell-size", type=float, default=5.0)
+    build_parser.add_argument("--radius", type=float, default=20.0, help="Maximaler Abstand für die Rasterabfrage in m")
+    args = parser.parse_args()
+
+    load_or_build(args.name, args.recordings, args.cache, args.spacing, args.cell_size, args.radius)
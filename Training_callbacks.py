@@ -0,0 +1,287 @@
+import copy
+import json
+import math
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import deque
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.save_util import save_to_zip_file
+from Profiling import Profiler
+
+# Gemeinsame Callbacks für TestTrain.py, TestTrainDQN.py und TestTrain_copy.py
+
+
+class ProfilingCallback(BaseCallback):
+    # Misst zusätzlich die Zeit pro Agenten-Schritt (Inferenz + env.step) und pro Update und
+    # schreibt alle log_every Rollouts die Perzentile in ms unter "timing/..." in den SB3-Logger.
+    # Bis dahin sammeln sich die Messungen in den Histogrammen. log_every=None: PPO jedes Rollout,
+    # Off-Policy (DQN, Rollouts von nur train_freq Schritten) etwa alle record_steps Schritte.
+    def __init__(self, log_every=None, record_steps=2048, verbose=0):
+        super().__init__(verbose)
+        self.log_every = log_every
+        self.record_steps = record_steps
+        self.profiler = Profiler()
+        self._rollouts = 0
+        self._last_step = None
+        self._update_start = None
+
+    def _on_training_start(self):
+        if self.log_every is None:
+            train_freq = getattr(self.model, "train_freq", None)
+            if train_freq is None or train_freq.unit.value != "step":
+                self.log_every = 1
+            else:
+                steps = train_freq.frequency * self.training_env.num_envs
+                self.log_every = max(1, math.ceil(self.record_steps / steps))
+
+    def _on_rollout_start(self):
+        now = time.perf_counter()
+        if self._update_start is not None:
+            self.profiler.add("update", now - self._update_start)
+        self._last_step = now
+
+    def _on_step(self):
+        now = time.perf_counter()
+        self.profiler.add("agent_step", now - self._last_step)
+        self._last_step = now
+        return True
+
+    def _on_rollout_end(self):
+        self._update_start = time.perf_counter()
+        self._rollouts += 1
+        if self._rollouts % self.log_every == 0:
+            self._record()
+
+    def _collect_env_profiles(self):
+        try:
+            profiles = self.training_env.env_method("take_profile")
+        except AttributeError:
+            # Env ohne Messstellen (z.B. Simulator)
+            return
+        for histograms in profiles:
+            self.profiler.merge(histograms)
+
+    def _record(self):
+        self._collect_env_profiles()
+        for name, summary in self.profiler.summary().items():
+            for key in ("p50", "p95", "p99", "mean", "max"):
+                self.logger.record(f"timing/{name}_{key}_ms", summary[key] * 1000.0)
+            self.logger.record(f"timing/{name}_count", summary["count"])
+        self.profiler.take()
+
+
+def snapshot_model(model):
+    # Wie BaseAlgorithm.save(), aber nur das Kopieren: Tensoren werden geklont, damit das
+    # Training weiterlaufen kann, während ein Hintergrund-Thread den Schnappschuss schreibt
+    data = model.__dict__.copy()
+    exclude = set(model._excluded_save_params())
+    state_dicts_names, torch_variable_names = model._get_torch_save_params()
+    for torch_var in state_dicts_names + torch_variable_names:
+        exclude.add(torch_var.split(".")[0])
+    for name in exclude:
+        data.pop(name, None)
+    # Puffer, die das Training weiter verändert (z.B. ep_info_buffer), einfrieren
+    for name, value in data.items():
+        if isinstance(value, (deque, list, dict)):
+            data[name] = copy.copy(value)
+
+    pytorch_variables = None
+    if torch_variable_names:
+        pytorch_variables = {}
+        for name in torch_variable_names:
+            attr = model
+            for part in name.split("."):
+                attr = getattr(attr, part)
+            pytorch_variables[name] = attr.detach().clone()
+    params = copy.deepcopy(model.get_parameters())
+    return data, params, pytorch_variables
+
+
+def _atomic_copy(src, dst):
+    tmp = dst + ".tmp"
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+class CheckpointCallback(BaseCallback):
+    # Speichert alle save_freq Aufrufe einen Schnappschuss als <prefix>_<lauf>_<steps>_steps.zip.
+    # Geschrieben wird in einem Hintergrund-Thread, immer erst in eine .tmp-Datei und dann per
+    # os.replace, so dass ein Absturz nie eine halbe Datei hinterlässt. Zusätzlich:
+    #   <prefix>_latest.zip   letzter Schnappschuss
+    #   <prefix>_best.zip     Schnappschuss mit der besten mittleren Episodenbelohnung des Laufs
+    #   checkpoints.json      Lauf, Schritte, Belohnung und Datei jedes behaltenen Schnappschusses
+    # Behalten werden die letzten keep_last plus die keep_best mit der höchsten Belohnung – jeweils
+    # nur innerhalb des aktuellen Laufs. Ein Lauf beginnt, wenn learn() bei 0 Schritten startet
+    # (Startzeit als Kennung); mit reset_num_timesteps=False wird der letzte Lauf fortgesetzt.
+    INDEX_FILE = "checkpoints.json"
+
+    def __init__(self, save_freq, save_path, name_prefix="model", keep_last=3, keep_best=3, verbose=1):
+        super().__init__(verbose)
+        self.save_freq = save_freq
+        self.save_path = save_path
+        self.name_prefix = name_prefix
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        os.makedirs(save_path, exist_ok=True)
+
+        index_path = os.path.join(save_path, self.INDEX_FILE)
+        self.checkpoints = []
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self.checkpoints = json.load(f)["checkpoints"]
+        self.run = None
+        self.best_score = None
+
+        self.error = None
+        self._queue = queue.Queue(maxsize=2)
+        self._thread = threading.Thread(target=self._run, name="CheckpointWriter", daemon=True)
+        self._thread.start()
+
+    def _on_training_start(self):
+        runs = [c for c in self.checkpoints if c.get("run") is not None]
+        if self.num_timesteps > 0 and runs:
+            # Fortgesetztes Training: weiter im zuletzt geschriebenen Lauf
+            self.run = max(runs, key=lambda c: c["time"])["run"]
+        else:
+            self.run = time.strftime("%Y%m%d-%H%M%S")
+        scores = [c["score"] for c in self._run_checkpoints() if c["score"] is not None]
+        self.best_score = max(scores) if scores else None
+
+    def _run_checkpoints(self):
+        return [c for c in self.checkpoints if c.get("run") == self.run]
+
+    def _path(self, name):
+        return os.path.join(self.save_path, f"{self.name_prefix}_{name}.zip")
+
+    def _recent_score(self):
+        if not self.model.ep_info_buffer:
+            return None
+        return float(np.mean([info["r"] for info in self.model.ep_info_buffer]))
+
+    def _on_step(self):
+        if self.n_calls % self.save_freq == 0:
+            self.save_snapshot()
+        return True
+
+    def save_snapshot(self):
+        if self._queue.full():
+            # Schreiben hinkt hinterher: lieber diesen Schnappschuss auslassen als das Training bremsen
+            if self.verbose:
+                print("[WARN] Checkpoint ausgelassen, vorheriger wird noch geschrieben.")
+            return
+        snapshot = snapshot_model(self.model)
+        self._queue.put((self.run, self.num_timesteps, self._recent_score(), snapshot))
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._write(*job)
+            except Exception as e:
+                self.error = e
+                print(f"[WARN] Checkpoint konnte nicht gespeichert werden: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, run, steps, score, snapshot):
+        data, params, pytorch_variables = snapshot
+        path = self._path(f"{run}_{steps}_steps")
+        tmp = path + ".tmp"
+        save_to_zip_file(tmp, data=data, params=params, pytorch_variables=pytorch_variables)
+        os.replace(tmp, path)
+        _atomic_copy(path, self._path("latest"))
+        if score is not None and (self.best_score is None or score > self.best_score):
+            self.best_score = score
+            _atomic_copy(path, self._path("best"))
+
+        self.checkpoints = [c for c in self.checkpoints if c.get("run") != run or c["steps"] != steps]
+        self.checkpoints.append({"run": run, "steps": steps, "score": score, "path": os.path.basename(path),
+                                 "time": time.time()})
+        self._apply_retention(run)
+        if self.verbose:
+            print(f"Modell gespeichert: {path}")
+
+    def _apply_retention(self, run):
+        # Nur Schnappschüsse dieses Laufs aussortieren; frühere Läufe bleiben unangetastet
+        others = [c for c in self.checkpoints if c.get("run") != run]
+        by_steps = sorted((c for c in self.checkpoints if c.get("run") == run), key=lambda c: c["steps"])
+        keep = {c["steps"] for c in by_steps[-self.keep_last:]} if self.keep_last > 0 else set()
+        scored = sorted((c for c in by_steps if c["score"] is not None), key=lambda c: c["score"])
+        if self.keep_best > 0:
+            keep.update(c["steps"] for c in scored[-self.keep_best:])
+
+        kept = []
+        for c in by_steps:
+            if c["steps"] in keep:
+                kept.append(c)
+                continue
+            try:
+                os.remove(os.path.join(self.save_path, c["path"]))
+            except FileNotFoundError:
+                pass
+        self.checkpoints = others + kept
+
+        index_path = os.path.join(self.save_path, self.INDEX_FILE)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump({"run": run, "best_score": self.best_score, "checkpoints": self.checkpoints}, f, indent=1)
+        os.replace(index_path + ".tmp", index_path)
+
+    def wait(self):
+        # Blockiert, bis alle angestoßenen Schnappschüsse geschrieben sind
+        self._queue.join()
+
+    def _on_training_end(self):
+        self.wait()
+
+
+class MetricsCallback(BaseCallback):
+    # Schreibt Episoden (aus dem "episode"-Eintrag des Monitors), Losses und alle step_every
+    # Schritte eine Stichprobe der Belohnung in einen Metrics.MetricsSink. Die Losses stehen nach
+    # train() im SB3-Logger und werden einmal pro Update zu Beginn des nächsten Rollouts gelesen.
+    def __init__(self, sink, step_every=100, verbose=0):
+        super().__init__(verbose)
+        self.sink = sink
+        self.step_every = step_every
+        self._n_updates = None
+        self._start_time = None
+        self._start_steps = 0
+
+    def _on_training_start(self):
+        self._start_time = time.perf_counter()
+        self._start_steps = self.num_timesteps
+
+    def _on_rollout_start(self):
+        self._record_losses()
+
+    def _record_losses(self):
+        values = self.logger.name_to_value
+        n_updates = values.get("train/n_updates")
+        if n_updates is None or n_updates == self._n_updates:
+            return
+        self._n_updates = n_updates
+        self.sink.record("loss", self.num_timesteps, **{
+            key.split("/", 1)[1]: float(value) for key, value in values.items() if key.startswith("train/")
+        })
+
+    def _on_step(self):
+        for info in self.locals.get("infos", ()):
+            episode = info.get("episode")
+            if episode is not None:
+                self.sink.record("episode", self.num_timesteps, reward=episode["r"], length=episode["l"],
+                                 time=episode["t"], checkpoints=info.get("checkpoints", np.nan))
+        if self.step_every and self.n_calls % self.step_every == 0:
+            elapsed = time.perf_counter() - self._start_time
+            self.sink.record("step", self.num_timesteps, reward=float(np.mean(self.locals["rewards"])),
+                             fps=(self.num_timesteps - self._start_steps) / max(elapsed, 1e-9))
+        return True
+
+    def _on_training_end(self):
+        # Letztes Update des Trainings
+        self._record_losses()
+        self.sink.flush()
@@ -0,0 +1,168 @@
+import json
+import os
+import time
+import numpy as np
+import gymnasium as gym
+
+# Aufzeichnung aller Übergänge (obs, action, reward, next_obs, terminated, truncated, timestamp)
+# in vorab angelegte .npy-Shards, die per np.memmap beschrieben und später ohne Kopie gelesen werden.
+#
+#   <path>/index.json          Felder (dtype, shape) und Shards mit Anzahl gültiger Zeilen
+#   <path>/shard_00000/obs.npy ein Array pro Feld, Länge shard_size, gefüllt bis "count"
+
+INDEX_FILE = "index.json"
+
+
+def transition_fields(observation_space):
+    obs_shape = list(observation_space.shape)
+    obs_dtype = np.dtype(observation_space.dtype).str
+    return {
+        "obs": {"dtype": obs_dtype, "shape": obs_shape},
+        "next_obs": {"dtype": obs_dtype, "shape": obs_shape},
+        "action": {"dtype": "<i8", "shape": []},
+        "reward": {"dtype": "<f4", "shape": []},
+        "terminated": {"dtype": "|b1", "shape": []},
+        "truncated": {"dtype": "|b1", "shape": []},
+        "timestamp": {"dtype": "<f8", "shape": []},
+    }
+
+
+def _read_index(path):
+    with open(os.path.join(path, INDEX_FILE)) as f:
+        return json.load(f)
+
+
+def _write_index(path, index):
+    # Erst in eine Temp-Datei schreiben, damit der Index nie halb geschrieben ist
+    tmp = os.path.join(path, INDEX_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp, os.path.join(path, INDEX_FILE))
+
+
+class ShardWriter:
+    # Sammelt Zeilen in einem kleinen Puffer und kopiert sie blockweise in den aktuellen Shard.
+    # Ein bestehendes Verzeichnis wird fortgesetzt (append-only).
+    def __init__(self, path, fields, shard_size=100_000, batch_size=256):
+        self.path = path
+        self.fields = fields
+        self.batch_size = batch_size
+        os.makedirs(path, exist_ok=True)
+
+        if os.path.exists(os.path.join(path, INDEX_FILE)):
+            self.index = _read_index(path)
+            if self.index["fields"] != fields:
+                raise ValueError(f"{path} enthält Aufzeichnungen mit anderen Feldern")
+        else:
+            self.index = {"fields": fields, "shard_size": shard_size, "shards": []}
+        self.shard_size = self.index["shard_size"]
+
+        self._batch = {name: np.empty([batch_size] + spec["shape"], dtype=spec["dtype"])
+                       for name, spec in fields.items()}
+        self._batch_count = 0
+        self._shard = None
+        # Angefangene Shards werden nicht weiterbeschrieben, es wird immer ein neuer angelegt
+        self._shard_count = self.shard_size
+
+    def append(self, **values):
+        row = self._batch_count
+        for name, value in values.items():
+            self._batch[name][row] = value
+        self._batch_count += 1
+        if self._batch_count == self.batch_size:
+            self._flush_batch()
+
+    def _open_shard(self):
+        if self._shard is not None:
+            self._close_shard()
+        name = f"shard_{len(self.index['shards']):05d}"
+        os.makedirs(os.path.join(self.path, name), exist_ok=True)
+        self._shard = {
+            field: np.lib.format.open_memmap(
+                os.path.join(self.path, name, f"{field}.npy"), mode="w+",
+                dtype=spec["dtype"], shape=tuple([self.shard_size] + spec["shape"]))
+            for field, spec in self.fields.items()
+        }
+        self.index["shards"].append({"name": name, "count": 0})
+        self._shard_count = 0
+
+    def _close_shard(self):
+        for array in self._shard.values():
+            array.flush()
+        self._shard = None
+
+    def _flush_batch(self):
+        start = 0
+        while start < self._batch_count:
+            if self._shard_count == self.shard_size:
+                self._open_shard()
+            n = min(self._batch_count - start, self.shard_size - self._shard_count)
+            for field, array in self._shard.items():
+                array[self._shard_count:self._shard_count + n] = self._batch[field][start:start + n]
+            self._shard_count += n
+            self.index["shards"][-1]["count"] = self._shard_count
+            start += n
+        if self._batch_count:
+            _write_index(self.path, self.index)
+        self._batch_count = 0
+
+    def flush(self):
+        self._flush_batch()
+        if self._shard is not None:
+            for array in self._shard.values():
+                array.flush()
+
+    def close(self):
+        self.flush()
+        if self._shard is not None:
+            self._close_shard()
+
+
+class TrajectoryRecorder(gym.Wrapper):
+    # Opt-in-Wrapper um TrackmaniaEnv: zeichnet jeden Schritt auf, ohne step() auszubremsen
+    def __init__(self, env, path, shard_size=100_000, batch_size=256):
+        super().__init__(env)
+        self.writer = ShardWriter(path, transition_fields(env.observation_space), shard_size, batch_size)
+        self._last_obs = np.zeros(env.observation_space.shape, dtype=env.observation_space.dtype)
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self._last_obs[...] = obs
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        self.writer.append(obs=self._last_obs, next_obs=obs, action=action, reward=reward,
+                           terminated=terminated, truncated=truncated, timestamp=time.time())
+        self._last_obs[...] = obs
+        return obs, reward, terminated, truncated, info
+
+    def close(self):
+        self.writer.close()
+        super().close()
+
+
+def load_shards(path):
+    # Liefert pro Shard ein Dict Feld -> schreibgeschützte memmap (auf die gültigen Zeilen gekürzt)
+    index = _read_index(path)
+    shards = []
+    for shard in index["shards"]:
+        if shard["count"] == 0:
+            continue
+        shards.append({
+            field: np.load(os.path.join(path, shard["name"], f"{field}.npy"), mmap_mode="r")[:shard["count"]]
+            for field in index["fields"]
+        })
+    return shards
+
+
+def iter_chunks(path, chunk_size=65_536):
+    # Läuft in Blöcken über alle Shards, ohne mehr als einen Block in den Speicher zu laden
+    for shard in load_shards(path):
+        count = len(shard["reward"])
+        for start in range(0, count, chunk_size):
+            yield {field: array[start:start + chunk_size] for field, array in shard.items()}
+
+
+def count_transitions(path):
+    return sum(shard["count"] for shard in _read_index(path)["shards"])
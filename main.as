@@ -5,12 +5,45 @@ int checkpointCount = 0;
 int lastCheckpoint = -1;
 uint lastCheckpointTime = Time::Now; // Zeittracking
 
+const uint8 FRAME_VERSION = 1;
+
+// Abo (siehe Telemetry_client.py): "SUB fields=... rate=... encoding=... tick=..." als erste Zeile,
+// Antwort "OK ..." oder "ERR <Grund>". Ohne SUB innerhalb von HANDSHAKE_GRACE_MS wird wie bisher
+// jedes Frame mit allen 8 Standardfeldern im eingestellten Format gesendet.
+const uint HANDSHAKE_GRACE_MS = 250;
+const int SUBSCRIPTION_VERSION = 1;
+const int DEFAULT_FIELD_COUNT = 8;
+array<string> KNOWN_FIELDS = {"x", "y", "speed", "dist", "yaw", "pitch", "cp", "dt", "vel_x", "vel_y", "vel_z"};
+
+// Zustand der aktuellen Verbindung
+bool handshakeDone = false;
+uint handshakeDeadline = 0;
+string rxBuffer = "";
+array<int> sendFields;
+bool sendBinary = false;
+bool sendTick = false;
+bool sendPull = false;
+uint sendPeriodMs = 0;
+uint nextSendTime = 0;
+int pendingRequests = 0;
+int latchedCheckpoint = -1;
+float latchedDeltaTime = -1.0;
+
+[Setting name="Binary telemetry" description="Sendet Frames im Binärformat statt als CSV-Zeilen (TelemetryClient protocol=\"binary\")"]
+bool binaryTelemetry = false;
+
+[Setting name="Port" description="TCP-Port für die Telemetrie (eine Instanz pro Port, wirkt nach Neuladen des Plugins)"]
+uint port = 1337;
+
+[Setting name="Tick stamp" description="Hängt an jedes Frame die Spielzeit in ms (Time::Now) an, für End-to-End-Latenzmessung"]
+bool tickStamp = false;
+
 void Main() {
     print("[PLUGIN] RL Interface Plugin gestartet.");
 
     @serverSocket = Net::Socket();
-    serverSocket.Listen(1337);
-    print("[PLUGIN] Lausche auf Port 1337...");
+    serverSocket.Listen(port);
+    print("[PLUGIN] Lausche auf Port " + port + "...");
 
     startnew(UpdateLoop);
 }
@@ -23,16 +56,136 @@ void UpdateLoop() {
             @clientSocket = serverSocket.Accept();
             if (clientSocket !is null) {
                 print("[PLUGIN] Client verbunden.");
+                ResetConnection();
             }
         }
 
         if (clientSocket !is null) {
+            ReadCommands();
+        }
+
+        if (clientSocket !is null && handshakeDone) {
             SendTelemetry();
-            
         }
     }
 }
 
+void ResetConnection() {
+    // Standard für Clients ohne Abo: alle 8 Felder, jedes Frame, Format laut Einstellungen
+    handshakeDone = false;
+    handshakeDeadline = Time::Now + HANDSHAKE_GRACE_MS;
+    rxBuffer = "";
+    sendFields.Resize(0);
+    for (int i = 0; i < DEFAULT_FIELD_COUNT; i++) sendFields.InsertLast(i);
+    sendBinary = binaryTelemetry;
+    sendTick = tickStamp;
+    sendPull = false;
+    sendPeriodMs = 0;
+    nextSendTime = 0;
+    pendingRequests = 0;
+    latchedCheckpoint = -1;
+    latchedDeltaTime = -1.0;
+}
+
+void ReadCommands() {
+    int available = clientSocket.Available();
+    if (available > 0) {
+        rxBuffer += clientSocket.ReadRaw(available);
+    }
+    int newline = rxBuffer.IndexOf("\n");
+    while (newline >= 0) {
+        string line = rxBuffer.SubStr(0, newline).Trim();
+        rxBuffer = rxBuffer.SubStr(newline + 1);
+        HandleCommand(line);
+        if (clientSocket is null) return;
+        newline = rxBuffer.IndexOf("\n");
+    }
+    if (!handshakeDone && Time::Now >= handshakeDeadline) {
+        handshakeDone = true;
+    }
+}
+
+void HandleCommand(const string &in line) {
+    if (line == "GET") {
+        pendingRequests++;
+        return;
+    }
+    if (!line.StartsWith("SUB") || handshakeDone) return;
+
+    string error = ParseSubscription(line);
+    if (error != "") {
+        print("[PLUGIN] Abo abgelehnt: " + error);
+        clientSocket.Write("ERR " + error + "\n");
+        clientSocket.Close();
+        @clientSocket = null;
+        return;
+    }
+    handshakeDone = true;
+    clientSocket.Write(SubscriptionReply());
+    print("[PLUGIN] Abo: " + line);
+}
+
+string ParseSubscription(const string &in line) {
+    array<string> names;
+    string rate = "0";
+    string encoding = "csv";
+    bool tick = tickStamp;
+    for (int i = 0; i < DEFAULT_FIELD_COUNT; i++) names.InsertLast(KNOWN_FIELDS[i]);
+
+    array<string> words = line.Split(" ");
+    for (uint i = 1; i < words.Length; i++) {
+        array<string> option = words[i].Split("=");
+        if (option.Length != 2) continue;
+        if (option[0] == "fields") names = option[1].Split(",");
+        else if (option[0] == "rate") rate = option[1];
+        else if (option[0] == "encoding") encoding = option[1];
+        else if (option[0] == "tick") tick = option[1] == "1";
+    }
+
+    array<int> fields;
+    for (uint i = 0; i < names.Length; i++) {
+        int index = KNOWN_FIELDS.Find(names[i]);
+        if (index < 0 || fields.Find(index) >= 0) return "Unbekanntes oder doppeltes Feld: " + names[i];
+        fields.InsertLast(index);
+    }
+    if (encoding != "csv" && encoding != "binary") return "Unbekannte Kodierung: " + encoding;
+    bool pull = rate == "pull";
+    float hz = pull ? 0.0 : Text::ParseFloat(rate);
+    if (hz < 0) return "Ungültige Rate: " + rate;
+
+    sendFields = fields;
+    sendBinary = encoding == "binary";
+    sendTick = tick;
+    sendPull = pull;
+    sendPeriodMs = hz > 0 ? uint(1000.0 / hz) : 0;
+    return "";
+}
+
+string SubscriptionReply() {
+    string names = "";
+    for (uint i = 0; i < sendFields.Length; i++) {
+        if (i > 0) names += ",";
+        names += KNOWN_FIELDS[sendFields[i]];
+    }
+    string rate = sendPull ? "pull" : (sendPeriodMs > 0 ? "" + (1000.0 / sendPeriodMs) : "0");
+    return "OK fields=" + names + " rate=" + rate + " encoding=" + (sendBinary ? "binary" : "csv")
+        + " tick=" + (sendTick ? "1" : "0") + " version=" + SUBSCRIPTION_VERSION + "\n";
+}
+
+bool ShouldSend() {
+    // Dezimierung im Plugin: pull = ein Frame pro "GET", sonst höchstens eins pro sendPeriodMs
+    if (sendPull) {
+        if (pendingRequests == 0) return false;
+        pendingRequests--;
+        return true;
+    }
+    if (sendPeriodMs == 0) return true;
+    uint now = Time::Now;
+    if (now < nextSendTime) return false;
+    nextSendTime = (now - nextSendTime > sendPeriodMs) ? now + sendPeriodMs : nextSendTime + sendPeriodMs;
+    return true;
+}
+
 void SendTelemetry() {
     auto scriptPlayer = GetScriptPlayer();
     if (scriptPlayer is null) return;
@@ -44,34 +197,76 @@ void SendTelemetry() {
 
 
     vec3 pos = scriptPlayer.Position;
+    vec3 vel = scriptPlayer.Velocity;
     float speed = scriptPlayer.Speed;
     float distance = scriptPlayer.Distance;
     float yaw = scriptPlayer.AimYaw;
     float pitch = scriptPlayer.AimPitch;
 
-    float dummyDeltaTime = -1.0;
-
-    string msg = "" + pos.x + "," + pos.z + "," + speed + "," + distance + "," + yaw + "," + pitch;
+    int checkpointField = -1;
+    float deltaTime = -1.0;
 
     int currentCheckpoint = player.CurrentLaunchedRespawnLandmarkIndex;
     if (currentCheckpoint != lastCheckpoint) {
             lastCheckpoint = currentCheckpoint;
             checkpointCount++;
                 uint now = Time::Now;
-                float deltaTime = float(now - lastCheckpointTime) / 1000.0;
+                deltaTime = float(now - lastCheckpointTime) / 1000.0;
                 lastCheckpointTime = now;
+            checkpointField = checkpointCount;
+    }
+
+    // Checkpoint aus einem nicht gesendeten Frame bis zum nächsten gesendeten aufheben
+    if (checkpointField != -1) {
+        latchedCheckpoint = checkpointField;
+        latchedDeltaTime = deltaTime;
+    }
+    if (!ShouldSend()) return;
+    checkpointField = latchedCheckpoint;
+    deltaTime = latchedDeltaTime;
+    latchedCheckpoint = -1;
+    latchedDeltaTime = -1.0;
 
-            msg = msg + "," + checkpointCount + "," + deltaTime + "\n";
+    // Reihenfolge wie KNOWN_FIELDS
+    array<float> values = {pos.x, pos.z, speed, distance, yaw, pitch, float(checkpointField), deltaTime, vel.x, vel.z, vel.y};
+
+    bool ok;
+    if (sendBinary) {
+        ok = SendBinaryFrame(values);
     }
     else {
-            msg = msg + "," + "-1" + "," + "-1" + "\n";
+        string msg = "";
+        for (uint i = 0; i < sendFields.Length; i++) {
+            if (i > 0) msg += ",";
+            int field = sendFields[i];
+            // Checkpoint als Ganzzahl wie bisher
+            if (field == 6) msg += checkpointField;
+            else msg += values[field];
+        }
+        if (sendTick) msg = msg + "," + Time::Now;
+        msg = msg + "\n";
+        ok = clientSocket.Write(msg);
     }
-    if (!clientSocket.Write(msg)) {
+    if (!ok) {
         print("[PLUGIN] Senden fehlgeschlagen. Trenne Client.");
         @clientSocket = null;
     }
 }
 
+// Binärframe: uint16 Länge (Version + Nutzdaten), uint8 Version, die abonnierten Felder
+// (Standard: 8) als float32 little-endian, mit Tick stamp danach uint32 Spielzeit in ms
+bool SendBinaryFrame(const array<float> &in values) {
+    MemoryBuffer@ frame = MemoryBuffer(0);
+    frame.Write(uint16(1 + sendFields.Length * 4 + (sendTick ? 4 : 0)));
+    frame.Write(uint8(FRAME_VERSION));
+    for (uint i = 0; i < sendFields.Length; i++) {
+        frame.Write(values[sendFields[i]]);
+    }
+    if (sendTick) frame.Write(uint32(Time::Now));
+    frame.Seek(0);
+    return clientSocket.Write(frame);
+}
+
 
 // Hilfsfunktionen
 CSmPlayer@ GetPlayer() {